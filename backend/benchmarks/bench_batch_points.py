@@ -0,0 +1,57 @@
+"""
+Benchmark of multi-point average queries against the local fake Earth Engine with a fixed
+round trip latency: one get_batched_average_data call per point against a single
+get_batched_point_average_data call for all points.
+
+Run from the backend directory:
+    python -m benchmarks.bench_batch_points
+"""
+import time
+import numpy as np
+from loguru import logger
+from sentinel5plib import batch_utils
+from tests import fake_ee
+
+LATENCY = 0.05
+POINT_COUNTS = [1, 10, 50]
+PERIODS = {'week': ('week', 2), 'month': ('month', 1), 'year': (None, 2025)}
+
+
+def make_collections():
+    rng = np.random.default_rng(0)
+    aai = [fake_ee.Image.from_bands({'absorbing_aerosol_index': rng.random((4, 6))}, week=2, month=1)
+           for _ in range(10)]
+    no2 = [fake_ee.Image.from_bands({'NO2_in_µg_per_m3': rng.random((4, 6)) * 50},
+                                    week=2, month=1)
+           for _ in range(10)]
+    return fake_ee.ImageCollection(aai), fake_ee.ImageCollection(no2)
+
+
+def main():
+    logger.remove()
+    batch_utils.ee = fake_ee
+    images_aai, images_no2 = make_collections()
+    rng = np.random.default_rng(1)
+
+    print(f"{'points':>6} {'per point':>12} {'batched':>12} {'calls':>12}")
+    for count in POINT_COUNTS:
+        points = list(zip(rng.uniform(9.7, 10.0, count), rng.uniform(53.55, 53.75, count)))
+
+        fake_ee.reset(LATENCY)
+        start = time.perf_counter()
+        for point_x, point_y in points:
+            batch_utils.get_batched_average_data(
+                images_aai, images_no2, PERIODS, fake_ee.Geometry.Point([point_x, point_y]))
+        per_point, per_point_calls = time.perf_counter() - start, fake_ee.calls
+
+        fake_ee.reset(LATENCY)
+        start = time.perf_counter()
+        batch_utils.get_batched_point_average_data(images_aai, images_no2, PERIODS, points)
+        batched, batched_calls = time.perf_counter() - start, fake_ee.calls
+
+        print(f"{count:>6} {per_point * 1000:>10.1f}ms {batched * 1000:>10.1f}ms "
+              f"{per_point_calls:>5} vs {batched_calls}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+In-process load benchmark of the cached GET endpoints: the previous handlers (exists + open
++ json.load + FastAPI re-encoding) against the in-memory pre-encoded artifacts.
+
+Run from the backend directory:
+    python -m benchmarks.bench_cache_responses
+"""
+import json
+import os
+import tempfile
+import time
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sentinel5plib.raster_utils import read_raster, iter_raster_geojson
+from sentinel5plib.defaults import DEFAULT_MAP_RASTER_OUTPUT_PATH
+from routers import pm25
+from utils_f.cache import store_artifact, INDICATOR_CACHE_FILE, MAP_CACHE_FILE
+
+REQUESTS = {"/pm25/indicator": 2000, "/pm25/map-data": 100}
+INDICATOR = [
+    {"Current_day_week_year": 17, "Average_PM2.5": 12.4, "Air_quality_indicator_yearly_comparison": 95.1},
+    {"Current_day_week_year": 42, "Average_PM2.5": 11.8, "Air_quality_indicator_yearly_comparison": 90.4},
+    {"Current_day_week_year": 2026, "Average_PM2.5": 13.0, "Air_quality_indicator_yearly_comparison": 0},
+]
+
+
+def legacy_app() -> FastAPI:
+    app = FastAPI()
+
+    def handler(cache_file):
+        async def endpoint():
+            if os.path.exists(cache_file):
+                with open(cache_file, "r") as f:
+                    return json.load(f)
+        return endpoint
+
+    app.get("/pm25/indicator")(handler(INDICATOR_CACHE_FILE))
+    app.get("/pm25/map-data")(handler(MAP_CACHE_FILE))
+    return app
+
+
+def artifact_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(pm25.router, prefix="/pm25")
+    return app
+
+
+def requests_per_second(client, path, count, headers=None):
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(path, headers=headers)
+        assert response.status_code in (200, 304)
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    image, transform, nodata = read_raster(os.path.abspath(DEFAULT_MAP_RASTER_OUTPUT_PATH))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.makedirs("cache")
+        store_artifact(INDICATOR_CACHE_FILE, json.dumps(INDICATOR).encode())
+        store_artifact(MAP_CACHE_FILE, b"".join(iter_raster_geojson(image, transform, nodata)))
+
+        legacy = TestClient(legacy_app())
+        artifacts = TestClient(artifact_app())
+
+        print(f"{'endpoint':>16} {'before':>10} {'after':>10} {'after gzip':>11} {'after 304':>10}  (req/s)")
+        for path, count in REQUESTS.items():
+            etag = artifacts.get(path).headers["etag"]
+            print(f"{path:>16} "
+                  f"{requests_per_second(legacy, path, count):>10.0f} "
+                  f"{requests_per_second(artifacts, path, count, {'Accept-Encoding': 'identity'}):>10.0f} "
+                  f"{requests_per_second(artifacts, path, count, {'Accept-Encoding': 'gzip'}):>11.0f} "
+                  f"{requests_per_second(artifacts, path, count, {'If-None-Match': etag}):>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Benchmark of the NumPy compute backend on a year of daily rasters of the Hamburg grid:
+AOI means of week, month and year periods and the daily AOI mean series.
+
+Run from the backend directory:
+    python -m benchmarks.bench_compute_backend
+"""
+import time
+import numpy as np
+from sentinel5plib.compute import NumPyBackend
+
+SHAPE = (365, 107, 195)
+REPEATS = 20
+
+
+def timed(function):
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        function()
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    aai = rng.random(SHAPE, dtype=np.float32) * 3
+    no2 = rng.random(SHAPE, dtype=np.float32) * 40
+    aai[rng.random(SHAPE) < 0.4] = np.nan
+    mask = np.zeros(SHAPE[1:], dtype=bool)
+    mask[20:90, 30:170] = True
+    backend = NumPyBackend()
+
+    print(f"{'period':>8} {'ms':>8}")
+    for name, days in [("week", 7), ("month", 31), ("year", 365)]:
+        elapsed = timed(lambda: backend.period_mean(aai[:days], no2[:days], mask))
+        print(f"{name:>8} {elapsed:>8.2f}")
+    elapsed = timed(lambda: backend.masked_mean(backend.pm25(aai, no2), mask))
+    print(f"{'daily':>8} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark of concurrent Earth Engine evaluations against the local fake Earth Engine with
+a fixed round trip latency. Calls getInfo inline on the event loop, as the async handlers
+did, against the EarthEngineClient pool, with distinct graphs and with half of the
+requests asking for a graph that is already in flight.
+
+Run from the backend directory:
+    python -m benchmarks.bench_ee_client
+"""
+import asyncio
+import time
+from sentinel5plib.ee_client import EarthEngineClient
+from tests import fake_ee
+
+LATENCY = 0.05
+REQUEST_COUNTS = [1, 10, 50]
+MAX_WORKERS = 8
+
+
+async def inline(graphs):
+    return [graph.getInfo() for graph in graphs]
+
+
+async def pooled(ee_client, graphs):
+    return await asyncio.gather(*[ee_client.get_info_async(graph) for graph in graphs])
+
+
+def timed(coroutine):
+    fake_ee.reset(LATENCY)
+    start = time.perf_counter()
+    asyncio.run(coroutine)
+    return time.perf_counter() - start, fake_ee.calls
+
+
+def main():
+    ee_client = EarthEngineClient(max_workers=MAX_WORKERS)
+
+    print(f"{'requests':>8} {'inline (s)':>12} {'pool (s)':>12} {'dupes (s)':>12} {'dupe calls':>12}")
+    for count in REQUEST_COUNTS:
+        distinct = [fake_ee.Dictionary({'request': index}) for index in range(count)]
+        duplicated = [fake_ee.Dictionary({'request': index // 2}) for index in range(count)]
+
+        inline_seconds, _ = timed(inline(distinct))
+        pool_seconds, _ = timed(pooled(ee_client, distinct))
+        dupes_seconds, dupes_calls = timed(pooled(ee_client, duplicated))
+        print(f"{count:>8} {inline_seconds:>12.3f} {pool_seconds:>12.3f} {dupes_seconds:>12.3f} {dupes_calls:>12}")
+
+
+if __name__ == '__main__':
+    main()
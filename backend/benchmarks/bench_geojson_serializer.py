@@ -0,0 +1,56 @@
+"""
+Benchmarks GeoJSON map serialization: GeoDataFrame + convert_geodf_to_dict + json.dumps
+against streaming the raster array straight to bytes.
+
+Run from the backend directory:
+    python -m benchmarks.bench_geojson_serializer
+"""
+import json
+import time
+import tracemalloc
+import geopandas as gpd
+from benchmarks.bench_raster_to_vector import make_raster, NODATA
+from sentinel5plib.raster_utils import raster_array_to_points, iter_raster_geojson
+from sentinel5plib.vector_utils import convert_geodf_to_dict
+
+SIZES = [100, 250, 500]
+
+
+def geodf_path(image, transform, nodata):
+    x, y, values = raster_array_to_points(image, transform, nodata)
+    gdf = gpd.GeoDataFrame({'PM2.5': values}, geometry=gpd.points_from_xy(x, y))
+    return json.dumps(convert_geodf_to_dict(gdf)).encode()
+
+
+def streaming_path(image, transform, nodata):
+    size = 0
+    for chunk in iter_raster_geojson(image, transform, nodata):
+        size += len(chunk)
+    return size
+
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+
+    # Separate run, tracemalloc slows allocation heavy code down considerably.
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2 ** 20
+
+
+def main():
+    print(f"{'size':>10} {'geodf (s)':>10} {'geodf (MB)':>11} {'stream (s)':>11} {'stream (MB)':>12}")
+    for size in SIZES:
+        image, transform = make_raster(size)
+        geodf_time, geodf_peak = measure(geodf_path, image, transform, NODATA)
+        stream_time, stream_peak = measure(streaming_path, image, transform, NODATA)
+        print(f"{size}x{size:<5} {geodf_time:>10.3f} {geodf_peak:>11.1f} "
+              f"{stream_time:>11.3f} {stream_peak:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Microbenchmark of the per-image ee helpers with the production log sink (INFO, text
+format): the previous helpers logging one INFO line per call against the current ones.
+A stub image stands in for ee.Image, so only the Python-side overhead is measured.
+
+Run from the backend directory:
+    python -m benchmarks.bench_logging
+"""
+import io
+import time
+from loguru import logger
+from sentinel5plib import data_utils
+from sentinel5plib.log_utils import configure_logging
+
+CALLS = 20000
+
+
+class StubImage:
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+
+def legacy_select_aai(image):
+    bands = image.select(['absorbing_aerosol_index'])
+    logger.info('Absorbing Aerosol Index band has been selected.')
+    return bands
+
+
+def legacy_add_day(image):
+    day = image.date().get('day')
+    logger.info('Day numbers added.')
+    return image.set('day', day)
+
+
+def legacy_add_week(image):
+    week = image.date().get('week')
+    logger.info('Week numbers added.')
+    return image.set('week', week)
+
+
+def legacy_add_month(image):
+    month = image.date().get('month')
+    logger.info('Month numbers added.')
+    return image.set('month', month)
+
+
+def legacy_get_pm(image):
+    image = image.addBands(image.expression('(5 * NO2) + (30 * AAI)', {}).rename('PM25'))
+    logger.info('PM25 band has been added.')
+    return image
+
+
+HELPERS = [
+    ('selectAAI', legacy_select_aai, data_utils.selectAAI),
+    ('addDAY_of_year', legacy_add_day, data_utils.addDAY_of_year),
+    ('addWEEK_of_year', legacy_add_week, data_utils.addWEEK_of_year),
+    ('addMONTH_of_year', legacy_add_month, data_utils.addMONTH_of_year),
+    ('getPM', legacy_get_pm, data_utils.getPM),
+]
+
+
+def per_call(func, image):
+    start = time.perf_counter()
+    for _ in range(CALLS):
+        func(image)
+    return (time.perf_counter() - start) / CALLS * 1e6
+
+
+def main():
+    configure_logging(level="INFO", sink=io.StringIO())
+    image = StubImage()
+
+    print(f"{'helper':>18} {'logged (us)':>12} {'current (us)':>12} {'speedup':>8}")
+    for name, legacy, current in HELPERS:
+        legacy_us, current_us = per_call(legacy, image), per_call(current, image)
+        print(f"{name:>18} {legacy_us:>12.2f} {current_us:>12.2f} {legacy_us / current_us:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
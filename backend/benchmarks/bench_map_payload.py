@@ -0,0 +1,59 @@
+"""
+Compares the GeoJSON and the compact grid map payloads: encoded size and the time to
+parse them back into coordinates and values.
+
+Run from the backend directory:
+    python -m benchmarks.bench_map_payload
+"""
+import gzip
+import json
+import time
+from benchmarks.bench_raster_to_vector import make_raster, NODATA
+from sentinel5plib.raster_utils import (
+    read_raster,
+    iter_raster_geojson,
+    raster_to_grid_payload,
+    grid_payload_to_raster,
+    raster_array_to_points
+)
+from sentinel5plib.defaults import DEFAULT_MAP_RASTER_OUTPUT_PATH
+
+SIZES = [100, 500, 1000]
+
+
+def parse_geojson(body):
+    features = json.loads(body)['features']
+    return [(f['geometry']['coordinates'], f['properties']['PM2.5']) for f in features]
+
+
+def parse_grid(body):
+    image, transform, nodata = grid_payload_to_raster(json.loads(body))
+    return raster_array_to_points(image, transform, nodata)
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def report(name, image, transform, nodata):
+    geojson = b''.join(iter_raster_geojson(image, transform, nodata))
+    grid = json.dumps(raster_to_grid_payload(image, transform, nodata)).encode()
+
+    print(f"{name:>16} {len(geojson) / 1e6:>10.2f} {len(gzip.compress(geojson)) / 1e6:>10.2f} "
+          f"{timed(parse_geojson, geojson):>10.3f} {len(grid) / 1e6:>10.2f} "
+          f"{len(gzip.compress(grid)) / 1e6:>10.2f} {timed(parse_grid, grid):>10.4f}")
+
+
+def main():
+    print(f"{'raster':>16} {'geojson MB':>10} {'gzip MB':>10} {'parse (s)':>10} "
+          f"{'grid MB':>10} {'gzip MB':>10} {'parse (s)':>10}")
+    report('raster_map.tif', *read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH))
+    for size in SIZES:
+        image, transform = make_raster(size)
+        report(f'{size}x{size}', image, transform, NODATA)
+
+
+if __name__ == '__main__':
+    main()
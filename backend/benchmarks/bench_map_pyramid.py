@@ -0,0 +1,52 @@
+"""
+Compares the grid payload size and encode time of the full map against zoomed-out
+pyramid levels and a cropped viewport.
+
+Run from the backend directory:
+    python -m benchmarks.bench_map_pyramid
+"""
+import json
+import time
+from benchmarks.bench_raster_to_vector import make_raster, NODATA
+from sentinel5plib.raster_utils import (
+    raster_to_grid_payload,
+    build_raster_pyramid,
+    crop_raster,
+    PYRAMID_FACTORS
+)
+from rasterio.transform import Affine
+
+SIZE = 2000
+VIEWPORT = [12.0, 45.0, 20.0, 52.0]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def encode(image, transform, nodata):
+    return json.dumps(raster_to_grid_payload(image, transform, nodata)).encode()
+
+
+def report(name, image, transform, nodata):
+    body, seconds = timed(encode, image, transform, nodata)
+    print(f"{name:>20} {image.shape[0]:>6}x{image.shape[1]:<6} {len(body) / 1e6:>10.2f} {seconds:>10.4f}")
+
+
+def main():
+    image, transform = make_raster(SIZE)
+    levels, seconds = timed(build_raster_pyramid, image, transform, NODATA)
+    print(f"pyramid {PYRAMID_FACTORS} built in {seconds:.3f} s\n")
+
+    print(f"{'level':>20} {'shape':>13} {'grid MB':>10} {'encode (s)':>10}")
+    report('full', image, transform, NODATA)
+    for factor, level in levels.items():
+        report(f'{factor}x', level, transform * Affine.scale(factor), NODATA)
+    report('viewport', *crop_raster(image, transform, NODATA, VIEWPORT))
+    report('viewport 4x', *crop_raster(levels[4], transform * Affine.scale(4), NODATA, VIEWPORT))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark of PM2.5 map means over 7, 30 and 365 day windows on a year of Hamburg-sized
+daily rasters: direct composites of the daily stack against prefix sum lookups.
+
+Run from the backend directory:
+    python -m benchmarks.bench_prefix_cube
+"""
+import datetime
+import tempfile
+import time
+import numpy as np
+from loguru import logger
+from sentinel5plib.compute import NumPyBackend
+from sentinel5plib.prefix_cube import PrefixSumCube
+from sentinel5plib.tile_store import TileGrid, TileStore, date_range
+
+GRID = TileGrid(west=9.01, north=54.11, cell_size=0.01, rows=107, cols=195)
+YEAR_START = datetime.date(2025, 1, 1)
+WINDOWS = [7, 30, 365]
+REPEATS = 10
+
+
+def timed(function, repeats=REPEATS):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main():
+    logger.remove()
+    rng = np.random.default_rng(0)
+    backend = NumPyBackend()
+    mask = np.zeros((GRID.rows, GRID.cols), dtype=bool)
+    mask[10:100, 20:180] = True
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = TileStore(directory, GRID)
+        for day in date_range(YEAR_START, datetime.date(2026, 1, 1)):
+            rasters = {'aai': rng.random((GRID.rows, GRID.cols)) * 3, 'no2': rng.random((GRID.rows, GRID.cols)) * 40}
+            rasters['aai'][rng.random((GRID.rows, GRID.cols)) < 0.4] = np.nan
+            store.write_day(day, rasters, final=True)
+        store.flush()
+
+        cube = PrefixSumCube(store, mask)
+        build = timed(lambda: cube._build_year(2025), repeats=1)
+        cube.range_mean('aai', YEAR_START, YEAR_START + datetime.timedelta(days=1))
+
+        def direct(end):
+            aai = backend.composite(store.read('aai', YEAR_START, end))
+            no2 = backend.composite(store.read('no2', YEAR_START, end))
+            return np.where(mask, backend.pm25(aai, no2), np.nan)
+
+        print(f"prefix sums of one year built in {build:.1f}ms")
+        print(f"{'days':>6} {'direct':>12} {'prefix sums':>12}")
+        for days in WINDOWS:
+            end = YEAR_START + datetime.timedelta(days=days)
+            print(f"{days:>6} {timed(lambda: direct(end)):>10.2f}ms "
+                  f"{timed(lambda: cube.pm25_mean(YEAR_START, end)):>10.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmarks the per-pixel raster to point conversion against the vectorized one.
+
+Run from the backend directory:
+    python -m benchmarks.bench_raster_to_vector
+"""
+import argparse
+import time
+import numpy as np
+import geopandas as gpd
+from rasterio.transform import from_origin
+from shapely.geometry import Point
+from sentinel5plib.raster_utils import raster_array_to_points
+
+SIZES = [100, 500, 1000, 2000, 4000]
+NODATA = 0.0
+
+
+def make_raster(size: int):
+    rng = np.random.default_rng(size)
+    image = rng.uniform(1, 60, (size, size))
+    image[rng.random((size, size)) < 0.4] = NODATA
+    transform = from_origin(9.7, 53.75, 0.01, 0.01)
+    return image, transform
+
+
+def pixel_loop(image, transform, nodata):
+    points = []
+    values = []
+    height, width = image.shape
+    for row in range(height):
+        for col in range(width):
+            value = image[row, col]
+            if value != nodata:
+                x, y = transform * (col, row)
+                points.append(Point(x, y))
+                values.append(value)
+    return gpd.GeoDataFrame({'PM2.5': values}, geometry=points)
+
+
+def vectorized(image, transform, nodata):
+    x, y, values = raster_array_to_points(image, transform, nodata)
+    return gpd.GeoDataFrame({'PM2.5': values}, geometry=gpd.points_from_xy(x, y))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max-loop-size', type=int, default=1000,
+                        help='largest raster the per-pixel loop is run on')
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'loop (s)':>10} {'vector (s)':>11} {'speedup':>9}")
+    for size in SIZES:
+        image, transform = make_raster(size)
+        vector_time = timed(vectorized, image, transform, NODATA)
+        if size <= args.max_loop_size:
+            loop_time = timed(pixel_loop, image, transform, NODATA)
+            print(f"{size}x{size:<5} {loop_time:>10.3f} {vector_time:>11.3f} {loop_time / vector_time:>8.1f}x")
+        else:
+            print(f"{size}x{size:<5} {'-':>10} {vector_time:>11.3f} {'-':>9}")
+
+
+if __name__ == '__main__':
+    main()
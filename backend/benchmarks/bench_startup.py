@@ -0,0 +1,155 @@
+"""
+Startup benchmark of the API process. First `python -X importtime -c "import main"`:
+the import time of main and its slowest imports. Then the time to first response:
+fresh processes import main and serve the cached GET endpoints from a seeded cache
+directory (data files are linked in, the app resolves them from the working
+directory). The app is called as plain ASGI, so no test client is imported. "eager" also
+imports the heavy dependencies (pandas, geopandas, rasterio, shapely, ee) up front,
+like the modules did before they were imported lazily. The scheduler is not started,
+and Earth Engine is neither imported nor initialised.
+
+Run from the backend directory:
+    python -m benchmarks.bench_startup
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+RUNS = 5
+TOP_IMPORTS = 10
+HEAVY_MODULES = ("pandas", "geopandas", "rasterio", "shapely.geometry", "ee")
+CACHED_ENDPOINTS = ("/pm25/indicator", "/pm25/averages", "/pm25/map-data", "/hamburg/map-data")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+SEED_CACHE = """
+import datetime, json, os
+from utils_f import cache
+
+os.makedirs(cache.CACHE_DIR, exist_ok=True)
+cache.store_artifact(cache.INDICATOR_CACHE_FILE, json.dumps({"PM2.5": 12.5}).encode())
+cache.store_artifact(cache.AVERAGES_CACHE_FILE, json.dumps({"week": 10.1, "month": 11.2, "year": 12.3}).encode())
+cache.store_artifact(cache.MAP_CACHE_FILE, json.dumps({"type": "FeatureCollection", "features": []}).encode())
+computed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+for name in cache.PRECOMPUTE_STAGES:
+    cache.record_manifest_stage(name, computed_at=computed_at, data_window=cache.stage_data_window(name))
+"""
+
+FIRST_RESPONSE = """
+import asyncio, importlib, json, sys, time
+start = time.perf_counter()
+mode, endpoints, heavy = sys.argv[1], sys.argv[2].split(","), sys.argv[3].split(",")
+if mode == "eager":
+    for name in heavy:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+import main
+imported = time.perf_counter()
+
+
+async def get(path):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await main.app({
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [], "client": ("127.0.0.1", 1), "server": ("127.0.0.1", 80)
+    }, receive, send)
+    return messages[0]["status"]
+
+responses = {}
+for path in endpoints:
+    status = asyncio.run(get(path))
+    responses[path] = {"status": status, "seconds": time.perf_counter() - start}
+
+print(json.dumps({
+    "import": imported - start,
+    "responses": responses,
+    "loaded": [name for name in heavy if name in sys.modules]
+}))
+"""
+
+
+def run_python(args, cwd) -> subprocess.CompletedProcess:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    env["PM25_LOG_LEVEL"] = "WARNING"
+    return subprocess.run(
+        [sys.executable, *args], cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True
+    )
+
+
+def import_times(cwd):
+
+    """
+    (cumulative us, module) of main and of the modules it imports directly.
+    """
+
+    stderr = run_python(["-X", "importtime", "-c", "import main"], cwd).stderr
+    total, direct, children = None, [], []
+    # A module is listed after the modules it imports.
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match is None:
+            continue
+        cumulative, depth, name = int(match.group(2)), len(match.group(3)) // 2, match.group(4)
+        if depth == 1:
+            children.append((cumulative, name))
+        elif depth == 0:
+            if name == "main":
+                total, direct = cumulative, children
+            children = []
+    return total, sorted(direct, reverse=True)
+
+
+def first_response(mode: str, cwd) -> dict:
+    stdout = run_python([
+        "-c", FIRST_RESPONSE, mode, ",".join(CACHED_ENDPOINTS), ",".join(HEAVY_MODULES)
+    ], cwd).stdout
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        os.symlink(BACKEND_DIR / "sentinel5plib", Path(workdir) / "sentinel5plib")
+        run_python(["-c", SEED_CACHE], workdir)
+
+        total, direct = import_times(workdir)
+        print(f"import main: {total / 1000:.1f} ms (python -X importtime, cumulative)")
+        for cumulative, name in direct[:TOP_IMPORTS]:
+            print(f"  {name:<40} {cumulative / 1000:>8.1f} ms")
+
+        print(f"\ntime to first response, median of {RUNS} fresh processes (ms from interpreter start)")
+        print(f"{'endpoint':>20} {'lazy':>8} {'eager':>8}")
+        results = {mode: [first_response(mode, workdir) for _ in range(RUNS)] for mode in ("lazy", "eager")}
+
+        def median(mode, pick):
+            values = sorted(pick(run) for run in results[mode])
+            return values[len(values) // 2] * 1000
+
+        print(f"{'import main':>20} {median('lazy', lambda r: r['import']):>8.1f} "
+              f"{median('eager', lambda r: r['import']):>8.1f}")
+        for path in CACHED_ENDPOINTS:
+            statuses = {run["responses"][path]["status"] for mode in results for run in results[mode]}
+            lazy = median("lazy", lambda r: r["responses"][path]["seconds"])
+            eager = median("eager", lambda r: r["responses"][path]["seconds"])
+            print(f"{path:>20} {lazy:>8.1f} {eager:>8.1f}   status {sorted(statuses)}")
+
+        print(f"\nheavy modules loaded after the first responses: {results['lazy'][0]['loaded'] or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
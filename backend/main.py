@@ -2,9 +2,16 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
-from utils_f.cache import precompute_metrics
-from routers import pm25, hamburg
+from sentinel5plib.log_utils import configure_logging
+from utils_f.scheduler import SCHEDULER
+from utils_f.instrumentation import RequestMetricsMiddleware
+from routers import pm25, hamburg, metrics
 
+# Uvicorn worker processes. Every worker serves the shared cache, one elected leader runs
+# the precompute and scheduled refreshes.
+WORKERS = int(os.environ.get("PM25_WORKERS", 1))
+
+configure_logging()
 app = FastAPI()
 
 origins = ["*"]
@@ -15,15 +22,22 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestMetricsMiddleware)
 
 app.include_router(pm25.router, prefix="/pm25", tags=["PM2.5"])
 app.include_router(hamburg.router, prefix="/hamburg", tags=["Hamburg"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 @app.on_event("startup")
 async def startup_event():
     os.makedirs("cache", exist_ok=True)
-    precompute_metrics()
-    print("Precomputed PM2.5 data on startup")
+    SCHEDULER.start()
+    print(f"Worker {os.getpid()} serving the last PM2.5 cache, refresh scheduler started")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    SCHEDULER.stop()
 
 if __name__ == "__main__":
-    uvicorn.run(app, host='0.0.0.0', port=8000)
+    uvicorn.run("main:app", host='0.0.0.0', port=8000, workers=WORKERS)
@@ -1,5 +1,5 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import BaseModel, Field
 from sentinel5plib.defaults import (
     DEFAULT_AVERAGE_WEEK_VALUE,
     DEFAULT_AVERAGE_MONTH_VALUE,
@@ -22,7 +22,31 @@ class AveragePointRequest(BaseModel):
     year: Optional[int] = DEFAULT_AVERAGE_YEAR_VALUE
 
 
+class AveragePointsRequest(BaseModel):
+    points: List[Tuple[float, float]] = []
+    features: Optional[Dict[str, Any]] = None
+    week_number: Optional[int] = DEFAULT_AVERAGE_WEEK_VALUE
+    month_number: Optional[int] = DEFAULT_AVERAGE_MONTH_VALUE
+    year: Optional[int] = DEFAULT_AVERAGE_YEAR_VALUE
+
+
 class MapRequest(BaseModel):
     start_date: Optional[str] = DEFAULT_MAP_DATA_START_DATE
     end_date: Optional[str] = DEFAULT_MAP_DATA_END_DATE
-    
+
+
+class PointValuesRequest(BaseModel):
+    point_x: Optional[float] = None
+    point_y: Optional[float] = None
+    points: List[Tuple[float, float]] = []
+    start_date: Optional[str] = DEFAULT_MAP_DATA_START_DATE
+    end_date: Optional[str] = DEFAULT_MAP_DATA_END_DATE
+    interpolation: str = Field("nearest", regex="^(nearest|bilinear)$")
+
+
+class TimeseriesRequest(BaseModel):
+    point_x: Optional[float] = None
+    point_y: Optional[float] = None
+    year: Optional[int] = DEFAULT_AVERAGE_YEAR_VALUE
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from sentinel5plib.metrics import REGISTRY, CONTENT_TYPE
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def metrics():
+    return Response(content=REGISTRY.exposition(), media_type=CONTENT_TYPE)
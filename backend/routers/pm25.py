@@ -1,61 +1,186 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Header, Path, Query, Request
+from fastapi.responses import JSONResponse, Response
 from loguru import logger
-import json
-import os
-from models.request_models import CurrentPointRequest, AveragePointRequest, MapRequest
+from typing import List, Optional
+from models.request_models import (
+    CurrentPointRequest,
+    AveragePointRequest,
+    AveragePointsRequest,
+    MapRequest,
+    PointValuesRequest,
+    TimeseriesRequest
+)
 from services.pm25_services import (
     post_air_quality_indicator,
     post_pm25_averages,
+    post_pm25_averages_batch,
     post_pm25_map,
+    post_pm25_point_values,
+    post_pm25_timeseries,
+    get_pm25_map_view,
+    get_pm25_map_tile,
+    map_tile_etag,
+    etag_matches,
+    parse_bbox,
+    wants_map_grid,
+    artifact_response,
+)
+from sentinel5plib.ee_client import EE_CLIENT
+from utils_f.jobs import submit_precompute, get_precompute_status
+from utils_f.result_cache import RESULTS
+from utils_f.scheduler import SCHEDULER
+from utils_f.instrumentation import ARTIFACT_REQUESTS
+from utils_f.cache import (
+    load_artifact,
+    read_manifest,
+    ARTIFACT_STAGES,
+    INDICATOR_CACHE_FILE,
+    AVERAGES_CACHE_FILE,
+    MAP_CACHE_FILE,
+    MAP_GRID_CACHE_FILE
 )
-from utils_f.cache import precompute_metrics
 
 router = APIRouter()
-CACHE_DIR = "cache"
+MAP_FORMAT_PATTERN = "^(geojson|grid)$"
+FLOAT_PATTERN = r"-?\d+(\.\d+)?"
+BBOX_PATTERN = f"^{FLOAT_PATTERN}(,{FLOAT_PATTERN}){{3}}$"
+MAX_ZOOM = 22
 
 
-@router.get("/indicator")
-async def air_quality_indicator():
-    cache_file = f"{CACHE_DIR}/pm25_indicator.json"
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
+def precompute_missing(stages: List[str], message: str) -> JSONResponse:
 
-    precompute_metrics()
-    return {"message": "Precomputing PM2.5 indicator, try again later."}
+    """
+    202 for cache data that does not exist yet. Only the stages writing it are submitted,
+    and not while they wait out the retry backoff of a failed run: the scheduler tick
+    retries those.
+    """
 
+    stages = SCHEDULER.retryable_stages(stages)
+    job = submit_precompute(stages) if stages else get_precompute_status()
+    return JSONResponse(status_code=202, content={"message": message, "job": job})
+
+
+def serve_artifact(cache_file: str, request: Request, message: str):
+
+    """
+    Serves the current generation of a cache file. When it is outdated it is still served
+    while the scheduler refreshes its stage on the next tick (stale-while-revalidate), when
+    it does not exist yet its stage is started and 202 returned.
+    """
+
+    artifact = load_artifact(cache_file)
+    if artifact is None:
+        ARTIFACT_REQUESTS.inc(status="missing")
+        return precompute_missing([ARTIFACT_STAGES[cache_file]], message)
+
+    # Not resubmitted here: the scheduler tick submits due stages and honours the retry
+    # backoff of failed ones, a request per GET would bypass it. is_stale answers from the
+    # snapshot of the last tick, without reading the manifest.
+    stale = SCHEDULER.is_stale(ARTIFACT_STAGES[cache_file])
+    ARTIFACT_REQUESTS.inc(status="stale" if stale else "fresh")
+    return artifact_response(artifact, request.headers, stale)
+
+
+@router.get("/indicator")
+async def air_quality_indicator(request: Request):
+    return serve_artifact(INDICATOR_CACHE_FILE, request, "Precomputing PM2.5 indicator, try again later.")
 
-@router.get("/averages")
-async def pm25_averages():
-    cache_file = f"{CACHE_DIR}/aggregated_pm25.json"
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
 
-    precompute_metrics()
-    return {"message": "Precomputing PM2.5 averages, try again later."}
+@router.get("/averages")
+async def pm25_averages(request: Request):
+    return serve_artifact(AVERAGES_CACHE_FILE, request, "Precomputing PM2.5 averages, try again later.")
 
 
 @router.get("/map-data")
-async def pm25_map():
-    cache_file = f"{CACHE_DIR}/pm25_map.json"
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
+async def pm25_map(
+    request: Request,
+    map_format: str = Query("geojson", alias="format", regex=MAP_FORMAT_PATTERN),
+    bbox: Optional[str] = Query(None, regex=BBOX_PATTERN),
+    zoom: Optional[int] = Query(None, ge=0, le=MAX_ZOOM),
+    accept: Optional[str] = Header(None)
+):
+    grid = wants_map_grid(map_format, accept)
+    if bbox is not None or zoom is not None:
+        try:
+            response = get_pm25_map_view(grid, parse_bbox(bbox), zoom)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if response is not None:
+            return response
+        return precompute_missing(["map"], "Precomputing PM2.5 Map, try again later.")
+
+    cache_file = MAP_GRID_CACHE_FILE if grid else MAP_CACHE_FILE
+    return serve_artifact(cache_file, request, "Precomputing PM2.5 Map, try again later.")
+
+
+# Plain def: rendering a tile that is not cached yet runs in the threadpool.
+@router.get("/tiles/{z}/{x}/{y}.png")
+def pm25_map_tile(
+    z: int = Path(..., ge=0, le=MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    if_none_match: Optional[str] = Header(None)
+):
+    if x >= 2 ** z or y >= 2 ** z:
+        raise HTTPException(status_code=422, detail=f"Tile {x}/{y} is outside zoom level {z}.")
+
+    # The URL does not change with the map generation: clients revalidate every tile and
+    # get 304 until the map is recomputed, without the tile being rendered or read.
+    etag = map_tile_etag()
+    headers = {"Cache-Control": "no-cache"}
+    if etag is not None:
+        headers["ETag"] = etag
+        if if_none_match is not None and etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers=headers)
+
+    try:
+        png = get_pm25_map_tile(z, x, y)
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
-    precompute_metrics()
-    return {"message": "Precomputing PM2.5 Map, try again later."}
+    if png is None:
+        return precompute_missing(["map"], "Precomputing PM2.5 Map, try again later.")
+    return Response(
+        content=png,
+        media_type="image/png",
+        headers=headers
+    )
 
 
 @router.post("/recompute")
 async def recompute_pm25():
-    precompute_metrics()
-    return {"message": "PM2.5 data recomputed successfully"}
+    job = submit_precompute()
+    return JSONResponse(
+        status_code=202,
+        content={"message": "PM2.5 data recompute started", "job": job}
+    )
+
+
+@router.get("/recompute/status")
+async def recompute_pm25_status():
+    return get_precompute_status()
+
+
+@router.get("/recompute/manifest")
+async def recompute_pm25_manifest():
+    return read_manifest()
+
+
+@router.get("/cache/stats")
+async def result_cache_stats():
+    return RESULTS.stats()
 
 
+@router.get("/ee/stats")
+async def earth_engine_stats():
+    return EE_CLIENT.stats()
+
+
+# Plain def: handlers waiting on Earth Engine run in FastAPI's threadpool, the calls
+# themselves are bounded by the Earth Engine client pool (see sentinel5plib.ee_client).
 @router.post("/indicator")
-async def post_air_quality(request: CurrentPointRequest):
+def post_air_quality(request: CurrentPointRequest):
     try:
         return post_air_quality_indicator(request)
     except Exception as e:
@@ -63,7 +188,7 @@ async def post_air_quality(request: CurrentPointRequest):
 
 
 @router.post("/averages")
-async def post_pm25_avg(request: AveragePointRequest):
+def post_pm25_avg(request: AveragePointRequest):
     try:
         return post_pm25_averages(request)
     except Exception as e:
@@ -71,10 +196,54 @@ async def post_pm25_avg(request: AveragePointRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/averages/batch")
+def post_pm25_avg_batch(request: AveragePointsRequest):
+    try:
+        return post_pm25_averages_batch(request)
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Plain def: FastAPI runs it in its threadpool, so map requests for different time frames
+# are computed concurrently instead of blocking the event loop.
 @router.post("/map-data")
-async def post_pm25_map_data(request: MapRequest):
+def post_pm25_map_data(
+    request: MapRequest,
+    map_format: str = Query("geojson", alias="format", regex=MAP_FORMAT_PATTERN),
+    bbox: Optional[str] = Query(None, regex=BBOX_PATTERN),
+    zoom: Optional[int] = Query(None, ge=0, le=MAX_ZOOM),
+    accept: Optional[str] = Header(None)
+):
+    try:
+        viewport = parse_bbox(bbox)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
     try:
-        return post_pm25_map(request)
+        return post_pm25_map(request, grid=wants_map_grid(map_format, accept), bbox=viewport, zoom=zoom)
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/point-values")
+def post_pm25_point_values_data(request: PointValuesRequest):
+    try:
+        return post_pm25_point_values(request)
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/timeseries")
+def post_pm25_timeseries_data(request: TimeseriesRequest):
+    try:
+        data = post_pm25_timeseries(request)
+    except Exception as e:
+        logger.error(f"Error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    if data is None:
+        return precompute_missing(["tiles"], "Ingesting PM2.5 daily rasters, try again later.")
+    return data
@@ -0,0 +1,91 @@
+from __future__ import annotations
+from typing import Dict, Sequence, Tuple
+import numpy as np
+from sentinel5plib.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
+ROLLING_WINDOWS = (7, 30)
+
+
+def iso_calendar(dates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Vectorized ISO year and ISO week of datetime64[D] dates: the ISO week belongs to the
+    year of its Thursday.
+    """
+
+    days = dates.astype('datetime64[D]').astype(np.int64)
+    # 1970-01-01 was a Thursday, weekday 0 is Monday.
+    weekday = (days + 3) % 7
+    thursday = (days - weekday + 3).astype('datetime64[D]')
+    iso_year = thursday.astype('datetime64[Y]')
+    iso_week = (thursday - iso_year.astype('datetime64[D]')).astype(np.int64) // 7 + 1
+
+    return iso_year.astype(np.int64) + 1970, iso_week
+
+
+def aggregate_daily_series(
+    dates: Sequence,
+    values: Sequence[float],
+    rolling_windows: Sequence[int] = ROLLING_WINDOWS
+) -> Dict[str, pd.DataFrame]:
+
+    """
+    Aggregates a contiguous daily PM2.5 series into every calendar bucket (day, ISO week,
+    month, year) and trailing rolling means in one vectorized pass over shared sums and
+    valid counts. Missing days (NaN) are skipped, rolling windows at the start of the
+    series use the days available.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :dates          : consecutive days
+    :values         : PM2.5 per day, NaN when missing
+
+    Optional:
+    :rolling_windows: window lengths in days, default 7 and 30
+
+    Output:
+    :dict           : {'daily', 'weekly', 'monthly', 'yearly', 'rolling_7', ...} DataFrames
+    -----------------------------------------------------------------------------------------
+    """
+
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(values)
+    filled = np.where(valid, values, 0.0)
+
+    years = dates.astype('datetime64[Y]').astype(np.int64) + 1970
+    months = dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+    iso_years, iso_weeks = iso_calendar(dates)
+
+    def buckets(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+        keys = np.stack(list(columns.values()), axis=1)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        sums = np.bincount(inverse, weights=filled, minlength=len(unique))
+        counts = np.bincount(inverse, weights=valid, minlength=len(unique))
+        frame = pd.DataFrame(unique, columns=list(columns))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame['PM2.5'] = np.where(counts > 0, sums / counts, np.nan)
+        frame['days'] = counts.astype(np.int64)
+        return frame
+
+    date_labels = np.datetime_as_string(dates, unit='D')
+    result = {
+        'daily': pd.DataFrame({'date': date_labels, 'PM2.5': np.where(valid, values, np.nan)}),
+        'weekly': buckets({'year': iso_years, 'week': iso_weeks}),
+        'monthly': buckets({'year': years, 'month': months}),
+        'yearly': buckets({'year': years}),
+    }
+
+    cumulative_sums = np.concatenate([[0.0], np.cumsum(filled)])
+    cumulative_counts = np.concatenate([[0], np.cumsum(valid)])
+    ends = np.arange(1, len(dates) + 1)
+    for window in rolling_windows:
+        starts = np.maximum(ends - window, 0)
+        counts = cumulative_counts[ends] - cumulative_counts[starts]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, (cumulative_sums[ends] - cumulative_sums[starts]) / counts, np.nan)
+        result[f'rolling_{window}'] = pd.DataFrame({'date': date_labels, 'PM2.5': means, 'days': counts})
+
+    return result
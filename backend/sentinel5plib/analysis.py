@@ -1,26 +1,22 @@
+from __future__ import annotations
 from loguru import logger
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
+from urllib.request import urlopen
+from affine import Affine
 import datetime
 import numpy as np
-import pandas as pd
-import geopandas as gpd
-import ee
-import geemap
-from sentinel5plib.vector_utils import vector_to_ee_geometry_object
-from sentinel5plib.raster_utils import raster_to_vector
-
-from sentinel5plib.current_avg_utils import (
-    get_current_day_average,
-    get_current_weekly_average,
-    get_current_year_average
-)
-
-from sentinel5plib.avg_utils import (
-    get_weekly_average_data,
-    get_monthly_average_data,
-    get_yearly_average_data
-)
+from sentinel5plib.vector_utils import get_aoi_geometry, aoi_contains_point
+from sentinel5plib.ee_client import EE_CLIENT, ee, get_info, graph_key
+from sentinel5plib.lazy_imports import lazy_import
+from sentinel5plib.metrics import timed
+from sentinel5plib.raster_utils import raster_array_to_vector, read_raster_bytes, write_raster
+from sentinel5plib.prefix_cube import PrefixSumCube
+from sentinel5plib.tile_store import TILE_NODATA
+from sentinel5plib.compute import NumPyBackend
+from sentinel5plib.aggregation import aggregate_daily_series
+
+from sentinel5plib.batch_utils import get_batched_average_data, get_batched_point_average_data
 
 from sentinel5plib.data_utils import (
     get_sentinel5p_image_collection, 
@@ -34,14 +30,40 @@ from sentinel5plib.defaults import (
     DEFAULT_AVERAGE_WEEK_VALUE,
     DEFAULT_AVERAGE_MONTH_VALUE,
     DEFAULT_AVERAGE_YEAR_VALUE,
-    DEFAULT_MAP_RASTER_OUTPUT_PATH,
     DEFAULT_MAP_DATA_START_DATE,
     DEFAULT_MAP_DATA_END_DATE
 )
 
-ee.Initialize()
+pd = lazy_import("pandas")
+gpd = lazy_import("geopandas")
+
+# Earth Engine prepares the GeoTIFF on request, large time frames take a while.
+DOWNLOAD_TIMEOUT = 300
+
+
+def validate_average_period(
+    year: Optional[int],
+    week_number: Optional[int],
+    month_number: Optional[int]
+) -> None:
+
+    """
+    Validates the year, week and month of an average request, raises ValueError.
+    """
+
+    if not isinstance(year, int):
+        raise ValueError("Year is required and must be an integer.")
+    
+    if week_number is not None:
+        if week_number < 1 or week_number > 53:
+            raise ValueError("Week number must be between 1 and 53.")
+    
+    if month_number is not None:
+        if month_number < 1 or month_number > 12:
+            raise ValueError("Month number must be between 1 and 12.")
 
 
+@timed()
 def extract_average_data(
     point_x: Optional[float] = None, 
     point_y: Optional[float] = None,
@@ -70,26 +92,14 @@ def extract_average_data(
     -----------------------------------------------------------------------------------------
     """
     
-    if not isinstance(year, int):
-        raise ValueError("Year is required and must be an integer.")
-    
-    if week_number is not None:
-        if week_number < 1 or week_number > 53:
-            raise ValueError("Week number must be between 1 and 53.")
-    
-    if month_number is not None:
-        if month_number < 1 or month_number > 12:
-            raise ValueError("Month number must be between 1 and 12.")
-    
-    hamburg_aoi = vector_to_ee_geometry_object(hamburg_geojson_path)
+    validate_average_period(year, week_number, month_number)
+
+    hamburg_aoi = get_aoi_geometry(hamburg_geojson_path)
 
     if point_x and point_y:
-        point_aoi = ee.Geometry.Point([point_x, point_y])
-        intersects = hamburg_aoi.contains(point_aoi)
-        if intersects.getInfo():
-            aoi = point_aoi
-        else:
+        if not aoi_contains_point(hamburg_geojson_path, point_x, point_y):
             return 'Points are out of Hamburg bounding box'
+        aoi = ee.Geometry.Point([point_x, point_y])
     else:
         aoi = hamburg_aoi
 
@@ -98,18 +108,86 @@ def extract_average_data(
     Images_no2 = Images_no2.map(convertNO2MolM2ToMicrogramM3)
     Images_no2 = Images_no2.select('NO2_in_µg_per_m3')
 
-    week_mean_pm25 = get_weekly_average_data(Images_AAI, Images_no2, week_number, aoi)
-    month_mean_pm25 = get_monthly_average_data(Images_AAI, Images_no2, month_number, aoi)
-    year_mean_pm25 = get_yearly_average_data(Images_AAI, Images_no2, year, aoi)
+    means = get_batched_average_data(Images_AAI, Images_no2, {
+        'week': ('week', week_number),
+        'month': ('month', month_number),
+        'year': (None, year)
+    }, aoi)
 
     df = pd.DataFrame()
     df['Average_week_month_year'] = [week_number, month_number, year]
-    df['Average_PM2'] = [week_mean_pm25, month_mean_pm25, year_mean_pm25]
+    df['Average_PM2'] = [means['week'], means['month'], means['year']]
     logger.info('PM2.5 Quality Average Values extracted successfully.')
 
     return df
 
 
+@timed()
+def extract_average_data_points(
+    points: List[Tuple[float, float]],
+    hamburg_geojson_path: Path = HAMBURG_GEOJSON_PATH,
+    week_number: Optional[int] = DEFAULT_AVERAGE_WEEK_VALUE,
+    month_number: Optional[int] = DEFAULT_AVERAGE_MONTH_VALUE,
+    year: Optional[int] = DEFAULT_AVERAGE_YEAR_VALUE,
+) -> pd.DataFrame:
+
+    """
+    Calculates PM2.5 week, month and year averages at many points at once. The image
+    composites are built once and all points are evaluated in one Earth Engine request.
+    Points outside Hamburg are returned with empty averages.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :points         : [(point_x, point_y), ...]
+
+    Optional:
+    :aoi            : Path
+    :year           : Int = 2025
+    :week_number    : Int = 1
+    :month_number   : Int = 1
+
+    Output:
+    :Dataframe      : pd.DataFrame, one row per point
+    -----------------------------------------------------------------------------------------
+    """
+
+    validate_average_period(year, week_number, month_number)
+
+    hamburg_aoi = get_aoi_geometry(hamburg_geojson_path)
+    inside = [aoi_contains_point(hamburg_geojson_path, x, y) for x, y in points]
+
+    Images_AAI = get_sentinel5p_image_collection("OFFL", "AER_AI", year, hamburg_aoi)
+    Images_no2 = get_sentinel5p_image_collection("OFFL", "NO2", year, hamburg_aoi)
+    Images_no2 = Images_no2.map(convertNO2MolM2ToMicrogramM3)
+    Images_no2 = Images_no2.select('NO2_in_µg_per_m3')
+
+    means = iter(get_batched_point_average_data(Images_AAI, Images_no2, {
+        'week': ('week', week_number),
+        'month': ('month', month_number),
+        'year': (None, year)
+    }, [point for point, is_inside in zip(points, inside) if is_inside]))
+
+    rows = []
+    for (point_x, point_y), is_inside in zip(points, inside):
+        point_means = next(means) if is_inside else {}
+        rows.append({
+            'point_x': point_x,
+            'point_y': point_y,
+            'inside_hamburg': is_inside,
+            'Average_PM2.5_week': point_means.get('week'),
+            'Average_PM2.5_month': point_means.get('month'),
+            'Average_PM2.5_year': point_means.get('year')
+        })
+
+    df = pd.DataFrame(rows, columns=[
+        'point_x', 'point_y', 'inside_hamburg',
+        'Average_PM2.5_week', 'Average_PM2.5_month', 'Average_PM2.5_year'
+    ])
+    logger.info(f'PM2.5 Quality Average Values of {len(points)} points extracted successfully.')
+
+    return df
+
+
+@timed()
 def calculate_pm25_indicator(
     point_x: Optional[float] = None, 
     point_y: Optional[float] = None,
@@ -142,15 +220,12 @@ def calculate_pm25_indicator(
     if current_weekday in week_list:
         current_week = current_week - 1
 
-    hamburg_aoi = vector_to_ee_geometry_object(hamburg_geojson_path)
+    hamburg_aoi = get_aoi_geometry(hamburg_geojson_path)
 
     if point_x and point_y:
-        point_aoi = ee.Geometry.Point([point_x, point_y])
-        intersects = hamburg_aoi.contains(point_aoi)
-        if intersects.getInfo():
-            aoi = point_aoi
-        else:
+        if not aoi_contains_point(hamburg_geojson_path, point_x, point_y):
             return 'Points are out of Hamburg bounding box'
+        aoi = ee.Geometry.Point([point_x, point_y])
     else:
         aoi = hamburg_aoi
 
@@ -159,11 +234,16 @@ def calculate_pm25_indicator(
     Images_no2 = Images_no2.map(convertNO2MolM2ToMicrogramM3)
     Images_no2 = Images_no2.select('NO2_in_µg_per_m3')
 
-    current_day_mean_pm25 = get_current_day_average(Images_AAI, Images_no2, current_day, aoi)
-    current_week_mean_pm25 = get_current_weekly_average(Images_AAI, Images_no2, current_week, aoi)
-    current_year_mean_pm25 = get_current_year_average(Images_AAI, Images_no2, current_year, aoi)
+    means = get_batched_average_data(Images_AAI, Images_no2, {
+        'day': ('day', current_day),
+        'week': ('week', current_week),
+        'year': (None, current_year)
+    }, aoi)
 
-    df = pd.concat([current_day_mean_pm25, current_week_mean_pm25, current_year_mean_pm25], axis=0)
+    df = pd.DataFrame({
+        'Current_day_week_year': [current_day, current_week, current_year],
+        'Average_PM2.5': [means['day'], means['week'], means['year']]
+    })
     df = df.replace(np.nan, 0)
 
     aai_day = df['Average_PM2.5'].values[0]
@@ -195,30 +275,27 @@ def calculate_pm25_indicator(
     return df
 
 
-def get_pm_map(
-    hamburg_geojson_path: Path = HAMBURG_GEOJSON_PATH,
+def get_pm_image(
+    aoi: ee.Geometry,
     start_date: str = DEFAULT_MAP_DATA_START_DATE,
-    end_date: str = DEFAULT_MAP_DATA_END_DATE,
-    output_file_path: Path = DEFAULT_MAP_RASTER_OUTPUT_PATH
-) -> gpd.GeoDataFrame:
-    
+    end_date: str = DEFAULT_MAP_DATA_END_DATE
+) -> ee.Image:
+
     """
-    Calculates PM2.5 average values of a time frame, saves it to raster format, and converts
-    it to vector format.
+    Builds the PM2.5 average image of a time frame, clipped to the AOI.
     -----------------------------------------------------------------------------------------
+    Required:
+    :aoi                            : ee.Geometry
+
     Default:
-    :hamburg_geojson_path           : Input path of the hamburg vector file
     :start_date                     : 2025-01-01
     :end_date                       : 2025-12-31
-    :output_file_path               : Output path to the raster map
 
     Output:
-    :Dataframe      : pd.DataFrame
+    :image          : ee.Image
     -----------------------------------------------------------------------------------------
     """
 
-    aoi = vector_to_ee_geometry_object(hamburg_geojson_path)
-
     Images_AAI = get_sentinel5p_image_collection_range("AER_AI", aoi, start_date, end_date)
     Images_no2 = get_sentinel5p_image_collection_range("NO2", aoi, start_date, end_date)
     Images_no2 = Images_no2.map(convertNO2MolM2ToMicrogramM3)
@@ -230,11 +307,226 @@ def get_pm_map(
     combined = aai_image.addBands(no2_image)
     combined = getPM(combined)
 
-    pm25 = combined.select('PM25').clip(aoi)
+    return combined.select('PM25').clip(aoi)
+
+
+@timed()
+def download_pm_raster(
+    hamburg_geojson_path: Path = HAMBURG_GEOJSON_PATH,
+    start_date: str = DEFAULT_MAP_DATA_START_DATE,
+    end_date: str = DEFAULT_MAP_DATA_END_DATE
+) -> Tuple[np.ndarray, Affine, Optional[float]]:
+
+    """
+    Calculates PM2.5 average values of a time frame and downloads the raster into memory.
+    Nothing is written to disk, so concurrent requests for different time frames do not
+    interfere.
+    -----------------------------------------------------------------------------------------
+    Default:
+    :hamburg_geojson_path           : Input path of the hamburg vector file
+    :start_date                     : 2025-01-01
+    :end_date                       : 2025-12-31
+
+    Output:
+    :image, transform, nodata
+    -----------------------------------------------------------------------------------------
+    """
+
+    aoi = get_aoi_geometry(hamburg_geojson_path)
+    pm25 = get_pm_image(aoi, start_date, end_date)
+
+    params = {
+        'scale': 1113.2,
+        'region': aoi,
+        'filePerBand': False,
+        'format': 'GEO_TIFF'
+    }
+    url = EE_CLIENT.call(lambda: pm25.getDownloadURL(params), graph_key(pm25, 'download'))
+    with urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response:
+        raster = read_raster_bytes(response.read())
+    logger.info(f'PM2.5 raster of {start_date} to {end_date} has been downloaded.')
+
+    return raster
+
+
+@timed()
+def get_pm_point_values(
+    points: List[Tuple[float, float]],
+    start_date: str = DEFAULT_MAP_DATA_START_DATE,
+    end_date: str = DEFAULT_MAP_DATA_END_DATE,
+    hamburg_geojson_path: Path = HAMBURG_GEOJSON_PATH
+) -> List[Optional[float]]:
+
+    """
+    Calculates PM2.5 average values of a time frame at the given points on Earth Engine,
+    with a single request. Points outside the AOI get None.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :points                         : [(point_x, point_y), ...]
+
+    Default:
+    :start_date                     : 2025-01-01
+    :end_date                       : 2025-12-31
+    :hamburg_geojson_path           : Input path of the hamburg vector file
+
+    Output:
+    :list           : PM2.5 value per point
+    -----------------------------------------------------------------------------------------
+    """
+
+    pm25 = get_pm_image(get_aoi_geometry(hamburg_geojson_path), start_date, end_date)
+    features = ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Point([point_x, point_y]), {'index': index})
+        for index, (point_x, point_y) in enumerate(points)
+    ])
+
+    samples = get_info(pm25.reduceRegions(
+        collection=features,
+        reducer=ee.Reducer.mean(),
+        scale=1113.2
+    ))['features']
+    logger.info(f'PM2.5 values of {len(points)} points have been extracted.')
+
+    values = [None] * len(points)
+    for sample in samples:
+        values[sample['properties']['index']] = sample['properties'].get('mean')
+
+    return values
+
+
+@timed()
+def get_local_pm_raster(
+    cube: PrefixSumCube,
+    start_date: str = DEFAULT_MAP_DATA_START_DATE,
+    end_date: str = DEFAULT_MAP_DATA_END_DATE
+) -> Optional[Tuple[np.ndarray, Affine, Optional[float]]]:
+
+    """
+    Calculates the PM2.5 average raster of a time frame from the local tile store prefix
+    sums, None when the store has not ingested every day of the time frame.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :cube                           : PrefixSumCube
+
+    Default:
+    :start_date                     : 2025-01-01
+    :end_date                       : 2025-12-31
+
+    Output:
+    :image, transform, nodata
+    -----------------------------------------------------------------------------------------
+    """
+
+    start = datetime.date.fromisoformat(start_date)
+    end = datetime.date.fromisoformat(end_date)
+    if not cube.store.covers(start, end):
+        return None
+
+    image = cube.pm25_mean(start, end)
+    logger.info(f'PM2.5 raster of {start_date} to {end_date} has been computed locally.')
+
+    return image, cube.store.grid.transform, None
+
+
+@timed()
+def extract_timeseries_data(
+    cube: PrefixSumCube,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    point_x: Optional[float] = None,
+    point_y: Optional[float] = None,
+    hamburg_geojson_path: str = HAMBURG_GEOJSON_PATH
+) -> Optional[Dict[str, pd.DataFrame]]:
+
+    """
+    Calculates the daily PM2.5 series of [start_date, end_date) from the local tile store,
+    for the grid cell of a point or the AOI mean, and aggregates it into days, ISO weeks,
+    months, years and rolling 7/30-day means. None when the store has not ingested every
+    day of the time frame.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :cube           : PrefixSumCube
+    :start_date     : datetime.date
+    :end_date       : datetime.date
+
+    Optional:
+    :point_x        : float
+    :point_y        : float
+
+    Output:
+    :dict           : {'daily', 'weekly', 'monthly', 'yearly', 'rolling_7', 'rolling_30'}
+    -----------------------------------------------------------------------------------------
+    """
+
+    store = cube.store
+    cell = None
+    if point_x and point_y:
+        col, row = (int(np.floor(value)) for value in ~store.grid.transform * (point_x, point_y))
+        if (not aoi_contains_point(hamburg_geojson_path, point_x, point_y)
+                or not (0 <= row < store.grid.rows and 0 <= col < store.grid.cols)):
+            return 'Points are out of Hamburg bounding box'
+        cell = row, col
+
+    if not store.covers(start_date, end_date):
+        return None
+
+    backend = NumPyBackend()
+    aai = store.read('aai', start_date, end_date)
+    no2 = store.read('no2', start_date, end_date)
+
+    if cell is not None:
+        aai, no2 = aai[(slice(None),) + cell], no2[(slice(None),) + cell]
+    else:
+        aai, no2 = backend.masked_mean(aai, cube.mask), backend.masked_mean(no2, cube.mask)
+
+    dates = np.arange(start_date, end_date, dtype='datetime64[D]')
+    series = aggregate_daily_series(dates, backend.pm25(aai, no2))
+    logger.info(f'PM2.5 time series of {start_date} to {end_date} has been aggregated locally.')
+
+    return series
+
+
+@timed()
+def get_pm_map(
+    hamburg_geojson_path: Path = HAMBURG_GEOJSON_PATH,
+    start_date: str = DEFAULT_MAP_DATA_START_DATE,
+    end_date: str = DEFAULT_MAP_DATA_END_DATE,
+    output_file_path: Optional[Path] = None,
+    write_vector_file: bool = True,
+    cube: Optional[PrefixSumCube] = None
+) -> gpd.GeoDataFrame:
+    
+    """
+    Calculates PM2.5 average values of a time frame and converts the raster to vector
+    format in memory. With a prefix sum cube covering the time frame the raster is computed
+    locally instead of on Earth Engine.
+    -----------------------------------------------------------------------------------------
+    Default:
+    :hamburg_geojson_path           : Input path of the hamburg vector file
+    :start_date                     : 2025-01-01
+    :end_date                       : 2025-12-31
+    :write_vector_file              : Also write the GeoJSON vector file
+
+    Optional:
+    :output_file_path               : Also save the raster map to this path
+    :cube                           : PrefixSumCube of the local tile store
+
+    Output:
+    :Dataframe      : pd.DataFrame
+    -----------------------------------------------------------------------------------------
+    """
+
+    raster = get_local_pm_raster(cube, start_date, end_date) if cube is not None else None
+    if raster is None:
+        image, transform, nodata = download_pm_raster(hamburg_geojson_path, start_date, end_date)
+    else:
+        image, transform, _ = raster
+        image, nodata = np.where(np.isnan(image), TILE_NODATA, image), TILE_NODATA
 
-    geemap.ee_export_image(pm25, filename=output_file_path, scale=1113.2, region=aoi, file_per_band=False)
+    if output_file_path is not None:
+        write_raster(output_file_path, image, transform, nodata)
 
-    vector_data = raster_to_vector()
+    vector_data = raster_array_to_vector(image, transform, nodata, write_vector_file=write_vector_file)
     logger.info('Raster data converted to vector data successfully.')
     
     return vector_data
@@ -1,6 +1,7 @@
+from __future__ import annotations
 from loguru import logger
-import ee
-from sentinel5plib.data_utils import getPM, calculate_mean
+from sentinel5plib.batch_utils import get_period_mean
+from sentinel5plib.ee_client import ee, get_info
 
 
 def get_weekly_average_data(
@@ -24,22 +25,8 @@ def get_weekly_average_data(
     -----------------------------------------------------------------------------------------
     """
 
-    aai_images = images_aai.filter(ee.Filter.eq('week', week_number))
-    aai_image = aai_images.mean()
-    no2_images = images_no2.filter(ee.Filter.eq('week', week_number))
-    no2_image = no2_images.mean()
-
-    combined = aai_image.addBands(no2_image)
-    if combined.bandNames().size().getInfo() == 1:
-        return 0
-    
-    if combined.bandNames().size().getInfo() == 0:
-        return 0
-
-    combined = getPM(combined)
-
-    mean_pm25 = calculate_mean(combined, aoi)
-    logger.info(f'Week {week_number} average has been extracted')
+    mean_pm25 = get_info(get_period_mean(images_aai, images_no2, 'week', week_number, aoi))
+    logger.debug(f'Week {week_number} average has been extracted')
 
     return mean_pm25
 
@@ -65,22 +52,8 @@ def get_monthly_average_data(
     -----------------------------------------------------------------------------------------
     """
 
-    aai_images = images_aai.filter(ee.Filter.eq('month', month_number))
-    aai_image = aai_images.mean()
-    no2_images = images_no2.filter(ee.Filter.eq('month', month_number))
-    no2_image = no2_images.mean()
-
-    combined = aai_image.addBands(no2_image)
-    if combined.bandNames().size().getInfo() == 1:
-        return 0
-    
-    if combined.bandNames().size().getInfo() == 0:
-        return 0
-
-    combined = getPM(combined)
-
-    mean_pm25 = calculate_mean(combined, aoi)
-    logger.info(f'Month {month_number} average has been extracted')
+    mean_pm25 = get_info(get_period_mean(images_aai, images_no2, 'month', month_number, aoi))
+    logger.debug(f'Month {month_number} average has been extracted')
 
     return mean_pm25
 
@@ -106,19 +79,7 @@ def get_yearly_average_data(
     -----------------------------------------------------------------------------------------
     """
 
-    aai_image = images_aai.mean()
-    no2_image = images_no2.mean()
-
-    combined = aai_image.addBands(no2_image)
-    if combined.bandNames().size().getInfo() == 1:
-        return 0
-    
-    if combined.bandNames().size().getInfo() == 0:
-        return 0
-
-    combined = getPM(combined)
-
-    mean_pm25 = calculate_mean(combined, aoi)
-    logger.info(f'Year {year} average has been extracted')
+    mean_pm25 = get_info(get_period_mean(images_aai, images_no2, None, year, aoi))
+    logger.debug(f'Year {year} average has been extracted')
 
     return mean_pm25
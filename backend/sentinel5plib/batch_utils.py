@@ -0,0 +1,162 @@
+from __future__ import annotations
+from loguru import logger
+from typing import Dict, List, Optional, Tuple
+from sentinel5plib.ee_client import ee, get_info
+from sentinel5plib.data_utils import getPM
+
+# Period key -> (image property to filter on, property value). A property of None keeps the
+# whole collection, e.g. the yearly average of a collection filtered to one year.
+Periods = Dict[str, Tuple[Optional[str], Optional[int]]]
+
+
+def get_period_mean(
+    images_aai: ee.ImageCollection,
+    images_no2: ee.ImageCollection,
+    property_name: Optional[str],
+    value: Optional[int],
+    aoi: ee.Geometry
+) -> ee.ComputedObject:
+
+    """
+    Builds the server-side PM2.5 mean of one period without fetching it. Periods without
+    both AAI and NO2 bands evaluate to 0, like the per-period helpers did client-side.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :images_aai     : ee.ImageCollection
+    :images_no2     : ee.ImageCollection
+    :property_name  : day, week, month or None for the whole collection
+    :value          : Integer
+    :aoi            : ee.Geometry
+
+    Output:
+    :ee.ComputedObject
+    -----------------------------------------------------------------------------------------
+    """
+
+    if property_name is not None:
+        images_aai = images_aai.filter(ee.Filter.eq(property_name, value))
+        images_no2 = images_no2.filter(ee.Filter.eq(property_name, value))
+
+    combined = images_aai.mean().addBands(images_no2.mean())
+    mean_pm25 = getPM(combined).reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=aoi,
+        scale=1113.2,
+        maxPixels=1e8
+    ).get('PM25')
+
+    return ee.Algorithms.If(combined.bandNames().size().lt(2), 0, mean_pm25)
+
+
+def get_batched_average_data(
+    images_aai: ee.ImageCollection,
+    images_no2: ee.ImageCollection,
+    periods: Periods,
+    aoi: ee.Geometry
+) -> Dict[str, Optional[float]]:
+
+    """
+    Calculates the PM2.5 mean of several periods with a single getInfo round trip.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :images_aai     : ee.ImageCollection
+    :images_no2     : ee.ImageCollection
+    :periods        : {key: (property_name, value)}, e.g. {'week': ('week', 2)}
+    :aoi            : ee.Geometry
+
+    Output:
+    :dict           : {key: mean PM2.5}
+    -----------------------------------------------------------------------------------------
+    """
+
+    means = get_info(ee.Dictionary({
+        key: get_period_mean(images_aai, images_no2, property_name, value, aoi)
+        for key, (property_name, value) in periods.items()
+    }))
+    logger.debug(f'Averages for {", ".join(periods)} have been extracted in one request.')
+
+    return {key: means.get(key) for key in periods}
+
+
+def get_period_pm_image(
+    images_aai: ee.ImageCollection,
+    images_no2: ee.ImageCollection,
+    property_name: Optional[str],
+    value: Optional[int],
+    band_name: str
+) -> ee.Image:
+
+    """
+    Builds the PM2.5 composite image of one period as a single band named band_name.
+    Periods without both AAI and NO2 bands give a constant 0 image.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :images_aai     : ee.ImageCollection
+    :images_no2     : ee.ImageCollection
+    :property_name  : day, week, month or None for the whole collection
+    :value          : Integer
+    :band_name      : str
+
+    Output:
+    :ee.Image
+    -----------------------------------------------------------------------------------------
+    """
+
+    if property_name is not None:
+        images_aai = images_aai.filter(ee.Filter.eq(property_name, value))
+        images_no2 = images_no2.filter(ee.Filter.eq(property_name, value))
+
+    combined = images_aai.mean().addBands(images_no2.mean())
+    pm25 = getPM(combined).select('PM25').rename(band_name)
+    empty = ee.Image.constant(0).rename(band_name)
+
+    return ee.Image(ee.Algorithms.If(combined.bandNames().size().lt(2), empty, pm25))
+
+
+def get_batched_point_average_data(
+    images_aai: ee.ImageCollection,
+    images_no2: ee.ImageCollection,
+    periods: Periods,
+    points: List[Tuple[float, float]]
+) -> List[Dict[str, Optional[float]]]:
+
+    """
+    Calculates the PM2.5 means of several periods at many points: the period composites are
+    stacked into one image and all points are evaluated with a single reduceRegions.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :images_aai     : ee.ImageCollection
+    :images_no2     : ee.ImageCollection
+    :periods        : {key: (property_name, value)}, e.g. {'week': ('week', 2)}
+    :points         : [(point_x, point_y), ...]
+
+    Output:
+    :list           : [{key: mean PM2.5}, ...] in the order of points
+    -----------------------------------------------------------------------------------------
+    """
+
+    if not points:
+        return []
+
+    image = ee.Image.cat([
+        get_period_pm_image(images_aai, images_no2, property_name, value, key)
+        for key, (property_name, value) in periods.items()
+    ])
+    features = ee.FeatureCollection([
+        ee.Feature(ee.Geometry.Point([point_x, point_y]), {'index': index})
+        for index, (point_x, point_y) in enumerate(points)
+    ])
+
+    samples = get_info(image.reduceRegions(
+        collection=features,
+        reducer=ee.Reducer.mean().forEachBand(image),
+        scale=1113.2
+    ))['features']
+    logger.debug(f'Averages for {", ".join(periods)} at {len(points)} points have been extracted.')
+
+    rows = [dict.fromkeys(periods) for _ in points]
+    for sample in samples:
+        properties = sample['properties']
+        rows[properties['index']].update({key: properties.get(key) for key in periods})
+
+    return rows
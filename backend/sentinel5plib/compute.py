@@ -0,0 +1,146 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from pathlib import Path
+import numpy as np
+from sentinel5plib.ee_client import ee
+from sentinel5plib.lazy_imports import lazy_import
+from sentinel5plib.vector_utils import load_aoi
+from sentinel5plib.data_utils import convertNO2MolM2ToMicrogramM3, getPM
+from sentinel5plib.batch_utils import get_period_mean
+from sentinel5plib.tile_store import TileGrid
+from sentinel5plib.defaults import HAMBURG_GEOJSON_PATH
+
+shapely_vectorized = lazy_import("shapely.vectorized")
+
+ATMOSPHERIC_HEIGHT = 1000.0
+MOLECULAR_WEIGHT_NO2 = 46.0055
+
+
+class ComputeBackend(ABC):
+
+    """
+    PM2.5 building blocks of the analysis, implemented once per data source. Rasters are
+    ee.Image objects for Earth Engine and arrays (time x rows x cols or rows x cols) for
+    NumPy, temporal collections are ee.ImageCollection or arrays with time as first axis.
+    """
+
+    @abstractmethod
+    def convert_no2(self, no2, atmospheric_height: float = ATMOSPHERIC_HEIGHT,
+                    molecular_weight_no2: float = MOLECULAR_WEIGHT_NO2):
+        """NO2 column number density in mol/m² to µg/m³, see convertNO2MolM2ToMicrogramM3."""
+
+    @abstractmethod
+    def pm25(self, aai, no2):
+        """PM2.5 = 5 * NO2 (µg/m³) + 30 * AAI, see getPM."""
+
+    @abstractmethod
+    def composite(self, images):
+        """Temporal mean composite ignoring missing values."""
+
+    @abstractmethod
+    def masked_mean(self, raster, aoi):
+        """Spatial mean of a PM2.5 raster over the AOI."""
+
+    def period_mean(self, images_aai, images_no2, aoi):
+
+        """
+        PM2.5 mean of a period over the AOI from the AAI and NO2 (µg/m³) images of the
+        period, 0 when the period has no images.
+        """
+
+        return self.masked_mean(self.pm25(self.composite(images_aai), self.composite(images_no2)), aoi)
+
+
+class EarthEngineBackend(ComputeBackend):
+
+    """
+    Builds the computations server-side, results are lazy ee objects (call getInfo). The
+    reference the local NumPy backend is checked against, the analysis itself builds its
+    Earth Engine graphs in batch_utils and data_utils.
+    """
+
+    def convert_no2(self, no2, atmospheric_height=ATMOSPHERIC_HEIGHT, molecular_weight_no2=MOLECULAR_WEIGHT_NO2):
+        return convertNO2MolM2ToMicrogramM3(no2, atmospheric_height, molecular_weight_no2).select('NO2_in_µg_per_m3')
+
+    def pm25(self, aai, no2):
+        return getPM(aai.addBands(no2)).select('PM25')
+
+    def composite(self, images):
+        return images.mean()
+
+    def masked_mean(self, raster, aoi):
+        return raster.reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=aoi,
+            scale=1113.2,
+            maxPixels=1e8
+        ).get('PM25')
+
+    def period_mean(self, images_aai, images_no2, aoi):
+        return get_period_mean(images_aai, images_no2, None, None, aoi)
+
+
+class NumPyBackend(ComputeBackend):
+
+    """
+    Computes on local arrays, e.g. from the tile store. NaN marks missing data, AOIs are
+    boolean masks of the grid (see aoi_mask). Everything is vectorized over time.
+    """
+
+    def convert_no2(self, no2, atmospheric_height=ATMOSPHERIC_HEIGHT, molecular_weight_no2=MOLECULAR_WEIGHT_NO2):
+        return np.asarray(no2) / atmospheric_height * molecular_weight_no2 * 1e6
+
+    def pm25(self, aai, no2):
+        return 5 * np.asarray(no2) + 30 * np.asarray(aai)
+
+    def composite(self, images):
+        return nan_mean(np.asarray(images), axis=0)
+
+    def masked_mean(self, raster, aoi):
+        raster = np.asarray(raster)
+        return nan_mean(raster[..., aoi], axis=-1)
+
+    def period_mean(self, images_aai, images_no2, aoi):
+        # Local stacks cannot tell days without scenes from fully masked scenes, a period
+        # without any valid value counts as a period without images.
+        images_aai, images_no2 = np.asarray(images_aai), np.asarray(images_no2)
+        if not np.isfinite(images_aai).any() or not np.isfinite(images_no2).any():
+            return 0.0
+        mean = float(super().period_mean(images_aai, images_no2, aoi))
+        return None if np.isnan(mean) else mean
+
+
+def nan_mean(values: np.ndarray, axis: int) -> np.ndarray:
+
+    """
+    Mean over axis ignoring NaN, NaN where all values are missing. Accumulates in float64
+    and does not warn on empty slices, unlike np.nanmean.
+    """
+
+    valid = np.isfinite(values)
+    sums = np.where(valid, values, 0).sum(axis=axis, dtype=np.float64)
+    counts = valid.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def aoi_mask(grid: TileGrid, hamburg_geojson_path: Path = HAMBURG_GEOJSON_PATH) -> np.ndarray:
+
+    """
+    Boolean rows x cols mask of the grid cells whose center lies inside the AOI.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :grid                   : TileGrid
+
+    Default:
+    :hamburg_geojson_path   : Input path of the hamburg vector file
+
+    Output:
+    :np.ndarray
+    -----------------------------------------------------------------------------------------
+    """
+
+    cols, rows = np.meshgrid(np.arange(grid.cols) + 0.5, np.arange(grid.rows) + 0.5)
+    x, y = grid.transform * (cols, rows)
+
+    return shapely_vectorized.contains(load_aoi(hamburg_geojson_path)[1].context, x, y)
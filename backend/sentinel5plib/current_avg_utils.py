@@ -1,8 +1,10 @@
+from __future__ import annotations
 from loguru import logger
-import pandas as pd
-import ee
-from sentinel5plib.data_utils import getPM, calculate_mean
-ee.Initialize()
+from sentinel5plib.batch_utils import get_period_mean
+from sentinel5plib.ee_client import ee, get_info
+from sentinel5plib.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
 
 
 def get_current_day_average(
@@ -26,28 +28,11 @@ def get_current_day_average(
     -----------------------------------------------------------------------------------------
     """
 
-    current_daily_aai_images = images_aai.filter(ee.Filter.eq('day', current_day))
-    current_daily_aai_image = current_daily_aai_images.mean()
-    current_daily_no2_images = images_no2.filter(ee.Filter.eq('day', current_day))
-    current_daily_no2_image = current_daily_no2_images.mean()
-
-    combined = current_daily_aai_image.addBands(current_daily_no2_image)
-
-    results = []
-
-    if combined.bandNames().size().getInfo() == 0:
-        results.append({'Current_day_week_year': current_day, 'Average_PM2.5': 0})
-    
-    elif combined.bandNames().size().getInfo() == 1:
-        results.append({'Current_day_week_year': current_day, 'Average_PM2.5': 0})
-
-    else:
-        combined = getPM(combined)
-        mean_pm25 = calculate_mean(combined, aoi)
-        results.append({'Current_day_week_year': current_day, 'Average_PM2.5': mean_pm25})
+    mean_pm25 = get_info(get_period_mean(images_aai, images_no2, 'day', current_day, aoi))
+    results = [{'Current_day_week_year': current_day, 'Average_PM2.5': mean_pm25}]
 
     df = pd.DataFrame(results)
-    logger.info(f'Mean values for current day: {current_day} have been extracted')
+    logger.debug(f'Mean values for current day: {current_day} have been extracted')
 
     return df
 
@@ -73,28 +58,11 @@ def get_current_weekly_average(
     -----------------------------------------------------------------------------------------
     """
     
-    current_week_aai_images = images_aai.filter(ee.Filter.eq('week', current_week))
-    current_week_aai_image = current_week_aai_images.mean()
-    current_week_no2_images = images_no2.filter(ee.Filter.eq('week', current_week))
-    current_week_no2_image = current_week_no2_images.mean()
-
-    combined = current_week_aai_image.addBands(current_week_no2_image)
-
-    results = []
-
-    if combined.bandNames().size().getInfo() == 0:
-        results.append({'Current_day_week_year': current_week, 'Average_PM2.5': 0})
-
-    elif combined.bandNames().size().getInfo() == 1:
-        results.append({'Current_day_week_year': current_week, 'Average_PM2.5': 0})
-
-    else:
-        combined = getPM(combined)
-        mean_pm25 = calculate_mean(combined, aoi)
-        results.append({'Current_day_week_year': current_week, 'Average_PM2.5': mean_pm25})
+    mean_pm25 = get_info(get_period_mean(images_aai, images_no2, 'week', current_week, aoi))
+    results = [{'Current_day_week_year': current_week, 'Average_PM2.5': mean_pm25}]
 
     df = pd.DataFrame(results)
-    logger.info(f'Mean values for current week: {current_week} have been extracted')
+    logger.debug(f'Mean values for current week: {current_week} have been extracted')
 
     return df
 
@@ -120,25 +88,10 @@ def get_current_year_average(
     -----------------------------------------------------------------------------------------
     """
     
-    current_year_aai_image = images_aai.mean()
-    current_year_no2_image = images_no2.mean()
-
-    combined = current_year_aai_image.addBands(current_year_no2_image)
-
-    results = []
-
-    if combined.bandNames().size().getInfo() == 0:
-        results.append({'Current_day_week_year': current_year, 'Average_PM2.5': 0})
-
-    elif combined.bandNames().size().getInfo() == 1:
-        results.append({'Current_day_week_year': current_year, 'Average_PM2.5': 0})
-
-    else:
-        combined = getPM(combined)
-        mean_pm25 = calculate_mean(combined, aoi)
-        results.append({'Current_day_week_year': current_year, 'Average_PM2.5': mean_pm25})
+    mean_pm25 = get_info(get_period_mean(images_aai, images_no2, None, current_year, aoi))
+    results = [{'Current_day_week_year': current_year, 'Average_PM2.5': mean_pm25}]
 
     df = pd.DataFrame(results)
-    logger.info(f'Mean values for current year: {current_year} have been extracted')
+    logger.debug(f'Mean values for current year: {current_year} have been extracted')
 
     return df
\ No newline at end of file
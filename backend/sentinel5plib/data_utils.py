@@ -1,6 +1,7 @@
+from __future__ import annotations
 from loguru import logger
-import ee
-ee.Initialize()
+from sentinel5plib.ee_client import ee, get_info
+from sentinel5plib.metrics import timed
 
 
 def selectAAI(image: ee.Image) -> ee.Image:
@@ -16,10 +17,7 @@ def selectAAI(image: ee.Image) -> ee.Image:
     -----------------------------------------------------------------------------------------
     """
 
-    bands = image.select(['absorbing_aerosol_index'])
-    logger.info('Absorbing Aerosol Index band has been selected.')
-
-    return bands
+    return image.select(['absorbing_aerosol_index'])
 
 
 def selectNO2(image: ee.Image) -> ee.Image:
@@ -35,10 +33,7 @@ def selectNO2(image: ee.Image) -> ee.Image:
     -----------------------------------------------------------------------------------------
     """
 
-    bands = image.select(['NO2_column_number_density'])
-    logger.info('NO2 Column Number Density band has been selected.')
-
-    return bands
+    return image.select(['NO2_column_number_density'])
 
 
 def addDAY_of_year(image: ee.Image) -> ee.Image:
@@ -53,10 +48,7 @@ def addDAY_of_year(image: ee.Image) -> ee.Image:
     -----------------------------------------------------------------------------------------
     """
 
-    day = image.date().get('day')
-    logger.info('Day numbers added.')
-    
-    return image.set('day', day)
+    return image.set('day', image.date().get('day'))
 
 
 def addWEEK_of_year(image: ee.Image) -> ee.Image:
@@ -72,10 +64,7 @@ def addWEEK_of_year(image: ee.Image) -> ee.Image:
     -----------------------------------------------------------------------------------------
     """
 
-    week = image.date().get('week')
-    logger.info('Week numbers added.')
-
-    return image.set('week', week)
+    return image.set('week', image.date().get('week'))
 
 
 def addMONTH_of_year(image: ee.Image) -> ee.Image:
@@ -91,10 +80,7 @@ def addMONTH_of_year(image: ee.Image) -> ee.Image:
     -----------------------------------------------------------------------------------------
     """
 
-    month = image.date().get('month')
-    logger.info('Month numbers added.')
-    
-    return image.set('month', month)
+    return image.set('month', image.date().get('month'))
 
 
 def convertNO2MolM2ToMicrogramM3(
@@ -123,12 +109,10 @@ def convertNO2MolM2ToMicrogramM3(
     # mol/m³ to µg/m³ (multiply by molecular weight of NO2 and 1e6 for µg)
     no2_in_microgram_m3 = no2_in_mol_m3.multiply(molecular_weight_no2).multiply(1e6)
     
-    image = image.addBands(no2_in_microgram_m3.rename('NO2_in_µg_per_m3'))
-    logger.info('NO2_in_µg_per_m3 band has been added to the Image Collection.')
-    
-    return image
+    return image.addBands(no2_in_microgram_m3.rename('NO2_in_µg_per_m3'))
 
 
+@timed()
 def get_sentinel5p_image_collection(
     product: str,
     data: str, 
@@ -163,7 +147,7 @@ def get_sentinel5p_image_collection(
         ).map(addWEEK_of_year
         ).map(addMONTH_of_year
         ).select(band_name)
-    logger.info(f'{product}/{data} Images has been extracted.')
+    logger.debug(f'{product}/{data} Images has been extracted.')
     
     return images
 
@@ -202,11 +186,36 @@ def get_sentinel5p_image_collection_range(
         ).map(addWEEK_of_year
         ).map(addMONTH_of_year
         ).select(band_name)
-    logger.info(f'OFFL/{data} Images has been extracted.')
+    logger.debug(f'OFFL/{data} Images has been extracted.')
     
     return images
 
 
+def get_latest_granule_time(
+    product: str,
+    data: str,
+    aoi: ee.Geometry
+) -> ee.Number:
+
+    """
+    Start time of the newest Sentinel 5P image of a collection covering the AOI.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :product    : NRTI/OFFL
+    :data       : NO2 or AER_AI
+    :aoi        : ee.Geometry
+
+    Output:
+    :time       : ee.Number, milliseconds since epoch
+    -----------------------------------------------------------------------------------------
+    """
+
+    return ee.ImageCollection(
+        f"COPERNICUS/S5P/{product}/L3_{data}"
+        ).filterBounds(aoi
+        ).aggregate_max('system:time_start')
+
+
 def getPM(image: ee.image) -> ee.image:
 
     """
@@ -226,12 +235,11 @@ def getPM(image: ee.image) -> ee.image:
             'NO2': image.select('NO2_in_µg_per_m3'),
             'AAI': image.select('absorbing_aerosol_index')
         }).rename("PM25")
-    image = image.addBands(PM25)
-    logger.info('PM25 band has been added.')
 
-    return(image)
+    return image.addBands(PM25)
 
 
+@timed()
 def calculate_mean(image: ee.Image, aoi: ee.Geometry) -> float:
 
     """
@@ -246,12 +254,12 @@ def calculate_mean(image: ee.Image, aoi: ee.Geometry) -> float:
     -----------------------------------------------------------------------------------------
     """
 
-    mean_aai = image.reduceRegion(
+    mean_aai = get_info(image.reduceRegion(
         reducer=ee.Reducer.mean(),
         geometry=aoi,
         scale=1113.2, 
         maxPixels=1e8
-    ).get('PM25').getInfo()
-    logger.info('Average value has been calculated.')
+    ).get('PM25'))
+    logger.debug('Average value has been calculated.')
 
     return mean_aai
\ No newline at end of file
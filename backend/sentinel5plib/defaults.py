@@ -6,4 +6,9 @@ DEFAULT_MAP_RASTER_OUTPUT_PATH = 'sentinel5plib/maps/raster_map.tif'
 DEFAULT_MAP_VECTOR_OUTPUT_PATH = 'sentinel5plib/maps/vector_map.geojson'
 DEFAULT_MAP_DATA_START_DATE = '2025-01-01'
 DEFAULT_MAP_DATA_END_DATE = '2025-12-31'
-   
+DEFAULT_TILE_STORE_PATH = 'cache/tiles'
+DEFAULT_TILE_INGEST_START_DATE = '2025-01-01'
+# Sentinel-5P L3 collections are gridded at 0.01 arc degrees (1113.2 m).
+S5P_GRID_CELL_DEGREES = 0.01
+# OFFL scenes of a day are complete this many days later.
+OFFL_SETTLE_DAYS = 14
@@ -0,0 +1,198 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+from sentinel5plib.lazy_imports import lazy_import
+from sentinel5plib.metrics import count_ee_call
+
+# Concurrent Earth Engine requests, seconds a caller waits for one, and retries of calls
+# rejected by the Earth Engine quota (exponential backoff starting at EE_BACKOFF_SECONDS).
+EE_MAX_WORKERS = int(os.environ.get("PM25_EE_MAX_WORKERS", 8))
+EE_TIMEOUT_SECONDS = float(os.environ.get("PM25_EE_TIMEOUT_SECONDS", 300))
+EE_MAX_RETRIES = int(os.environ.get("PM25_EE_MAX_RETRIES", 3))
+EE_BACKOFF_SECONDS = float(os.environ.get("PM25_EE_BACKOFF_SECONDS", 1.0))
+# Messages of ee.EEException raised for rate and concurrency limits.
+QUOTA_ERROR_MARKERS = ("quota", "too many concurrent", "too many requests", "rate limit", "429")
+
+
+def initialize_ee(module):
+
+    """
+    Authenticates the Earth Engine session. Runs once per process, on the first use of ee.
+    """
+
+    module.Initialize()
+    logger.info("Earth Engine initialised.")
+
+
+# The earthengine-api, imported and initialised on first attribute access. Modules use
+# this instead of `import ee` so importing the app makes no Earth Engine calls.
+ee = lazy_import("ee", on_import=initialize_ee)
+
+
+class EarthEngineTimeout(TimeoutError):
+    pass
+
+
+def is_quota_error(error: Exception) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in QUOTA_ERROR_MARKERS)
+
+
+def graph_key(obj, *extra) -> Optional[str]:
+
+    """
+    Coalescing key of an ee object: its serialized computation graph, None when the object
+    cannot be serialized (the call is then never shared).
+    """
+
+    try:
+        serialized = obj.serialize()
+    except Exception:
+        return None
+    if not isinstance(serialized, str):
+        return None
+    return serialized + "".join(f"|{item!r}" for item in extra)
+
+
+class EarthEngineClient:
+
+    """
+    Facade over blocking Earth Engine evaluations. Calls run in a bounded thread pool, so
+    at most max_workers requests reach Earth Engine at a time. Concurrent calls with the
+    same key (the serialized ee graph) share one evaluation. Callers wait at most timeout
+    seconds, and calls failing with a quota error are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = EE_MAX_WORKERS,
+        timeout: float = EE_TIMEOUT_SECONDS,
+        max_retries: int = EE_MAX_RETRIES,
+        backoff_seconds: float = EE_BACKOFF_SECONDS
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.queued = 0
+        self.running = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.failures = 0
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="earthengine")
+
+    def _run(self, func: Callable[[], Any], key: Optional[str]):
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            attempt = 0
+            while True:
+                with self._lock:
+                    self.calls += 1
+                try:
+                    return func()
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_quota_error(e):
+                        with self._lock:
+                            self.failures += 1
+                        raise
+                    delay = self.backoff_seconds * 2 ** attempt
+                    attempt += 1
+                    with self._lock:
+                        self.retries += 1
+                    logger.warning(f"Earth Engine quota exceeded, retry {attempt} in {delay:.1f} s: {str(e)}")
+                    time.sleep(delay)
+        finally:
+            with self._lock:
+                self.running -= 1
+                if key is not None:
+                    self._in_flight.pop(key, None)
+
+    def submit(self, func: Callable[[], Any], key: Optional[str] = None) -> Future:
+
+        """
+        Schedules func in the pool, or returns the future of the in-flight call with the
+        same key.
+        """
+
+        with self._lock:
+            if key is not None and key in self._in_flight:
+                self.coalesced += 1
+                return self._in_flight[key]
+            self.queued += 1
+            count_ee_call()
+            # The worker logs with the correlation ID of the request that started the call.
+            future = self._executor.submit(contextvars.copy_context().run, self._run, func, key)
+            if key is not None:
+                self._in_flight[key] = future
+        return future
+
+    def result(self, future: Future, timeout: Optional[float] = None):
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise EarthEngineTimeout("Earth Engine request timed out.")
+
+    async def result_async(self, future: Future, timeout: Optional[float] = None):
+        # Shielded: a timed out waiter must not cancel the call other waiters share.
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(future)),
+                self.timeout if timeout is None else timeout
+            )
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise EarthEngineTimeout("Earth Engine request timed out.")
+
+    def call(self, func: Callable[[], Any], key: Optional[str] = None, timeout: Optional[float] = None):
+        return self.result(self.submit(func, key), timeout)
+
+    def get_info(self, obj, timeout: Optional[float] = None):
+
+        """
+        Blocking obj.getInfo() through the pool, for code running outside the event loop.
+        """
+
+        return self.call(obj.getInfo, graph_key(obj), timeout)
+
+    async def get_info_async(self, obj, timeout: Optional[float] = None):
+
+        """
+        obj.getInfo() through the pool without blocking the event loop.
+        """
+
+        return await self.result_async(self.submit(obj.getInfo, graph_key(obj)), timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "in_flight": len(self._in_flight),
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "retries": self.retries,
+                "timeouts": self.timeouts,
+                "failures": self.failures,
+            }
+
+
+EE_CLIENT = EarthEngineClient()
+
+
+def get_info(obj, timeout: Optional[float] = None):
+    return EE_CLIENT.get_info(obj, timeout)
@@ -0,0 +1,64 @@
+import importlib
+import threading
+import types
+from typing import Callable, Optional
+
+
+class LazyModule(types.ModuleType):
+
+    """
+    Module imported on first attribute access, so importing the app does not load the
+    heavy dependencies until a request needs them.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :name           : dotted module name, e.g. "rasterio.io"
+
+    Optional:
+    :on_import      : called once with the module before its first use, retried if it raises
+    -----------------------------------------------------------------------------------------
+    """
+
+    def __init__(self, name: str, on_import: Optional[Callable[[types.ModuleType], None]] = None):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_on_import"] = on_import
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is not None:
+            return module
+        with self.__dict__["_lazy_lock"]:
+            module = self.__dict__["_lazy_module"]
+            if module is None:
+                module = importlib.import_module(self.__name__)
+                on_import = self.__dict__["_lazy_on_import"]
+                if on_import is not None:
+                    on_import(module)
+                self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_lazy_module"] is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str, on_import: Optional[Callable[[types.ModuleType], None]] = None) -> LazyModule:
+    return LazyModule(name, on_import)
+
+
+def is_loaded(module) -> bool:
+
+    """
+    Whether a lazy module has been imported; plain modules always are.
+    """
+
+    if isinstance(module, LazyModule):
+        return module.__dict__["_lazy_module"] is not None
+    return True
@@ -0,0 +1,76 @@
+import contextvars
+import os
+import random
+import re
+import sys
+import uuid
+from typing import Optional
+from loguru import logger
+
+# Minimum level of the log sink. Per-call helper logs are DEBUG, request spans INFO.
+LOG_LEVEL = os.environ.get("PM25_LOG_LEVEL", "INFO").upper()
+# One JSON object per line (with the bound extras) instead of the text format.
+LOG_JSON = os.environ.get("PM25_LOG_JSON", "0") == "1"
+# Share of successful, fast requests whose span is logged. Failed and slow requests are
+# always logged.
+LOG_SAMPLE_RATE = float(os.environ.get("PM25_LOG_SAMPLE_RATE", 1.0))
+LOG_SLOW_SECONDS = float(os.environ.get("PM25_LOG_SLOW_SECONDS", 1.0))
+LOG_FORMAT = (
+    "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+    "{extra[request_id]} | <cyan>{name}</cyan>:<cyan>{function}</cyan> - <level>{message}</level>"
+)
+NO_REQUEST_ID = "-"
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+_request_id: "contextvars.ContextVar[str]" = contextvars.ContextVar("request_id", default=NO_REQUEST_ID)
+
+
+def _add_request_id(record):
+    record["extra"].setdefault("request_id", _request_id.get())
+
+
+def configure_logging(level: str = LOG_LEVEL, serialize: bool = LOG_JSON, sink=sys.stderr):
+
+    """
+    Replaces the default loguru sink with one filtered at level, every record carries the
+    correlation ID of the request it was logged for.
+    """
+
+    logger.remove()
+    logger.configure(patcher=_add_request_id)
+    logger.add(sink, level=level, format=LOG_FORMAT, serialize=serialize)
+
+
+def request_id_from_header(value: Optional[str]) -> str:
+
+    """
+    Correlation ID of a request: the client's X-Request-ID when it is a plain token,
+    otherwise a new random one.
+    """
+
+    if value and REQUEST_ID_PATTERN.match(value):
+        return value
+    return uuid.uuid4().hex[:16]
+
+
+def bind_request_id(request_id: str) -> contextvars.Token:
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token: contextvars.Token):
+    _request_id.reset(token)
+
+
+def current_request_id() -> str:
+    return _request_id.get()
+
+
+def sample_request(
+    status: int,
+    duration: float,
+    rate: float = LOG_SAMPLE_RATE,
+    slow_seconds: float = LOG_SLOW_SECONDS
+) -> bool:
+    if status >= 500 or duration >= slow_seconds:
+        return True
+    return random.random() < rate
@@ -0,0 +1,141 @@
+import math
+import struct
+import zlib
+import numpy as np
+from affine import Affine
+from typing import Dict, Optional, Tuple
+from sentinel5plib.raster_utils import WEB_TILE_SIZE, zoom_factor
+from sentinel5plib.metrics import timed
+
+# Bands of the frontend AirQualityLevels table (AQI 50, 100, 150, 200, 300) as PM2.5
+# µg/m³ upper bounds of the EPA 24h breakpoints, with the EPA AQI colors. Values above the
+# last bound are Hazardous.
+AQI_PM25_BOUNDS = np.array([12.0, 35.4, 55.4, 150.4, 250.4])
+AQI_COLORS = np.array([
+    (0, 228, 0, 255),       # Good
+    (255, 255, 0, 255),     # Moderate
+    (255, 126, 0, 255),     # Unhealthy for Sensitive Groups
+    (255, 0, 0, 255),       # Unhealthy
+    (143, 63, 151, 255),    # Very Unhealthy
+    (126, 0, 35, 255),      # Hazardous
+], dtype=np.uint8)
+TRANSPARENT = np.zeros(4, dtype=np.uint8)
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_COMPRESS_LEVEL = 6
+
+
+def tile_pixel_centers(z: int, x: int, y: int, size: int = WEB_TILE_SIZE) -> Tuple[np.ndarray, np.ndarray]:
+
+    """
+    Longitudes of the pixel columns and latitudes of the pixel rows of a Web Mercator
+    XYZ tile, at the pixel centers.
+    """
+
+    tiles = 2 ** z
+    offsets = (np.arange(size) + 0.5) / size
+    lons = (x + offsets) / tiles * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(math.pi * (1 - 2 * (y + offsets) / tiles))))
+    return lons, lats
+
+
+def colorize(values: np.ndarray, nodata: Optional[float] = None) -> np.ndarray:
+
+    """
+    RGBA image of PM2.5 values colored by AQI band, nodata and NaN cells are transparent.
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.isfinite(values)
+    if nodata is not None:
+        valid &= values != nodata
+
+    rgba = AQI_COLORS[np.searchsorted(AQI_PM25_BOUNDS, np.where(valid, values, 0.0))]
+    rgba[~valid] = TRANSPARENT
+    return rgba
+
+
+def render_tile(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float],
+    z: int,
+    x: int,
+    y: int,
+    size: int = WEB_TILE_SIZE
+) -> np.ndarray:
+
+    """
+    Colorized Web Mercator tile of a north-up EPSG:4326 raster, sampling the cell under each
+    pixel center.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+    :nodata         : Nodata value of the raster
+    :z, x, y        : XYZ tile index
+
+    Optional:
+    :size           : Tile width in pixels, default 256
+
+    Output:
+    :np.ndarray     : uint8 RGBA (size x size x 4), transparent outside the raster
+    -----------------------------------------------------------------------------------------
+    """
+
+    lons, lats = tile_pixel_centers(z, x, y, size)
+    cols = np.floor((lons - transform.c) / transform.a).astype(np.int64)
+    rows = np.floor((lats - transform.f) / transform.e).astype(np.int64)
+    col_valid = (cols >= 0) & (cols < image.shape[1])
+    row_valid = (rows >= 0) & (rows < image.shape[0])
+
+    if not col_valid.any() or not row_valid.any():
+        return np.zeros((size, size, 4), dtype=np.uint8)
+
+    values = np.asarray(image)[np.clip(rows, 0, image.shape[0] - 1)[:, None],
+                               np.clip(cols, 0, image.shape[1] - 1)[None, :]]
+    rgba = colorize(values, nodata)
+    rgba[~(row_valid[:, None] & col_valid[None, :])] = TRANSPARENT
+    return rgba
+
+
+@timed()
+def render_pyramid_tile(
+    raster: Tuple[np.ndarray, Affine, Optional[float]],
+    levels: Dict[int, np.ndarray],
+    z: int,
+    x: int,
+    y: int
+) -> np.ndarray:
+
+    """
+    Renders a tile from the finest pyramid level whose cells are at least one tile pixel
+    wide, so zoomed-out tiles show block means instead of single sampled cells.
+    """
+
+    image, transform, nodata = raster
+    factor = zoom_factor(z, transform.a, (1,) + tuple(levels), min_cell_pixels=1)
+    if factor > 1:
+        image, transform = levels[factor], transform * Affine.scale(factor)
+    return render_tile(image, transform, nodata, z, x, y)
+
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+
+def encode_png(rgba: np.ndarray, level: int = PNG_COMPRESS_LEVEL) -> bytes:
+
+    """
+    Encodes an RGBA uint8 image (rows x cols x 4) as an 8 bit truecolor alpha PNG.
+    """
+
+    height, width = rgba.shape[:2]
+    scanlines = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    scanlines[:, 1:] = rgba.reshape(height, width * 4)
+
+    return b''.join([
+        PNG_SIGNATURE,
+        _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0)),
+        _png_chunk(b'IDAT', zlib.compress(scanlines.tobytes(), level)),
+        _png_chunk(b'IEND', b'')
+    ])
@@ -0,0 +1,239 @@
+import bisect
+import contextvars
+import functools
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Prometheus text exposition format 0.0.4.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds, from in-memory numpy work up to Earth Engine exports.
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# Bytes, 1 KiB to 64 MiB.
+SIZE_BUCKETS = tuple(1024 * 4 ** power for power in range(9))
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Labels, float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+
+    """
+    Base of the metric types: a name, help text and one value per label combination.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}.")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[Sample]:
+        """(name, labels, value) of every exposed series."""
+
+
+class Counter(Metric):
+
+    """
+    Monotonic count, exposed with the _total suffix.
+    """
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(f"{name}_total", documentation, labelnames)
+        self._values: Dict[Labels, float] = {} if labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, key, value) for key, value in self._values.items()]
+
+
+class Histogram(Metric):
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._counts: Dict[Labels, List[int]] = {}
+        self._sums: Dict[Labels, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[index] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def sum(self, **labels) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), cumulative))
+                samples.append((f"{self.name}_sum", key, self._sums[key]))
+                samples.append((f"{self.name}_count", key, cumulative))
+        return samples
+
+
+class Registry:
+
+    """
+    Metrics of the process. Collectors are called at scrape time and return
+    (name, kind, documentation, samples) of values kept elsewhere, e.g. cache counters.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        with self._lock:
+            self._collectors.append(collector)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DURATION_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def exposition(self) -> str:
+        families = [(metric.name, metric.kind, metric.documentation, metric.samples())
+                    for metric in self._metrics.values()]
+        for collector in self._collectors:
+            families.extend(collector())
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{sample}{_format_labels(labels)} {_format_value(value)}"
+                         for sample, labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+FUNCTION_DURATION = REGISTRY.histogram(
+    "pm25_function_duration_seconds", "Duration of instrumented functions.", ["function"])
+FUNCTION_ERRORS = REGISTRY.counter(
+    "pm25_function_errors", "Exceptions raised by instrumented functions.", ["function"])
+EE_CALLS = REGISTRY.counter(
+    "pm25_ee_calls", "Earth Engine evaluations sent, coalesced calls excluded.")
+
+# Earth Engine calls of the request being served, see count_ee_call.
+_request_ee_calls: "contextvars.ContextVar[Optional[List[int]]]" = contextvars.ContextVar(
+    "request_ee_calls", default=None)
+
+
+def timed(name: Optional[str] = None) -> Callable:
+
+    """
+    Decorator recording the duration of each call in pm25_function_duration_seconds and
+    exceptions in pm25_function_errors, labeled with name (default module.function).
+    """
+
+    def decorator(func: Callable) -> Callable:
+        label = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                FUNCTION_ERRORS.inc(function=label)
+                raise
+            finally:
+                FUNCTION_DURATION.observe(time.perf_counter() - start, function=label)
+
+        return wrapper
+
+    return decorator
+
+
+def start_request_ee_count() -> contextvars.Token:
+
+    """
+    Starts counting the Earth Engine calls of the current request, worker threads started
+    from it share the count through the copied context.
+    """
+
+    return _request_ee_calls.set([0])
+
+
+def finish_request_ee_count(token: contextvars.Token) -> int:
+    count = _request_ee_calls.get()
+    _request_ee_calls.reset(token)
+    return count[0] if count else 0
+
+
+def count_ee_call():
+    EE_CALLS.inc()
+    count = _request_ee_calls.get()
+    if count is not None:
+        count[0] += 1
@@ -0,0 +1,118 @@
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+import numpy as np
+from loguru import logger
+from sentinel5plib.tile_store import TileStore, TILE_VARIABLES
+from sentinel5plib.compute import NumPyBackend
+
+# A year of prefix sums of the Hamburg AOI cells takes ~85 MB, keep the latest two years.
+DEFAULT_MAX_CUBE_YEARS = 2
+
+
+class PrefixSumCube:
+
+    """
+    Cumulative sums and valid counts over the days of each year of the tile store, for
+    the AOI cells only. The per-pixel mean of any date range is the difference of two
+    slices divided by the difference of the counts, O(pixels) whatever the range length.
+    Year cubes are built on first use and rebuilt after the store ingested new days.
+    """
+
+    def __init__(self, store: TileStore, mask: np.ndarray, max_years: int = DEFAULT_MAX_CUBE_YEARS):
+        self.store = store
+        self.mask = mask
+        self.max_years = max_years
+        self._cells = np.flatnonzero(mask)
+        self._years: "OrderedDict[int, Tuple[int, Dict[str, Tuple[np.ndarray, np.ndarray]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._backend = NumPyBackend()
+
+    def _build_year(self, year: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        start, end = datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        cube = {}
+        for variable in TILE_VARIABLES:
+            stack = self.store.read(variable, start, end)
+            values = stack.reshape(stack.shape[0], -1)[:, self._cells]
+            valid = np.isfinite(values)
+
+            sums = np.zeros((values.shape[0] + 1, values.shape[1]), dtype=np.float64)
+            np.cumsum(np.where(valid, values, 0), axis=0, dtype=np.float64, out=sums[1:])
+            counts = np.zeros(sums.shape, dtype=np.uint16)
+            np.cumsum(valid, axis=0, dtype=np.uint16, out=counts[1:])
+            cube[variable] = (sums, counts)
+
+        logger.info(f'Prefix sums of {year} have been built.')
+        return cube
+
+    def _year(self, year: int) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        with self._lock:
+            cached = self._years.get(year)
+            if cached is not None and cached[0] == self.store.version:
+                self._years.move_to_end(year)
+                return cached[1]
+
+            version = self.store.version
+            cube = self._build_year(year)
+            self._years[year] = (version, cube)
+            self._years.move_to_end(year)
+            while len(self._years) > self.max_years:
+                self._years.popitem(last=False)
+
+            return cube
+
+    def range_mean(self, variable: str, start_date: datetime.date, end_date: datetime.date) -> np.ndarray:
+
+        """
+        Per AOI cell mean of [start_date, end_date), NaN for cells without data.
+        -----------------------------------------------------------------------------------------
+        Required:
+        :variable       : aai or no2
+        :start_date     : datetime.date
+        :end_date       : datetime.date
+
+        Output:
+        :np.ndarray     : one value per AOI cell
+        -----------------------------------------------------------------------------------------
+        """
+
+        sums = np.zeros(self._cells.size, dtype=np.float64)
+        counts = np.zeros(self._cells.size, dtype=np.int64)
+
+        for year in range(start_date.year, end_date.year + 1):
+            year_start = datetime.date(year, 1, 1)
+            first = (max(start_date, year_start) - year_start).days
+            last = (min(end_date, datetime.date(year + 1, 1, 1)) - year_start).days
+            if last <= first:
+                continue
+            year_sums, year_counts = self._year(year)[variable]
+            sums += year_sums[last] - year_sums[first]
+            counts += year_counts[last].astype(np.int64) - year_counts[first]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def pm25_mean(self, start_date: datetime.date, end_date: datetime.date) -> np.ndarray:
+
+        """
+        PM2.5 mean raster of [start_date, end_date) from the AAI and NO2 means, like
+        get_pm_image. Cells outside the AOI are NaN.
+        -----------------------------------------------------------------------------------------
+        Required:
+        :start_date     : datetime.date
+        :end_date       : datetime.date
+
+        Output:
+        :np.ndarray     : rows x cols
+        -----------------------------------------------------------------------------------------
+        """
+
+        pm25 = self._backend.pm25(
+            self.range_mean('aai', start_date, end_date),
+            self.range_mean('no2', start_date, end_date)
+        )
+        image = np.full(self.mask.size, np.nan, dtype=np.float64)
+        image[self._cells] = pm25
+
+        return image.reshape(self.mask.shape)
@@ -1,17 +1,202 @@
-import rasterio
-import geopandas as gpd
-from shapely.geometry import Point
+from __future__ import annotations
+import base64
+import io
+import math
+import zipfile
+import numpy as np
+from affine import Affine
 from pathlib import Path
+from typing import Dict, Iterator, Optional, Sequence, Tuple
 from loguru import logger
+from sentinel5plib.lazy_imports import lazy_import
+from sentinel5plib.metrics import timed
 from sentinel5plib.defaults import (
     DEFAULT_MAP_RASTER_OUTPUT_PATH,
     DEFAULT_MAP_VECTOR_OUTPUT_PATH
 )
 
+rasterio = lazy_import("rasterio")
+rasterio_io = lazy_import("rasterio.io")
+gpd = lazy_import("geopandas")
 
+PIXEL_OFFSETS = {'ul': 0.0, 'center': 0.5}
+GEOJSON_POINT_FEATURE = (
+    '{"type": "Feature", "geometry": {"type": "Point", "coordinates": [%r, %r]}, '
+    '"properties": {"PM2.5": %r}}'
+)
+GRID_DTYPE = np.dtype('<f4')
+# Downsampling factors of the map pyramid, each level averages factor x factor cells.
+PYRAMID_FACTORS = (2, 4, 8)
+# Web map tiles are 256 px wide, zoom 0 shows 360 degrees of longitude.
+WEB_TILE_SIZE = 256
+# Coarsest level whose cells are still at least this many screen pixels wide.
+MIN_CELL_PIXELS = 4
+# Fraction of a cell below which a bbox edge counts as on the cell border.
+EDGE_TOLERANCE = 1e-6
+
+
+def read_raster(
+    map_raster_file_path: Path = DEFAULT_MAP_RASTER_OUTPUT_PATH
+) -> Tuple[np.ndarray, Affine, Optional[float]]:
+
+    """
+    Reads the first band of a raster file.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :map_raster_file_path   : Path to raster file
+
+    Output:
+    :image, transform, nodata
+    -----------------------------------------------------------------------------------------
+    """
+
+    with rasterio.open(map_raster_file_path) as src:
+        return src.read(1), src.transform, src.nodata
+
+
+def read_raster_bytes(data: bytes) -> Tuple[np.ndarray, Affine, Optional[float]]:
+
+    """
+    Reads the first band of a GeoTIFF held in memory, e.g. an Earth Engine download, without
+    touching the disk. Zipped GeoTIFFs are unpacked first.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :data           : GeoTIFF or zipped GeoTIFF bytes
+
+    Output:
+    :image, transform, nodata
+    -----------------------------------------------------------------------------------------
+    """
+
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            data = archive.read(next(name for name in archive.namelist() if name.endswith('.tif')))
+
+    with rasterio_io.MemoryFile(data) as memory_file, memory_file.open() as src:
+        return src.read(1), src.transform, src.nodata
+
+
+def write_raster(
+    map_raster_file_path: Path,
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None,
+    crs: str = 'EPSG:4326'
+) -> Path:
+
+    """
+    Writes a single band GeoTIFF.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :map_raster_file_path   : Path to raster file
+    :image                  : np.ndarray (rows x cols)
+    :transform              : Affine transform of the raster
+
+    Optional:
+    :nodata                 : Nodata value of the raster
+    :crs                    : EPSG:4326
+
+    Output:
+    :Path                   : Path to raster file
+    -----------------------------------------------------------------------------------------
+    """
+
+    with rasterio.open(
+        map_raster_file_path, 'w', driver='GTiff', height=image.shape[0], width=image.shape[1],
+        count=1, dtype=image.dtype, crs=crs, transform=transform, nodata=nodata
+    ) as dst:
+        dst.write(image, 1)
+
+    return map_raster_file_path
+
+
+def raster_array_to_points(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None,
+    offset: str = 'ul'
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+
+    """
+    Converts a raster band to point coordinates and values in one vectorized pass. Cells equal
+    to nodata are dropped, the remaining cells are returned in row-major order.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+
+    Optional:
+    :nodata         : Nodata value of the raster
+    :offset         : 'ul' (pixel corner) or 'center' (pixel centre)
+
+    Output:
+    :x, y, values   : np.ndarray, np.ndarray, np.ndarray
+    -----------------------------------------------------------------------------------------
+    """
+
+    if offset not in PIXEL_OFFSETS:
+        raise ValueError(f"Offset must be one of {list(PIXEL_OFFSETS)}.")
+
+    if nodata is None:
+        mask = np.ones(image.shape, dtype=bool)
+    else:
+        mask = image != nodata
+
+    rows, cols = np.nonzero(mask)
+    values = image[rows, cols]
+
+    cols = cols + PIXEL_OFFSETS[offset]
+    rows = rows + PIXEL_OFFSETS[offset]
+    x = transform.a * cols + transform.b * rows + transform.c
+    y = transform.d * cols + transform.e * rows + transform.f
+
+    return x, y, values
+
+
+def raster_array_to_vector(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None,
+    map_vector_file_path: Path = DEFAULT_MAP_VECTOR_OUTPUT_PATH,
+    write_vector_file: bool = True,
+    offset: str = 'ul'
+) -> gpd.GeoDataFrame:
+
+    """
+    Converts a raster band to a GeoDataFrame of PM2.5 points.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image                  : np.ndarray (rows x cols)
+    :transform              : Affine transform of the raster
+
+    Optional:
+    :nodata                 : Nodata value of the raster
+    :map_vector_file_path   : Path to vector file
+    :write_vector_file      : Write the GeoJSON vector file, default True
+    :offset                 : 'ul' (pixel corner) or 'center' (pixel centre)
+
+    Output:
+    :GeoDataFrame           : gpd.GeoDataFrame
+    -----------------------------------------------------------------------------------------
+    """
+
+    x, y, values = raster_array_to_points(image, transform, nodata, offset)
+    gdf = gpd.GeoDataFrame({'PM2.5': values}, geometry=gpd.points_from_xy(x, y))
+
+    if write_vector_file:
+        gdf.to_file(map_vector_file_path, driver='GeoJSON')
+
+    logger.debug('Raster has been converted to vector successfully.')
+
+    return gdf
+
+
+@timed()
 def raster_to_vector(
-    map_raster_file_path: Path = DEFAULT_MAP_RASTER_OUTPUT_PATH, 
-    map_vector_file_path: Path = DEFAULT_MAP_VECTOR_OUTPUT_PATH
+    map_raster_file_path: Path = DEFAULT_MAP_RASTER_OUTPUT_PATH,
+    map_vector_file_path: Path = DEFAULT_MAP_VECTOR_OUTPUT_PATH,
+    write_vector_file: bool = True,
+    offset: str = 'ul'
 ) -> gpd.GeoDataFrame:
 
     """
@@ -21,33 +206,372 @@ def raster_to_vector(
     :map_raster_file_path   : Path to raster file
     :map_vector_file_path   : Path to vector file
 
+    Optional:
+    :write_vector_file      : Write the GeoJSON vector file, default True
+    :offset                 : 'ul' (pixel corner) or 'center' (pixel centre)
+
     Output:
     :GeoDataFrame           : gpd.GeoDataFrame
     -----------------------------------------------------------------------------------------
     """
 
-    with rasterio.open(map_raster_file_path) as src:
+    image, transform, nodata = read_raster(map_raster_file_path)
 
-        image = src.read(1)
-        transform = src.transform
-        height, width = image.shape
+    return raster_array_to_vector(image, transform, nodata, map_vector_file_path, write_vector_file, offset)
 
-        points = []
-        values = []
 
-        for row in range(height):
-            for col in range(width):
-                value = image[row, col]
-                if value != src.nodata:
-                    x, y = transform * (col, row)
-                    point = Point(x, y)
-                    points.append(point)
-                    values.append(value)
+def iter_raster_geojson(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None,
+    offset: str = 'ul',
+    chunk_size: int = 5000
+) -> Iterator[bytes]:
 
-        gdf = gpd.GeoDataFrame({'PM2.5': values}, geometry=points)
-        gdf.to_file(map_vector_file_path, driver='GeoJSON')
+    """
+    Serializes a raster band straight to a GeoJSON FeatureCollection of PM2.5 points, one
+    chunk of features at a time. The output matches json.dumps of convert_geodf_to_dict.
+    Non finite cells are skipped since they are not valid JSON.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+
+    Optional:
+    :nodata         : Nodata value of the raster
+    :offset         : 'ul' (pixel corner) or 'center' (pixel centre)
+    :chunk_size     : Number of features per yielded chunk
+
+    Output:
+    :Iterator       : bytes
+    -----------------------------------------------------------------------------------------
+    """
+
+    x, y, values = raster_array_to_points(image, transform, nodata, offset)
+    finite = np.isfinite(values)
+    if not finite.all():
+        x, y, values = x[finite], y[finite], values[finite]
+
+    yield b'{"type": "FeatureCollection", "features": ['
+    for start in range(0, len(values), chunk_size):
+        end = start + chunk_size
+        rows = zip(x[start:end].tolist(), y[start:end].tolist(), values[start:end].tolist())
+        chunk = ', '.join(GEOJSON_POINT_FEATURE % row for row in rows)
+        yield (', ' + chunk if start else chunk).encode()
+    yield b']}'
+
+
+@timed()
+def raster_to_grid_payload(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None
+) -> dict:
+
+    """
+    Packs a raster band into a compact grid payload: origin, cell size, shape, nodata and
+    the row-major cell values as base64 encoded little-endian float32.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+
+    Optional:
+    :nodata         : Nodata value of the raster
+
+    Output:
+    :dict           : Grid payload
+    -----------------------------------------------------------------------------------------
+    """
+
+    values = np.ascontiguousarray(image, dtype=GRID_DTYPE)
+
+    return {
+        "type": "Grid",
+        "origin": [transform.c, transform.f],
+        "cell_size": [transform.a, transform.e],
+        "shape": list(values.shape),
+        "nodata": nodata,
+        "dtype": "float32",
+        "values": base64.b64encode(values.tobytes()).decode('ascii')
+    }
+
+
+def grid_payload_to_raster(payload: dict) -> Tuple[np.ndarray, Affine, Optional[float]]:
+
+    """
+    Unpacks a grid payload created by raster_to_grid_payload.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :payload        : dict
+
+    Output:
+    :image, transform, nodata
+    -----------------------------------------------------------------------------------------
+    """
+
+    values = np.frombuffer(base64.b64decode(payload['values']), dtype=GRID_DTYPE)
+    image = values.reshape(payload['shape'])
+    (x, y), (width, height) = payload['origin'], payload['cell_size']
+
+    return image, Affine(width, 0.0, x, 0.0, height, y), payload['nodata']
+
+
+def raster_to_bytes(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None
+) -> bytes:
+
+    """
+    Serializes a raster band with its transform and nodata value losslessly (npz).
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+
+    Optional:
+    :nodata         : Nodata value of the raster
+
+    Output:
+    :bytes
+    -----------------------------------------------------------------------------------------
+    """
+
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        image=np.asarray(image),
+        transform=np.array(list(transform)[:6]),
+        nodata=np.array([] if nodata is None else [nodata], dtype=float)
+    )
+
+    return buffer.getvalue()
+
+
+def raster_from_bytes(body: bytes) -> Tuple[np.ndarray, Affine, Optional[float]]:
+
+    """
+    Unpacks a raster serialized by raster_to_bytes.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :body           : bytes
+
+    Output:
+    :image, transform, nodata
+    -----------------------------------------------------------------------------------------
+    """
+
+    with np.load(io.BytesIO(body)) as data:
+        nodata = data['nodata']
+        return data['image'], Affine(*data['transform']), nodata[0].item() if nodata.size else None
+
+
+def sample_raster_points(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float],
+    point_x: np.ndarray,
+    point_y: np.ndarray,
+    interpolation: str = 'nearest'
+) -> np.ndarray:
+
+    """
+    Samples a raster band at the given coordinates through the inverse affine transform.
+    Bilinear interpolation weights the four surrounding pixel centres and ignores nodata
+    neighbours. Points outside the raster or on nodata cells get NaN.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols), may be memory-mapped
+    :transform      : Affine transform of the raster
+    :nodata         : Nodata value of the raster
+    :point_x        : np.ndarray of x coordinates (longitude)
+    :point_y        : np.ndarray of y coordinates (latitude)
+
+    Optional:
+    :interpolation  : 'nearest' or 'bilinear'
+
+    Output:
+    :np.ndarray     : float64 value per point
+    -----------------------------------------------------------------------------------------
+    """
+
+    if interpolation not in ('nearest', 'bilinear'):
+        raise ValueError("Interpolation must be 'nearest' or 'bilinear'.")
+
+    point_x = np.asarray(point_x, dtype=float)
+    point_y = np.asarray(point_y, dtype=float)
+    inverse = ~transform
+    cols = inverse.a * point_x + inverse.b * point_y + inverse.c
+    rows = inverse.d * point_x + inverse.e * point_y + inverse.f
+
+    height, width = image.shape
+    inside = (cols >= 0) & (cols < width) & (rows >= 0) & (rows < height)
+
+    def valid_values(row_index, col_index):
+        values = image[row_index.clip(0, height - 1), col_index.clip(0, width - 1)].astype(float)
+        valid = inside & np.isfinite(values)
+        if nodata is not None:
+            valid &= values != nodata
+        return values, valid
+
+    if interpolation == 'nearest':
+        values, valid = valid_values(np.floor(rows).astype(int), np.floor(cols).astype(int))
+        return np.where(valid, values, np.nan)
+
+    # Offsets from the pixel centre above-left of the point.
+    cols, rows = cols - 0.5, rows - 0.5
+    col0, row0 = np.floor(cols).astype(int), np.floor(rows).astype(int)
+    col_weight, row_weight = cols - col0, rows - row0
+
+    total = np.zeros(point_x.shape)
+    weights = np.zeros(point_x.shape)
+    for row_offset, col_offset, weight in (
+        (0, 0, (1 - row_weight) * (1 - col_weight)),
+        (0, 1, (1 - row_weight) * col_weight),
+        (1, 0, row_weight * (1 - col_weight)),
+        (1, 1, row_weight * col_weight),
+    ):
+        values, valid = valid_values(row0 + row_offset, col0 + col_offset)
+        total += np.where(valid, values * weight, 0.0)
+        weights += np.where(valid, weight, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(weights > 0, total / weights, np.nan)
+
+
+def downsample_raster(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None,
+    factor: int = 2
+) -> Tuple[np.ndarray, Affine, Optional[float]]:
+
+    """
+    Averages factor x factor blocks of cells, ignoring nodata and NaN cells. Edge blocks
+    are averaged over the cells they contain, blocks without data get nodata (NaN when
+    nodata is None).
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+
+    Optional:
+    :nodata         : Nodata value of the raster
+    :factor         : Int, default 2
+
+    Output:
+    :image, transform, nodata
+    -----------------------------------------------------------------------------------------
+    """
+
+    values = np.asarray(image, dtype=np.float64)
+    valid = np.isfinite(values)
+    if nodata is not None:
+        valid &= values != nodata
+
+    padding = ((0, -values.shape[0] % factor), (0, -values.shape[1] % factor))
+    values = np.pad(np.where(valid, values, 0.0), padding)
+    valid = np.pad(valid, padding)
+    blocks = (values.shape[0] // factor, factor, values.shape[1] // factor, factor)
+
+    sums = values.reshape(blocks).sum(axis=(1, 3))
+    counts = valid.reshape(blocks).sum(axis=(1, 3))
+    fill = np.nan if nodata is None else nodata
+    downsampled = np.where(counts > 0, sums / np.maximum(counts, 1), fill)
+
+    return downsampled, transform * Affine.scale(factor), nodata
+
+
+def build_raster_pyramid(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float] = None,
+    factors: Sequence[int] = PYRAMID_FACTORS
+) -> Dict[int, np.ndarray]:
+
+    """
+    Downsampled levels of a raster by factor, see downsample_raster.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+
+    Optional:
+    :nodata         : Nodata value of the raster
+
+    Default:
+    :factors        : PYRAMID_FACTORS
+
+    Output:
+    :dict           : {factor: image}, level f has the transform transform * Affine.scale(f)
+    -----------------------------------------------------------------------------------------
+    """
+
+    return {factor: downsample_raster(image, transform, nodata, factor)[0] for factor in factors}
+
+
+def zoom_factor(
+    zoom: int,
+    cell_size: float,
+    factors: Sequence[int] = (1,) + PYRAMID_FACTORS,
+    min_cell_pixels: float = MIN_CELL_PIXELS
+) -> int:
+
+    """
+    Pyramid factor for a web map zoom level: the finest level whose cells are at least
+    min_cell_pixels screen pixels wide, the coarsest level when even that one is smaller.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :zoom           : Int, web map zoom level
+    :cell_size      : Cell width of the full resolution raster in degrees
+
+    Default:
+    :factors        : 1 and PYRAMID_FACTORS
+    :min_cell_pixels: MIN_CELL_PIXELS
+
+    Output:
+    :int            : pyramid factor
+    -----------------------------------------------------------------------------------------
+    """
+
+    degrees_per_pixel = 360.0 / (WEB_TILE_SIZE * 2 ** zoom)
+    for factor in sorted(factors):
+        if abs(cell_size) * factor >= min_cell_pixels * degrees_per_pixel:
+            return factor
+
+    return max(factors)
+
+
+def crop_raster(
+    image: np.ndarray,
+    transform: Affine,
+    nodata: Optional[float],
+    bbox: Sequence[float]
+) -> Tuple[np.ndarray, Affine, Optional[float]]:
+
+    """
+    Cells of a north-up raster intersecting a bounding box.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :image          : np.ndarray (rows x cols)
+    :transform      : Affine transform of the raster
+    :nodata         : Nodata value of the raster
+    :bbox           : [west, south, east, north]
+
+    Output:
+    :image, transform, nodata    : the window, empty when the bbox misses the raster
+    -----------------------------------------------------------------------------------------
+    """
+
+    west, south, east, north = bbox
+    cols, rows = ~transform * (np.array([west, east]), np.array([north, south]))
+    # Cells only touching the bbox edge are left out, up to floating point error.
+    col_start = min(max(math.floor(cols.min() + EDGE_TOLERANCE), 0), image.shape[1])
+    col_end = max(min(math.ceil(cols.max() - EDGE_TOLERANCE), image.shape[1]), col_start)
+    row_start = min(max(math.floor(rows.min() + EDGE_TOLERANCE), 0), image.shape[0])
+    row_end = max(min(math.ceil(rows.max() - EDGE_TOLERANCE), image.shape[0]), row_start)
 
-        logger.info('Raster file has been converted to vector successfully.')
+    window = image[row_start:row_end, col_start:col_end]
 
-        return gdf
-        
+    return window, transform * Affine.translation(col_start, row_start), nodata
@@ -0,0 +1,396 @@
+from __future__ import annotations
+import datetime
+import json
+import math
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+from loguru import logger
+from affine import Affine
+from sentinel5plib.vector_utils import load_aoi
+from sentinel5plib.ee_client import ee, get_info
+from sentinel5plib.metrics import timed
+from sentinel5plib.data_utils import (
+    get_sentinel5p_image_collection_range,
+    convertNO2MolM2ToMicrogramM3
+)
+from sentinel5plib.defaults import (
+    HAMBURG_GEOJSON_PATH,
+    OFFL_SETTLE_DAYS,
+    S5P_GRID_CELL_DEGREES
+)
+
+
+ONE_DAY = datetime.timedelta(days=1)
+# Daily composites kept per variable: AAI and NO2 converted to µg/m³.
+TILE_VARIABLES = ('aai', 'no2')
+TILE_DTYPE = np.dtype('<f4')
+TILE_NODATA = -9999.0
+# Pixel limit of one sampleRectangle request, bounds the days fetched per request.
+SAMPLE_RECTANGLE_MAX_PIXELS = 262144
+
+
+class TileGrid(NamedTuple):
+
+    """
+    Regular lon/lat grid of the tile store, north-up.
+    """
+
+    west: float
+    north: float
+    cell_size: float
+    rows: int
+    cols: int
+
+    @property
+    def transform(self) -> Affine:
+        return Affine(self.cell_size, 0.0, self.west, 0.0, -self.cell_size, self.north)
+
+    @property
+    def max_chunk_days(self) -> int:
+        return max(1, SAMPLE_RECTANGLE_MAX_PIXELS // (len(TILE_VARIABLES) * self.rows * self.cols))
+
+    @property
+    def cell_centers(self) -> List[float]:
+
+        """
+        Bounds of the outermost cell centers [west, south, east, north], sampling this
+        rectangle returns exactly rows x cols pixels.
+        """
+
+        half = self.cell_size / 2
+        return [
+            self.west + half,
+            self.north - self.rows * self.cell_size + half,
+            self.west + self.cols * self.cell_size - half,
+            self.north - half
+        ]
+
+
+def aoi_tile_grid(
+    hamburg_geojson_path: Path = HAMBURG_GEOJSON_PATH,
+    cell_size: float = S5P_GRID_CELL_DEGREES
+) -> TileGrid:
+
+    """
+    Grid covering the AOI bounds, aligned to the Sentinel-5P L3 grid.
+    -----------------------------------------------------------------------------------------
+    Default:
+    :hamburg_geojson_path   : Input path of the hamburg vector file
+    :cell_size              : 0.01 degrees
+
+    Output:
+    :TileGrid
+    -----------------------------------------------------------------------------------------
+    """
+
+    min_x, min_y, max_x, max_y = load_aoi(hamburg_geojson_path)[1].context.bounds
+    west = math.floor(min_x / cell_size) * cell_size
+    north = math.ceil(max_y / cell_size) * cell_size
+
+    return TileGrid(
+        west=round(west, 6),
+        north=round(north, 6),
+        cell_size=cell_size,
+        rows=int(math.ceil(round((north - min_y) / cell_size, 6))),
+        cols=int(math.ceil(round((max_x - west) / cell_size, 6)))
+    )
+
+
+def date_range(start_date: datetime.date, end_date: datetime.date) -> List[datetime.date]:
+
+    """
+    Days from start_date up to, not including, end_date (like ee filterDate).
+    """
+
+    return [start_date + ONE_DAY * offset for offset in range((end_date - start_date).days)]
+
+
+class TileStore:
+
+    """
+    Local store of daily AOI rasters: one memory-mapped .npy file per variable and year,
+    shaped days x rows x cols, with NaN for days and cells without data. index.json holds
+    the grid, the ingested days and the days that are final, i.e. settled OFFL days that
+    are never fetched again. version is increased whenever new days are flushed. A readonly
+    store maps the arrays read-only and follows the days flushed by another process through
+    refresh.
+    """
+
+    def __init__(self, directory: str, grid: TileGrid, readonly: bool = False):
+        self.directory = directory
+        self.grid = grid
+        self.readonly = readonly
+        self._arrays: Dict[str, np.memmap] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self._index_mtime = None
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+        self._final_days, self._ingested_days = self._read_index()
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, 'index.json')
+
+    def _array_path(self, variable: str, year: int) -> str:
+        return os.path.join(self.directory, f'{variable}_{year}.npy')
+
+    def _read_index(self) -> Tuple[Dict[int, set], Dict[int, set]]:
+        if not os.path.exists(self._index_path):
+            return {}, {}
+
+        self._index_mtime = os.path.getmtime(self._index_path)
+        with open(self._index_path) as f:
+            index = json.load(f)
+
+        if TileGrid(**index['grid']) != self.grid:
+            if self.readonly:
+                return {}, {}
+            logger.warning(f'Tile store grid changed, dropping the tiles in {self.directory}.')
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+            return {}, {}
+
+        final_days = {int(year): set(days) for year, days in index['final_days'].items()}
+        ingested_days = {
+            int(year): set(days) for year, days in index.get('ingested_days', index['final_days']).items()
+        }
+        return final_days, ingested_days
+
+    def _array(self, variable: str, year: int, create: bool = False) -> Optional[np.memmap]:
+        path = self._array_path(variable, year)
+        array = self._arrays.get(path)
+        if array is not None:
+            return array
+
+        if os.path.exists(path):
+            array = np.load(path, mmap_mode='r' if self.readonly else 'r+')
+        elif create and not self.readonly:
+            days = (datetime.date(year + 1, 1, 1) - datetime.date(year, 1, 1)).days
+            array = np.lib.format.open_memmap(
+                path, mode='w+', dtype=TILE_DTYPE, shape=(days, self.grid.rows, self.grid.cols))
+            array[:] = np.nan
+        else:
+            return None
+
+        self._arrays[path] = array
+        return array
+
+    def refresh(self) -> bool:
+
+        """
+        Reads the index again when another process flushed it, returns whether it changed.
+        """
+
+        try:
+            mtime = os.path.getmtime(self._index_path)
+        except OSError:
+            return False
+        if mtime == self._index_mtime:
+            return False
+
+        with self._lock:
+            self._final_days, self._ingested_days = self._read_index()
+            # Map the arrays again on the next read, they may have been recreated.
+            self._arrays.clear()
+            self.version += 1
+        return True
+
+    def is_final(self, day: datetime.date) -> bool:
+        return day.timetuple().tm_yday in self._final_days.get(day.year, ())
+
+    def missing_days(self, start_date: datetime.date, end_date: datetime.date) -> List[datetime.date]:
+
+        """
+        Days of [start_date, end_date) that are not final yet.
+        """
+
+        return [day for day in date_range(start_date, end_date) if not self.is_final(day)]
+
+    def covers(self, start_date: datetime.date, end_date: datetime.date) -> bool:
+
+        """
+        Whether every day of [start_date, end_date) has been ingested, final or not.
+        """
+
+        return all(day.timetuple().tm_yday in self._ingested_days.get(day.year, ())
+                   for day in date_range(start_date, end_date))
+
+    def write_day(self, day: datetime.date, rasters: Dict[str, np.ndarray], final: bool):
+
+        """
+        Writes the rasters of one day, NaN where there is no data. Call flush to persist
+        the final days index.
+        """
+
+        with self._lock:
+            for variable in TILE_VARIABLES:
+                array = self._array(variable, day.year, create=True)
+                array[day.timetuple().tm_yday - 1] = rasters[variable]
+            self._ingested_days.setdefault(day.year, set()).add(day.timetuple().tm_yday)
+            if final:
+                self._final_days.setdefault(day.year, set()).add(day.timetuple().tm_yday)
+
+    def flush(self):
+
+        """
+        Flushes the arrays to disk and atomically rewrites the index.
+        """
+
+        with self._lock:
+            for array in self._arrays.values():
+                array.flush()
+            index = {
+                'grid': self.grid._asdict(),
+                'final_days': {str(year): sorted(days) for year, days in self._final_days.items()},
+                'ingested_days': {str(year): sorted(days) for year, days in self._ingested_days.items()}
+            }
+            tmp_file = f'{self._index_path}.{os.getpid()}.tmp'
+            with open(tmp_file, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_file, self._index_path)
+            self.version += 1
+
+    def read(self, variable: str, start_date: datetime.date, end_date: datetime.date) -> np.ndarray:
+
+        """
+        Daily rasters of [start_date, end_date) as days x rows x cols, NaN where missing.
+        -----------------------------------------------------------------------------------------
+        Required:
+        :variable       : aai or no2
+        :start_date     : datetime.date
+        :end_date       : datetime.date
+
+        Output:
+        :np.ndarray
+        -----------------------------------------------------------------------------------------
+        """
+
+        result = np.full(
+            (max((end_date - start_date).days, 0), self.grid.rows, self.grid.cols), np.nan, dtype=TILE_DTYPE)
+
+        offset = 0
+        for year in range(start_date.year, end_date.year + 1):
+            year_start = max(start_date, datetime.date(year, 1, 1))
+            year_end = min(end_date, datetime.date(year + 1, 1, 1))
+            days = (year_end - year_start).days
+            if days <= 0:
+                continue
+            with self._lock:
+                array = self._array(variable, year)
+            if array is not None:
+                first = year_start.timetuple().tm_yday - 1
+                result[offset:offset + days] = array[first:first + days]
+            offset += days
+
+        return result
+
+
+def fetch_daily_composites(
+    aoi: ee.Geometry,
+    grid: TileGrid,
+    days: List[datetime.date]
+) -> Dict[datetime.date, Dict[str, np.ndarray]]:
+
+    """
+    Downloads the daily AAI and NO2 (µg/m³) mean composites of consecutive days on the
+    tile grid, stacked as bands of one image and fetched with a single sampleRectangle.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :aoi            : ee.Geometry
+    :grid           : TileGrid
+    :days           : consecutive days
+
+    Output:
+    :dict           : {day: {'aai': raster, 'no2': raster}}, NaN where there is no data
+    -----------------------------------------------------------------------------------------
+    """
+
+    start_date, end_date = days[0].isoformat(), (days[-1] + ONE_DAY).isoformat()
+    images = {
+        'aai': get_sentinel5p_image_collection_range("AER_AI", aoi, start_date, end_date),
+        'no2': get_sentinel5p_image_collection_range("NO2", aoi, start_date, end_date
+                                                     ).map(convertNO2MolM2ToMicrogramM3
+                                                     ).select('NO2_in_µg_per_m3')
+    }
+
+    bands = []
+    for day in days:
+        for variable in TILE_VARIABLES:
+            daily = images[variable].filterDate(day.isoformat(), (day + ONE_DAY).isoformat())
+            composite = ee.Image(ee.Algorithms.If(
+                daily.size().gt(0), daily.mean(), ee.Image.constant(TILE_NODATA)))
+            bands.append(composite.rename(f'{variable}_{day:%Y%m%d}'))
+
+    stack = ee.Image.cat(bands).reproject(crs='EPSG:4326', crsTransform=list(grid.transform)[:6])
+    properties = get_info(stack.sampleRectangle(
+        region=ee.Geometry.Rectangle(grid.cell_centers),
+        defaultValue=TILE_NODATA
+    ))['properties']
+    logger.info(f'Daily composites from {start_date} to {end_date} have been downloaded.')
+
+    composites = {}
+    for day in days:
+        composites[day] = {}
+        for variable in TILE_VARIABLES:
+            raster = np.array(properties[f'{variable}_{day:%Y%m%d}'], dtype=TILE_DTYPE)
+            raster[raster == TILE_NODATA] = np.nan
+            composites[day][variable] = raster
+
+    return composites
+
+
+@timed()
+def ingest_daily_rasters(
+    store: TileStore,
+    aoi: ee.Geometry,
+    start_date: datetime.date,
+    end_date: datetime.date,
+    chunk_days: Optional[int] = None,
+    today: Optional[datetime.date] = None
+) -> int:
+
+    """
+    Fetches the daily composites of [start_date, end_date) that are not final in the store
+    yet, one Earth Engine request per chunk of consecutive days. Days younger than
+    OFFL_SETTLE_DAYS are stored but fetched again on the next run.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :store          : TileStore
+    :aoi            : ee.Geometry
+    :start_date     : datetime.date
+    :end_date       : datetime.date
+
+    Optional:
+    :chunk_days     : Int, days per request, defaults to the sampleRectangle limit
+    :today          : datetime.date
+
+    Output:
+    :int            : Number of fetched days
+    -----------------------------------------------------------------------------------------
+    """
+
+    today = today or datetime.date.today()
+    chunk_days = chunk_days or store.grid.max_chunk_days
+    missing = store.missing_days(start_date, min(end_date, today))
+
+    chunks = []
+    for day in missing:
+        if chunks and day - chunks[-1][-1] == ONE_DAY and len(chunks[-1]) < chunk_days:
+            chunks[-1].append(day)
+        else:
+            chunks.append([day])
+
+    for chunk in chunks:
+        composites = fetch_daily_composites(aoi, store.grid, chunk)
+        for day in chunk:
+            final = day + datetime.timedelta(days=OFFL_SETTLE_DAYS) < today
+            store.write_day(day, composites[day], final)
+        store.flush()
+
+    logger.info(f'{len(missing)} days ingested into the tile store in {len(chunks)} requests.')
+
+    return len(missing)
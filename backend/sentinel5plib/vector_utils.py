@@ -1,10 +1,22 @@
-import geopandas as gpd
+from __future__ import annotations
 from functools import reduce
 import numpy as np
+import os
+import threading
 from pathlib import Path
+from typing import Dict, Tuple
 from loguru import logger
-import ee
-ee.Initialize()
+from sentinel5plib.ee_client import ee
+from sentinel5plib.lazy_imports import lazy_import
+from sentinel5plib.metrics import timed
+
+gpd = lazy_import("geopandas")
+shapely_geometry = lazy_import("shapely.geometry")
+shapely_prepared = lazy_import("shapely.prepared")
+
+# Parsed AOIs by absolute path: (file mtime, ee geometry, prepared local geometry)
+_aoi_cache: Dict[str, Tuple[float, ee.Geometry, shapely_prepared.PreparedGeometry]] = {}
+_aoi_lock = threading.Lock()
 
 
 def vector_to_ee_geometry(input_vector: Path) -> ee.Geometry:
@@ -20,24 +32,38 @@ def vector_to_ee_geometry(input_vector: Path) -> ee.Geometry:
     -----------------------------------------------------------------------------------------
     """
 
-    gdf = gpd.read_file(input_vector)
+    return geodataframe_to_ee_geometry(gpd.read_file(input_vector))
+
+
+def geodataframe_to_ee_geometry(gdf: gpd.GeoDataFrame) -> ee.Geometry:
+
+    """
+    Converts the first geometry of a parsed vector file into ee supported geometry.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :gdf            : gpd.GeoDataFrame
+
+    Output:
+    :Geometry       : ee.Geometry
+    -----------------------------------------------------------------------------------------
+    """
 
     if gdf.geom_type[0] == 'Polygon':
-        logger.info(f'{gdf.geom_type[0]} Geometry has been found. '
-                    'Extracting the coorindates ...')
+        logger.debug(f'{gdf.geom_type[0]} Geometry has been found. '
+                     'Extracting the coorindates ...')
 
         for geom in range(len(gdf)):
             shapely_geometry = [geom for geom in gdf.geometry]
             longitude, latitude = shapely_geometry[geom].exterior.coords.xy
             coordinates = np.dstack((longitude,latitude)).tolist()
 
-            logger.info('Coordinates are successfully extracted. '
-                        'Converting it to ee supported Geometry')
+            logger.debug('Coordinates are successfully extracted. '
+                         'Converting it to ee supported Geometry')
             return ee.Geometry.Polygon(coordinates)
 
     elif gdf.geom_type[0] == 'LineString':
-        logger.info(f'{gdf.geom_type[0]} Geometry has been found. '
-                    'Extracting the coorindates ...')
+        logger.debug(f'{gdf.geom_type[0]} Geometry has been found. '
+                     'Extracting the coorindates ...')
 
         for geom in range(len(gdf)):
             shapely_geometry = [geom for geom in gdf.geometry]
@@ -45,13 +71,13 @@ def vector_to_ee_geometry(input_vector: Path) -> ee.Geometry:
             coordinates = np.dstack((longitude,latitude)).tolist()
             lists = reduce(lambda longitude, latitude: longitude+latitude, coordinates)
 
-            logger.info('Coordinates are successfully extracted and converted to two List. '
-                        'Converting it to ee supported Geometry')
+            logger.debug('Coordinates are successfully extracted and converted to two List. '
+                         'Converting it to ee supported Geometry')
             return ee.Geometry.LineString(lists)
 
     elif gdf.geom_type[0] == 'Point':
-        logger.info(f'{gdf.geom_type[0]} Geometry has been found. '
-                    'Extracting the coorindates ...')
+        logger.debug(f'{gdf.geom_type[0]} Geometry has been found. '
+                     'Extracting the coorindates ...')
 
         for geom in range(len(gdf)):
             shapely_geometry = [geom for geom in gdf.geometry]
@@ -60,8 +86,8 @@ def vector_to_ee_geometry(input_vector: Path) -> ee.Geometry:
             lists = reduce(lambda longitude, latitude: longitude+latitude, coordinates)
             point_list = reduce(lambda longitude, latitude: longitude+latitude, lists)
 
-            logger.info('Coordinates are successfully extracted, converted it List of Points . '
-                        'Converting it to ee supported Geometry')
+            logger.debug('Coordinates are successfully extracted, converted it List of Points . '
+                         'Converting it to ee supported Geometry')
             return ee.Geometry.Point(point_list)
 
 
@@ -78,7 +104,6 @@ def ee_geometry_to_feature(geometry: ee.Geometry) -> ee.Feature:
     -----------------------------------------------------------------------------------------
     """
 
-    logger.info('Converting ee support geometries to features.')
     return ee.Feature(geometry)
 
 
@@ -95,7 +120,6 @@ def ee_feature_to_featureCollection(feature: ee.Feature) -> ee.FeatureCollection
     -----------------------------------------------------------------------------------------
     """
 
-    logger.info('Converting and combining ee support features to features collections.')
     return ee.FeatureCollection(feature)
 
 
@@ -112,7 +136,6 @@ def ee_featureCollection_to_geometry(featurecollection: ee.FeatureCollection) ->
     -----------------------------------------------------------------------------------------
     """
 
-    logger.info('Extracting ee supported geometries from features collections.')
     return ee.FeatureCollection.geometry(featurecollection) 
 
 
@@ -131,20 +154,103 @@ def vector_to_ee_geometry_object(input_vector: Path) -> ee.Geometry:
     -----------------------------------------------------------------------------------------
     """
 
-    ee_geometry = vector_to_ee_geometry(input_vector)
-    logger.success('EE geometries are successfully extracted.')
+    ee_final_geometries = geodataframe_to_ee_geometry_object(gpd.read_file(input_vector))
+    logger.debug(f'{input_vector} has been converted to an ee geometry.')
 
-    ee_feature = ee_geometry_to_feature(ee_geometry)
-    logger.success('EE geometries are successfully converted to features.')
+    return ee_final_geometries
+
+
+def geodataframe_to_ee_geometry_object(gdf: gpd.GeoDataFrame) -> ee.Geometry:
 
+    """
+    vector_to_ee_geometry_object of an already parsed vector file.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :gdf            : gpd.GeoDataFrame
+
+    Output:
+    :geometry       : ee.Geometry
+    -----------------------------------------------------------------------------------------
+    """
+
+    ee_geometry = geodataframe_to_ee_geometry(gdf)
+    ee_feature = ee_geometry_to_feature(ee_geometry)
     ee_featurecollection = ee_feature_to_featureCollection(ee_feature)
-    logger.success('EE features are successfully converted to feature collections.')
+    return ee_featureCollection_to_geometry(ee_featurecollection)
 
-    ee_final_geometries = ee_featureCollection_to_geometry(ee_featurecollection)
-    logger.success('EE features collection are successfully converted to geometries.')
-    return ee_final_geometries
+
+def load_aoi(input_vector: Path) -> Tuple[ee.Geometry, shapely_prepared.PreparedGeometry]:
+
+    """
+    Returns the ee geometry and a prepared shapely geometry of the vector file, parsed once
+    per process and re-parsed only when the file modification time changes.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :input_vector   : Path to vector file
+
+    Output:
+    :geometry       : ee.Geometry, PreparedGeometry
+    -----------------------------------------------------------------------------------------
+    """
+
+    key = os.path.abspath(input_vector)
+    mtime = os.path.getmtime(key)
+
+    with _aoi_lock:
+        cached = _aoi_cache.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+
+        # Parsed once for both: the ee geometry and the local shape are built from the
+        # exterior of the first geometry.
+        gdf = gpd.read_file(input_vector)
+        ee_geometry = geodataframe_to_ee_geometry_object(gdf)
+        geometry = gdf.geometry[0]
+        if geometry.geom_type == 'Polygon':
+            geometry = shapely_geometry.Polygon(geometry.exterior)
+        local_geometry = shapely_prepared.prep(geometry)
+
+        _aoi_cache[key] = (mtime, ee_geometry, local_geometry)
+        logger.info(f'AOI {input_vector} has been loaded and cached.')
+
+    return ee_geometry, local_geometry
+
+
+def get_aoi_geometry(input_vector: Path) -> ee.Geometry:
+
+    """
+    Memoized vector_to_ee_geometry_object, see load_aoi.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :input_vector   : Path to vector file
+
+    Output:
+    :geometry       : ee.Geometry
+    -----------------------------------------------------------------------------------------
+    """
+
+    return load_aoi(input_vector)[0]
+
+
+def aoi_contains_point(input_vector: Path, point_x: float, point_y: float) -> bool:
+
+    """
+    Checks locally whether the point lies inside the AOI, without an Earth Engine request.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :input_vector   : Path to vector file
+    :point_x        : float (longitude)
+    :point_y        : float (latitude)
+
+    Output:
+    :bool
+    -----------------------------------------------------------------------------------------
+    """
+
+    return load_aoi(input_vector)[1].contains(shapely_geometry.Point(point_x, point_y))
 
 
+@timed()
 def convert_geodf_to_dict(geodf_data: gpd.GeoDataFrame) -> dict:
 
     """
@@ -179,6 +285,6 @@ def convert_geodf_to_dict(geodf_data: gpd.GeoDataFrame) -> dict:
         "type": "FeatureCollection",
         "features": features
     }
-    logger.info('Geodataframe has been converted to dict successfully.')
+    logger.debug('Geodataframe has been converted to dict successfully.')
 
     return geojson_response
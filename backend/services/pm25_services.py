@@ -1,76 +1,467 @@
-from sentinel5plib.analysis import calculate_pm25_indicator, extract_average_data, get_pm_map
-from sentinel5plib.vector_utils import convert_geodf_to_dict
-from fastapi.responses import JSONResponse
+from sentinel5plib.analysis import (
+    calculate_pm25_indicator,
+    extract_average_data,
+    extract_average_data_points,
+    download_pm_raster,
+    extract_timeseries_data,
+    get_local_pm_raster,
+    get_pm_point_values
+)
+from sentinel5plib.raster_utils import (
+    iter_raster_geojson,
+    raster_to_grid_payload,
+    raster_to_bytes,
+    raster_from_bytes,
+    sample_raster_points,
+    downsample_raster,
+    crop_raster,
+    zoom_factor
+)
+from sentinel5plib.map_tiles import render_pyramid_tile, encode_png
+from sentinel5plib.vector_utils import aoi_contains_point
+from sentinel5plib.defaults import HAMBURG_GEOJSON_PATH, DEFAULT_TILE_INGEST_START_DATE
+from utils_f.cache import load_artifact, load_map_raster, load_prefix_cube, MAP_ARRAY_META_CACHE_FILE
+from utils_f.result_cache import (
+    RESULTS,
+    MAP_TILES,
+    RESULT_TTL_CURRENT,
+    RESULT_TTL_HISTORICAL,
+    result_key,
+    grid_cell,
+    period_ttl
+)
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+import datetime
 import json
-import os
+import numpy as np
+from affine import Affine
 
-CACHE_DIR = "cache"
+MAP_FORMAT_GEOJSON = "geojson"
+MAP_FORMAT_GRID = "grid"
+MAP_GRID_MEDIA_TYPE = "application/vnd.pm25.grid+json"
 
 
-def get_air_quality_indicator():
+def wants_map_grid(map_format: str, accept: Optional[str] = None) -> bool:
 
     """
-    Retrieve precomputed PM2.5 indicator from cache if available.
+    Whether the compact grid map payload was requested, via the format query parameter
+    or the Accept header.
     """
 
-    cache_file = f"{CACHE_DIR}/pm25_indicator.json"
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
-    return {"message": "Precomputing PM2.5 indicator, try again later."}
+    return map_format == MAP_FORMAT_GRID or MAP_GRID_MEDIA_TYPE in (accept or "")
 
 
-def get_pm25_averages():
+def etag_matches(etag: str, if_none_match: str) -> bool:
 
     """
-    Retrieve precomputed PM2.5 averages from cache if available.
+    Whether an If-None-Match header lists the ETag, weak or strong, or is "*".
     """
 
-    cache_file = f"{CACHE_DIR}/aggregated_pm25.json"
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
-    return {"message": "Precomputing PM2.5 averages, try again later."}
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
 
 
-def get_pm25_map():
+def artifact_response(artifact, request_headers: Mapping[str, str], stale: bool = False) -> Response:
 
     """
-    Retrieve precomputed PM2.5 averages Map from cache if available.
+    Serves a precomputed cache artifact as-is: answers 304 Not Modified when the client
+    copy is current, otherwise sends the best compressed variant the client accepts. Age
+    and X-Cache-Generation tell how old the artifact is, X-Cache-Status whether it is
+    being refreshed.
     """
 
-    cache_file = f"{CACHE_DIR}/pm25_map.json"
-    if os.path.exists(cache_file):
-        with open(cache_file, "r") as f:
-            return json.load(f)
-    return {"message": "Precomputing PM2.5 Map, try again later."}
+    headers = {
+        "ETag": artifact.etag,
+        "Last-Modified": formatdate(artifact.last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "Age": str(artifact.age),
+        "X-Cache-Generation": str(artifact.generation),
+        "X-Cache-Status": "stale" if stale else "fresh",
+    }
+
+    if_none_match = request_headers.get("if-none-match")
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_none_match is not None:
+        if etag_matches(artifact.etag, if_none_match):
+            return Response(status_code=304, headers=headers)
+    elif if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            since = None
+        if since is not None and int(artifact.last_modified) <= since:
+            return Response(status_code=304, headers=headers)
+
+    accepted = set()
+    for encoding in request_headers.get("accept-encoding", "").split(","):
+        name, _, params = encoding.partition(";")
+        if params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip())
+    for encoding, body in artifact.encoded.items():
+        if encoding in accepted:
+            headers["Content-Encoding"] = encoding
+            return Response(content=body, media_type="application/json", headers=headers)
+
+    return Response(content=artifact.body, media_type="application/json", headers=headers)
+
+
+def cacheable_point(point_x: Optional[float], point_y: Optional[float]) -> bool:
+
+    """
+    Whether a point query may be served from the result cache: Hamburg-wide queries and
+    points inside Hamburg. Points outside get an error message, which is not cached.
+    """
+
+    if not point_x or not point_y:
+        return True
+    return aoi_contains_point(HAMBURG_GEOJSON_PATH, point_x, point_y)
+
+
+def point_cell(point_x: Optional[float], point_y: Optional[float]):
+    if not point_x or not point_y:
+        return None
+    return list(grid_cell(point_x, point_y))
+
+
+def cached_records(kind: str, params: Dict[str, Any], ttl: float, compute: Callable):
+
+    """
+    Returns the records of a query from the result cache, or computes and caches them.
+    Error messages returned by compute are passed through uncached.
+    """
+
+    key = result_key(kind, params)
+    body = RESULTS.get(key)
+    if body is not None:
+        return json.loads(body)
+
+    data = compute()
+    if isinstance(data, str):
+        return data
+
+    records = data.to_dict(orient="records")
+    RESULTS.put(key, json.dumps(records).encode(), ttl)
+    return records
 
 
 def post_air_quality_indicator(request):
     if not request.point_x or not request.point_y:
         return "Please input both latitude and longitude."
-    
-    df = calculate_pm25_indicator(request.point_x, request.point_y)
-    return df if isinstance(df, str) else df.to_dict(orient="records")
+
+    def compute():
+        return calculate_pm25_indicator(request.point_x, request.point_y)
+
+    if not cacheable_point(request.point_x, request.point_y):
+        return compute()
+
+    # NRTI values of the current day, week and year: keyed by date, short TTL.
+    return cached_records("indicator", {
+        "point": point_cell(request.point_x, request.point_y),
+        "date": datetime.date.today().isoformat()
+    }, RESULT_TTL_CURRENT, compute)
 
 
 def post_pm25_averages(request):
     if not request.year or not request.week_number or not request.month_number:
         return "Please input year, week, and month."
-    
-    data = extract_average_data(
-        point_x=request.point_x, 
-        point_y=request.point_y,
+
+    def compute():
+        return extract_average_data(
+            point_x=request.point_x, 
+            point_y=request.point_y,
+            week_number=request.week_number,
+            month_number=request.month_number,
+            year=request.year
+        )
+
+    if not cacheable_point(request.point_x, request.point_y) or not datetime.MINYEAR <= request.year <= datetime.MAXYEAR:
+        return compute()
+
+    return cached_records("averages", {
+        "point": point_cell(request.point_x, request.point_y),
+        "week_number": request.week_number,
+        "month_number": request.month_number,
+        "year": request.year
+    }, period_ttl(datetime.date(request.year, 12, 31)), compute)
+
+
+def feature_point(feature: Any) -> Optional[Tuple[float, float]]:
+
+    """
+    (point_x, point_y) of a GeoJSON Point feature, None for anything else.
+    """
+
+    geometry = feature.get("geometry") if isinstance(feature, dict) else None
+    if not isinstance(geometry, dict) or geometry.get("type") != "Point":
+        return None
+    coordinates = geometry.get("coordinates")
+    if not isinstance(coordinates, list) or len(coordinates) < 2:
+        return None
+    point_x, point_y = coordinates[:2]
+    if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in (point_x, point_y)):
+        return None
+    return float(point_x), float(point_y)
+
+
+def post_pm25_averages_batch(request):
+    if not request.year or not request.week_number or not request.month_number:
+        return "Please input year, week, and month."
+
+    points = list(request.points)
+    features = (request.features or {}).get("features", [])
+    if not isinstance(features, list):
+        return "Only Point features are supported."
+    for feature in features:
+        point = feature_point(feature)
+        if point is None:
+            return "Only Point features are supported."
+        points.append(point)
+
+    if not points:
+        return "Please input a list of points or a FeatureCollection."
+
+    data = extract_average_data_points(
+        points,
         week_number=request.week_number,
         month_number=request.month_number,
         year=request.year
     )
-    return data if isinstance(data, str) else data.to_dict(orient="records")
+    return data.to_dict(orient="records")
+
+
+def parse_bbox(bbox: Optional[str]) -> Optional[List[float]]:
+
+    """
+    Parses a "west,south,east,north" bounding box, raises ValueError.
+    """
+
+    if bbox is None:
+        return None
+    west, south, east, north = (float(value) for value in bbox.split(","))
+    if west >= east or south >= north:
+        raise ValueError("bbox must be west,south,east,north with west < east and south < north.")
+    return [west, south, east, north]
+
+
+def map_view(
+    raster,
+    bbox: Optional[List[float]] = None,
+    zoom: Optional[int] = None,
+    levels: Optional[Dict[int, np.ndarray]] = None
+):
+
+    """
+    Cells of a map raster in the viewport bbox, at the pyramid level matching the web map
+    zoom. Precomputed levels are used when available, others are downsampled on the fly.
+    """
 
+    image, transform, nodata = raster
+    if zoom is not None:
+        factor = zoom_factor(zoom, transform.a)
+        if levels and factor in levels:
+            image, transform = levels[factor], transform * Affine.scale(factor)
+        elif factor > 1:
+            image, transform, nodata = downsample_raster(image, transform, nodata, factor)
+    if bbox is not None:
+        image, transform, nodata = crop_raster(image, transform, nodata, bbox)
 
-def post_pm25_map(request):
-    geojson_data = get_pm_map(
-        start_date=request.start_date,
-        end_date=request.end_date
+    return image, transform, nodata
+
+
+def map_response(raster, grid: bool):
+    image, transform, nodata = raster
+    if grid:
+        return JSONResponse(content=raster_to_grid_payload(image, transform, nodata))
+    return StreamingResponse(
+        iter_raster_geojson(image, transform, nodata),
+        media_type="application/json"
     )
-    return JSONResponse(content=convert_geodf_to_dict(geojson_data))
+
+
+def get_pm25_map_view(grid: bool = False, bbox: Optional[List[float]] = None, zoom: Optional[int] = None):
+
+    """
+    Viewport of the precomputed map from its memory-mapped pyramid, None when the map has
+    not been precomputed yet.
+    """
+
+    map_raster = load_map_raster()
+    if map_raster is None:
+        return None
+
+    raster = (map_raster.image, map_raster.transform, map_raster.nodata)
+    return map_response(map_view(raster, bbox, zoom, map_raster.levels), grid)
+
+
+def map_tile_etag() -> Optional[str]:
+
+    """
+    ETag shared by all tiles of the current map generation, None when the map has not been
+    precomputed yet. Tile URLs stay the same across generations, so clients revalidate it.
+    """
+
+    meta = load_artifact(MAP_ARRAY_META_CACHE_FILE)
+    if meta is None:
+        return None
+    digest = meta.etag.strip('"')
+    return f'"{digest}-{meta.generation}"'
+
+
+def get_pm25_map_tile(z: int, x: int, y: int) -> Optional[bytes]:
+
+    """
+    PNG XYZ tile of the precomputed map colored by AQI band, None when the map has not been
+    precomputed yet. Tiles are rendered once per map generation and then served from the
+    in-memory and on-disk tile cache.
+    """
+
+    map_raster = load_map_raster()
+    if map_raster is None:
+        return None
+
+    meta = load_artifact(MAP_ARRAY_META_CACHE_FILE)
+    key = result_key("map_tile", {
+        "generation": meta.generation if meta is not None else 0,
+        "start_date": map_raster.start_date,
+        "end_date": map_raster.end_date,
+        "z": z, "x": x, "y": y
+    })
+    png = MAP_TILES.get(key)
+    if png is None:
+        raster = (map_raster.image, map_raster.transform, map_raster.nodata)
+        png = encode_png(render_pyramid_tile(raster, map_raster.levels, z, x, y))
+        MAP_TILES.put(key, png, RESULT_TTL_HISTORICAL)
+
+    return png
+
+
+def post_pm25_map(
+    request,
+    grid: bool = False,
+    bbox: Optional[List[float]] = None,
+    zoom: Optional[int] = None
+):
+    try:
+        end_date = datetime.date.fromisoformat(request.end_date)
+        key = result_key("map", {
+            "start_date": datetime.date.fromisoformat(request.start_date).isoformat(),
+            "end_date": end_date.isoformat()
+        })
+    except (TypeError, ValueError):
+        key = None
+
+    # Time frames ingested into the tile store are computed locally from the prefix sums,
+    # others come from the result cache or Earth Engine.
+    raster = None
+    cube = load_prefix_cube() if key else None
+    if cube is not None:
+        raster = get_local_pm_raster(cube, request.start_date, request.end_date)
+
+    if raster is None and key:
+        body = RESULTS.get(key)
+        if body is not None:
+            raster = raster_from_bytes(body)
+
+    if raster is None:
+        raster = download_pm_raster(
+            start_date=request.start_date,
+            end_date=request.end_date
+        )
+        if key:
+            RESULTS.put(key, raster_to_bytes(*raster), period_ttl(end_date))
+
+    return map_response(map_view(raster, bbox, zoom), grid)
+
+
+def post_pm25_point_values(request):
+    points = list(request.points)
+    if request.point_x and request.point_y:
+        points.insert(0, (request.point_x, request.point_y))
+    if not points:
+        return "Please input latitude and longitude or a list of points."
+
+    map_raster = load_map_raster()
+    if (map_raster is not None and map_raster.start_date == request.start_date
+            and map_raster.end_date == request.end_date):
+        point_x, point_y = np.array(points, dtype=float).T
+        sampled = sample_raster_points(
+            map_raster.image, map_raster.transform, map_raster.nodata,
+            point_x, point_y, request.interpolation
+        )
+        values = [None if np.isnan(value) else value for value in sampled.tolist()]
+        source = "cache"
+    else:
+        values = get_pm_point_values(points, request.start_date, request.end_date)
+        source = "earth_engine"
+
+    return {
+        "source": source,
+        "start_date": request.start_date,
+        "end_date": request.end_date,
+        "values": [
+            {"point_x": point_x, "point_y": point_y, "PM2.5": value}
+            for (point_x, point_y), value in zip(points, values)
+        ]
+    }
+
+
+def frame_records(frame):
+
+    """
+    JSON records of a DataFrame with NaN as null.
+    """
+
+    return json.loads(frame.to_json(orient="records"))
+
+
+def post_pm25_timeseries(request, today: Optional[datetime.date] = None):
+
+    """
+    Daily, ISO weekly, monthly, yearly and rolling PM2.5 means of a year or a time frame
+    [start_date, end_date) from the local tile store. Returns None when the tile store has
+    not ingested the time frame yet.
+    """
+
+    if request.start_date or request.end_date:
+        if not request.start_date or not request.end_date:
+            return "Please input both start and end date."
+        try:
+            start_date = datetime.date.fromisoformat(request.start_date)
+            end_date = datetime.date.fromisoformat(request.end_date)
+        except ValueError:
+            return "Dates must be in YYYY-MM-DD format."
+    elif request.year:
+        if not datetime.MINYEAR <= request.year < datetime.MAXYEAR:
+            return "Please input a valid year."
+        start_date, end_date = datetime.date(request.year, 1, 1), datetime.date(request.year + 1, 1, 1)
+    else:
+        return "Please input a year or a start and end date."
+
+    # Days are ingested up to yesterday.
+    end_date = min(end_date, today or datetime.date.today())
+    if start_date < datetime.date.fromisoformat(DEFAULT_TILE_INGEST_START_DATE):
+        return f"Time series are available from {DEFAULT_TILE_INGEST_START_DATE}."
+    if end_date <= start_date:
+        return "Please input a time frame before today."
+
+    cube = load_prefix_cube()
+    if cube is None:
+        return None
+    data = extract_timeseries_data(cube, start_date, end_date, request.point_x, request.point_y)
+    if data is None or isinstance(data, str):
+        return data
+
+    result = {
+        "source": "tiles",
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "point_x": request.point_x,
+        "point_y": request.point_y,
+    }
+    for name, frame in data.items():
+        result[name] = frame_records(frame)
+
+    return result
@@ -1,21 +1,99 @@
 import json
+import os
+import time
 import pytest
+from pathlib import Path
 from unittest.mock import patch, mock_open
 from fastapi.testclient import TestClient
 from main import app 
+from utils_f import cache
+from utils_f.cache import ARTIFACTS
+from utils_f.result_cache import RESULTS, MAP_TILES
+from utils_f.scheduler import SCHEDULER
+from utils_f.leader import LEADER
+from utils_f import jobs
 
 client = TestClient(app)
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+JOB_WAIT_SECONDS = 10
+
+
+@pytest.fixture(autouse=True)
+def isolate_cache(tmp_path, monkeypatch):
+
+    """
+    Run each test in its own working directory, so the cache directory and every file in
+    it resolve into tmp_path and the cache of the backend directory is never touched. The
+    package data is linked in, and precompute jobs still running finish before the working
+    directory is restored.
+    """
+
+    os.symlink(BACKEND_DIR / "sentinel5plib", tmp_path / "sentinel5plib")
+    monkeypatch.chdir(tmp_path)
+    yield
+    deadline = time.monotonic() + JOB_WAIT_SECONDS
+    while jobs._current_job is not None and jobs._current_job.active and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+@pytest.fixture(autouse=True)
+def clear_artifacts():
+
+    """
+    Drop in-memory cache artifacts, generations, the manifest, the mapped map raster and the
+    tile store between tests.
+    """
+
+    ARTIFACTS.clear()
+    cache._map_raster = cache._map_raster_meta = cache._generations = cache._manifest = None
+    cache._tile_store = cache._prefix_cube = None
+    yield
+    ARTIFACTS.clear()
+    cache._map_raster = cache._map_raster_meta = cache._generations = cache._manifest = None
+    cache._tile_store = cache._prefix_cube = None
+
+
+@pytest.fixture(autouse=True)
+def isolate_results(tmp_path, monkeypatch):
+
+    """
+    Keep cached POST results and map tiles of each test in their own directories.
+    """
+
+    monkeypatch.setattr(RESULTS, "directory", str(tmp_path / "results"))
+    monkeypatch.setattr(MAP_TILES, "directory", str(tmp_path / "map_tiles"))
+    RESULTS.clear()
+    MAP_TILES.clear()
+    yield
+    RESULTS.clear()
+    MAP_TILES.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolate_leader(tmp_path, monkeypatch):
+
+    """
+    Give each test its own leader lock file, forwarded precompute requests and published job
+    status.
+    """
+
+    monkeypatch.setattr(LEADER, "path", str(tmp_path / "leader.lock"))
+    monkeypatch.setattr(jobs, "PRECOMPUTE_REQUESTS_DIR", str(tmp_path / "precompute_requests"))
+    monkeypatch.setattr(jobs, "JOB_STATUS_FILE", str(tmp_path / "precompute_job.json"))
+    yield
+    LEADER.release()
 
 
 @pytest.fixture
 def mock_cache_file():
 
     """
-    Mock the cache file check and its contents.
+    Mock the cache file check and its contents, the cache is current.
     """
 
-    cache_data = json.dumps({"data": "mocked_value"})
-    with patch("os.path.exists", return_value=True), patch("builtins.open", mock_open(read_data=cache_data)):
+    cache_data = json.dumps({"data": "mocked_value"}).encode()
+    with patch("os.path.exists", return_value=True), patch("builtins.open", mock_open(read_data=cache_data)), \
+            patch("os.path.getmtime", return_value=0.0), patch.object(SCHEDULER, "is_stale", return_value=False):
         yield
 
 
@@ -23,11 +101,11 @@ def mock_cache_file():
 def mock_precompute():
 
     """
-    Mock the precompute_metrics function.
+    Mock the background precompute job submission.
     """
 
-    with patch("routers.pm25.precompute_metrics") as mock_func:
-        mock_func.return_value = None
+    with patch("routers.pm25.submit_precompute") as mock_func:
+        mock_func.return_value = {"id": "job", "status": "queued"}
         yield mock_func
 
 
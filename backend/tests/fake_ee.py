@@ -0,0 +1,331 @@
+"""
+Local stand-in for the subset of the Earth Engine client API used by sentinel5plib.
+
+Objects are lazy like their ee counterparts: nothing is evaluated until getInfo(), which
+counts as one remote round trip (see `calls`) and sleeps `latency` seconds. Images are
+dicts of 2D band arrays on the GRID_TRANSFORM grid plus properties, so point geometries
+sample one pixel and any other geometry reduces over the whole grid.
+"""
+import threading
+import time
+import warnings
+import numpy as np
+
+GRID_TRANSFORM = (9.7, 53.75, 0.05)  # west, north, cell size
+GRID_SHAPE = (4, 6)  # rows, cols sampled by sampleRectangle
+
+calls = 0
+latency = 0.0
+_calls_lock = threading.Lock()
+
+
+def reset(delay: float = 0.0):
+    global calls, latency
+    calls = 0
+    latency = delay
+
+
+def Initialize(*args, **kwargs):
+    pass
+
+
+def _force(value):
+    if isinstance(value, ComputedObject):
+        return _force(value._thunk())
+    if isinstance(value, dict):
+        return {key: _force(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_force(item) for item in value]
+    return value
+
+
+def _plain(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+class ComputedObject:
+
+    def __init__(self, thunk):
+        self._thunk = thunk
+
+    def getInfo(self):
+        global calls
+        with _calls_lock:
+            calls += 1
+        time.sleep(latency)
+        return _plain(_force(self))
+
+    def serialize(self):
+        return repr(_plain(_force(self)))
+
+    def get(self, key):
+        return ComputedObject(lambda: _force(self).get(key))
+
+
+class Number(ComputedObject):
+
+    def lt(self, other):
+        return Number(lambda: _force(self) < _force(other))
+
+    def eq(self, other):
+        return Number(lambda: _force(self) == _force(other))
+
+    def gt(self, other):
+        return Number(lambda: _force(self) > _force(other))
+
+
+class List(ComputedObject):
+
+    def size(self):
+        return Number(lambda: len(_force(self)))
+
+
+class Dictionary(ComputedObject):
+
+    def __init__(self, value):
+        if callable(value):
+            super().__init__(value)
+        else:
+            super().__init__(lambda: {key: _force(item) for key, item in value.items()})
+
+
+class Geometry:
+
+    def __init__(self, kind, coordinates):
+        self.kind = kind
+        self.coordinates = coordinates
+
+    @staticmethod
+    def Point(coordinates):
+        return Geometry('Point', coordinates)
+
+    @staticmethod
+    def Polygon(coordinates):
+        return Geometry('Polygon', coordinates)
+
+    @staticmethod
+    def Rectangle(coordinates):
+        return Geometry('Rectangle', coordinates)
+
+    def contains(self, other):
+        return Number(lambda: True)
+
+
+class Feature:
+
+    def __init__(self, geometry, properties=None):
+        self.geometry = geometry
+        self.properties = dict(properties or {})
+
+
+class FeatureCollection(ComputedObject):
+
+    def __init__(self, features):
+        if isinstance(features, Feature):
+            features = [features]
+        if callable(features):
+            super().__init__(features)
+        else:
+            super().__init__(lambda: list(features))
+
+    def geometry(self):
+        return Geometry('MultiGeometry', [feature.geometry for feature in _force(self)])
+
+
+def _pixel(geometry, array):
+    if array.ndim == 0:
+        return array
+    west, north, size = GRID_TRANSFORM
+    x, y = geometry.coordinates
+    col = int((x - west) // size)
+    row = int((north - y) // size)
+    if 0 <= row < array.shape[0] and 0 <= col < array.shape[1]:
+        return array[row, col]
+    return np.nan
+
+
+def _reduce(array, geometry):
+    if geometry is not None and geometry.kind == 'Point':
+        value = _pixel(geometry, array)
+    else:
+        value = np.nanmean(array) if np.isfinite(array).any() else np.nan
+    return None if np.isnan(value) else float(value)
+
+
+class Reducer:
+
+    def __init__(self, outputs=None):
+        self.outputs = outputs
+
+    @staticmethod
+    def mean():
+        return Reducer()
+
+    def forEachBand(self, image):
+        return Reducer(outputs='bands')
+
+
+class Filter:
+
+    @staticmethod
+    def eq(name, value):
+        return lambda image: image['properties'].get(name) == value
+
+
+class Image(ComputedObject):
+
+    def __init__(self, value):
+        if callable(value):
+            super().__init__(value)
+        else:
+            super().__init__(lambda: value)
+
+    @staticmethod
+    def from_bands(bands, **properties):
+        return Image({'bands': dict(bands), 'properties': properties})
+
+    @staticmethod
+    def constant(value):
+        return Image({'bands': {'constant': np.array(float(value))}, 'properties': {}})
+
+    @staticmethod
+    def cat(images):
+        def thunk():
+            bands = {}
+            for image in images:
+                bands.update(_force(image)['bands'])
+            return {'bands': bands, 'properties': {}}
+        return Image(thunk)
+
+    def _bands(self):
+        return _force(self)['bands']
+
+    def select(self, names):
+        names = [names] if isinstance(names, str) else names
+
+        def thunk():
+            value = _force(self)
+            return {'bands': {n: value['bands'][n] for n in names}, 'properties': value['properties']}
+        return Image(thunk)
+
+    def addBands(self, other):
+        def thunk():
+            value = _force(self)
+            return {'bands': {**value['bands'], **_force(other)['bands']}, 'properties': value['properties']}
+        return Image(thunk)
+
+    def bandNames(self):
+        return List(lambda: list(self._bands()))
+
+    def rename(self, name):
+        return Image(lambda: {'bands': {name: next(iter(self._bands().values()))}, 'properties': {}})
+
+    def _math(self, operation):
+        return Image(lambda: {
+            'bands': {key: operation(band) for key, band in self._bands().items()},
+            'properties': _force(self)['properties']
+        })
+
+    def divide(self, value):
+        return self._math(lambda band: band / value)
+
+    def multiply(self, value):
+        return self._math(lambda band: band * value)
+
+    def expression(self, expression, mapping):
+        def thunk():
+            arrays = {key: next(iter(image._bands().values())) for key, image in mapping.items()}
+            return {'bands': {'constant': eval(expression, {}, arrays)}, 'properties': {}}
+        return Image(thunk)
+
+    def clip(self, geometry):
+        return self
+
+    def set(self, name, value):
+        def thunk():
+            value_ = _force(self)
+            return {'bands': value_['bands'], 'properties': {**value_['properties'], name: _force(value)}}
+        return Image(thunk)
+
+    def reproject(self, crs=None, crsTransform=None, scale=None):
+        return self
+
+    def sampleRectangle(self, region=None, defaultValue=None):
+        def thunk():
+            properties = {}
+            for key, band in self._bands().items():
+                values = np.broadcast_to(band, GRID_SHAPE).astype(float)
+                properties[key] = np.where(np.isnan(values), defaultValue, values).tolist()
+            return {'type': 'Feature', 'geometry': None, 'properties': properties}
+        return ComputedObject(thunk)
+
+    def reduceRegion(self, reducer, geometry, scale=None, maxPixels=None):
+        return Dictionary(lambda: {key: _reduce(band, geometry) for key, band in self._bands().items()})
+
+    def reduceRegions(self, collection, reducer, scale=None):
+        def thunk():
+            bands = self._bands()
+            features = []
+            for feature in _force(collection):
+                properties = dict(feature.properties)
+                for key, band in bands.items():
+                    # Like ee, a plain reducer on a single band image outputs 'mean'.
+                    name = key if reducer.outputs == 'bands' or len(bands) > 1 else 'mean'
+                    properties[name] = _reduce(band, feature.geometry)
+                features.append({'type': 'Feature', 'properties': properties})
+            return {'type': 'FeatureCollection', 'features': features}
+        return FeatureCollection(thunk)
+
+
+class ImageCollection(ComputedObject):
+
+    def __init__(self, images):
+        if callable(images):
+            super().__init__(images)
+        else:
+            super().__init__(lambda: [_force(image) for image in images])
+
+    def filter(self, predicate):
+        return ImageCollection(lambda: [image for image in _force(self) if predicate(image)])
+
+    def filterBounds(self, geometry):
+        return self
+
+    def filterDate(self, start, end):
+        # Fake images carry their ISO date as system:time_start.
+        return ImageCollection(lambda: [
+            image for image in _force(self) if start <= image['properties'].get('system:time_start', '') < end
+        ])
+
+    def map(self, function):
+        return ImageCollection(lambda: [_force(function(Image(image))) for image in _force(self)])
+
+    def select(self, names):
+        return self.map(lambda image: image.select(names))
+
+    def size(self):
+        return Number(lambda: len(_force(self)))
+
+    def mean(self):
+        def thunk():
+            images = _force(self)
+            names = [name for name in (images[0]['bands'] if images else {})]
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                bands = {name: np.nanmean(np.stack([image['bands'][name] for image in images]), axis=0)
+                         for name in names}
+            return {'bands': bands, 'properties': {}}
+        return Image(thunk)
+
+
+class Algorithms:
+
+    @staticmethod
+    def If(condition, true_case, false_case):
+        return ComputedObject(lambda: _force(true_case) if _force(condition) else _force(false_case))
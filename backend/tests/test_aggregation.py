@@ -0,0 +1,66 @@
+import datetime
+import numpy as np
+import pandas as pd
+import pytest
+from sentinel5plib.aggregation import aggregate_daily_series, iso_calendar
+
+
+def test_iso_calendar_matches_datetime():
+
+    """
+    Test the vectorized ISO weeks match datetime.isocalendar, across year boundaries.
+    """
+
+    days = [datetime.date(2018, 12, 20) + datetime.timedelta(days=offset) for offset in range(3000)]
+    iso_years, iso_weeks = iso_calendar(np.array(days, dtype='datetime64[D]'))
+
+    assert list(zip(iso_years.tolist(), iso_weeks.tolist())) == [day.isocalendar()[:2] for day in days]
+
+
+def test_aggregate_daily_series_matches_pandas():
+
+    """
+    Test calendar buckets and rolling means match pandas groupby/rolling, skipping NaN days.
+    """
+
+    rng = np.random.default_rng(7)
+    dates = pd.date_range('2024-12-01', '2026-01-10', freq='D')
+    values = rng.random(len(dates)) * 50
+    values[rng.random(len(dates)) < 0.2] = np.nan
+    series = pd.Series(values, index=dates)
+
+    result = aggregate_daily_series(dates.values.astype('datetime64[D]'), values)
+
+    iso = dates.isocalendar()
+    expected = {
+        'weekly': series.groupby([iso['year'].values, iso['week'].values]).mean(),
+        'monthly': series.groupby([dates.year, dates.month]).mean(),
+        'yearly': series.groupby(dates.year).mean(),
+    }
+    for name, means in expected.items():
+        np.testing.assert_allclose(result[name]['PM2.5'].values, means.values, rtol=1e-12)
+
+    np.testing.assert_allclose(result['daily']['PM2.5'].values, values)
+    assert result['weekly'][['year', 'week']].values[0].tolist() == [2024, 48]
+    for window in (7, 30):
+        rolling = series.rolling(window, min_periods=1).mean()
+        np.testing.assert_allclose(result[f'rolling_{window}']['PM2.5'].values, rolling.values, rtol=1e-9)
+
+
+def test_aggregate_daily_series_empty_buckets():
+
+    """
+    Test buckets without valid days are NaN with zero days.
+    """
+
+    dates = np.arange('2025-01-01', '2025-01-15', dtype='datetime64[D]')
+    values = np.full(len(dates), np.nan)
+    values[:3] = [1.0, 2.0, 3.0]
+
+    result = aggregate_daily_series(dates, values)
+
+    assert result['weekly']['days'].tolist() == [3, 0, 0]
+    assert result['weekly']['PM2.5'].iloc[0] == pytest.approx(2.0)
+    assert np.isnan(result['weekly']['PM2.5'].iloc[1])
+    assert result['rolling_7']['PM2.5'].iloc[8] == pytest.approx(3.0)
+    assert np.isnan(result['rolling_7']['PM2.5'].iloc[-1])
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+from tests import fake_ee
+from sentinel5plib import batch_utils, avg_utils
+
+SHAPE = (4, 6)
+
+
+def make_collections():
+    aai, no2 = [], []
+    for day, week, month, aai_value, no2_value in [
+        (6, 2, 1, 1.0, 2.0),
+        (7, 2, 1, 3.0, 4.0),
+        (20, 3, 1, 5.0, 6.0),
+        (3, 5, 2, 7.0, 8.0),
+    ]:
+        properties = {'day': day, 'week': week, 'month': month}
+        aai.append(fake_ee.Image.from_bands(
+            {'absorbing_aerosol_index': np.full(SHAPE, aai_value)}, **properties))
+        no2.append(fake_ee.Image.from_bands(
+            {'NO2_in_µg_per_m3': np.full(SHAPE, no2_value)}, **properties))
+    return fake_ee.ImageCollection(aai), fake_ee.ImageCollection(no2)
+
+
+@pytest.fixture
+def fake_ee_module(monkeypatch):
+    fake_ee.reset()
+    monkeypatch.setattr(batch_utils, 'ee', fake_ee)
+    yield fake_ee
+
+
+def test_batched_average_data_single_round_trip(fake_ee_module):
+
+    """
+    Test week, month and year means, including the empty-band checks, cost one getInfo.
+    """
+
+    images_aai, images_no2 = make_collections()
+    aoi = fake_ee.Geometry.Polygon([])
+
+    means = batch_utils.get_batched_average_data(images_aai, images_no2, {
+        'week': ('week', 2),
+        'month': ('month', 1),
+        'year': (None, 2025),
+        'empty': ('week', 40)
+    }, aoi)
+
+    assert fake_ee.calls == 1
+    assert means['week'] == pytest.approx(5 * 3.0 + 30 * 2.0)
+    assert means['month'] == pytest.approx(5 * 4.0 + 30 * 3.0)
+    assert means['year'] == pytest.approx(5 * 5.0 + 30 * 4.0)
+    assert means['empty'] == 0
+
+
+def test_weekly_average_data_single_round_trip(fake_ee_module):
+
+    """
+    Test the per-period helpers fetch their mean with a single getInfo.
+    """
+
+    images_aai, images_no2 = make_collections()
+
+    mean_pm25 = avg_utils.get_weekly_average_data(images_aai, images_no2, 3, fake_ee.Geometry.Polygon([]))
+
+    assert fake_ee.calls == 1
+    assert mean_pm25 == pytest.approx(5 * 6.0 + 30 * 5.0)
+
+
+def test_batched_point_average_data_single_round_trip(fake_ee_module):
+
+    """
+    Test all points and periods are evaluated with one reduceRegions getInfo.
+    """
+
+    images_aai, images_no2 = make_collections()
+    gradient = np.arange(SHAPE[0] * SHAPE[1], dtype=float).reshape(SHAPE)
+    images_aai = images_aai.map(lambda image: image.multiply(1).addBands(
+        fake_ee.Image.from_bands({'absorbing_aerosol_index': gradient})))
+    points = [(9.7 + 0.05 * col + 0.025, 53.75 - 0.05 * row - 0.025) for row, col in [(0, 0), (3, 5), (1, 2)]]
+
+    rows = batch_utils.get_batched_point_average_data(images_aai, images_no2, {
+        'week': ('week', 2),
+        'year': (None, 2025),
+        'empty': ('month', 12)
+    }, points)
+
+    assert fake_ee.calls == 1
+    assert len(rows) == 3
+    for (row, col), means in zip([(0, 0), (3, 5), (1, 2)], rows):
+        assert means['week'] == pytest.approx(5 * 3.0 + 30 * gradient[row, col])
+        assert means['year'] == pytest.approx(5 * 5.0 + 30 * gradient[row, col])
+        assert means['empty'] == 0
+
+
+def test_batched_point_average_data_without_points(fake_ee_module):
+
+    """
+    Test an empty batch returns no rows without an Earth Engine request.
+    """
+
+    images_aai, images_no2 = make_collections()
+
+    rows = batch_utils.get_batched_point_average_data(images_aai, images_no2, {
+        'empty': ('month', 12)
+    }, [])
+
+    assert rows == []
+    assert fake_ee.calls == 0
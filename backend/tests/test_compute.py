@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from tests import fake_ee
+from sentinel5plib import batch_utils, compute, vector_utils
+from sentinel5plib.compute import EarthEngineBackend, NumPyBackend, aoi_mask
+from sentinel5plib.tile_store import aoi_tile_grid
+
+SHAPE = fake_ee.GRID_SHAPE
+RNG = np.random.default_rng(7)
+
+
+def random_stack(days, scale, missing=0.2):
+    values = RNG.random((days,) + SHAPE) * scale
+    values[RNG.random(values.shape) < missing] = np.nan
+    return values
+
+
+def ee_collection(band, stack):
+    return fake_ee.ImageCollection([fake_ee.Image.from_bands({band: day}) for day in stack])
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    fake_ee.reset()
+    monkeypatch.setattr(compute, 'ee', fake_ee)
+    monkeypatch.setattr(batch_utils, 'ee', fake_ee)
+    yield EarthEngineBackend(), NumPyBackend()
+
+
+def test_unit_conversion_and_pm25_parity(backends):
+
+    """
+    Test NO2 conversion and the PM2.5 formula match the Earth Engine expressions.
+    """
+
+    earth_engine, numpy = backends
+    no2_mol, aai = random_stack(1, 2e-4, 0)[0], random_stack(1, 3, 0)[0]
+
+    ee_no2 = earth_engine.convert_no2(fake_ee.Image.from_bands({'NO2_column_number_density': no2_mol}))
+    ee_pm25 = earth_engine.pm25(fake_ee.Image.from_bands({'absorbing_aerosol_index': aai}), ee_no2)
+
+    np.testing.assert_allclose(numpy.convert_no2(no2_mol), ee_no2._bands()['NO2_in_µg_per_m3'])
+    np.testing.assert_allclose(numpy.pm25(aai, numpy.convert_no2(no2_mol)), ee_pm25._bands()['PM25'])
+
+
+@pytest.mark.parametrize('days', [1, 7, 30])
+def test_period_mean_parity(backends, days):
+
+    """
+    Test the composite and AOI mean of a period match get_period_mean.
+    """
+
+    earth_engine, numpy = backends
+    aai, no2 = random_stack(days, 3), random_stack(days, 40)
+
+    expected = earth_engine.period_mean(
+        ee_collection('absorbing_aerosol_index', aai),
+        ee_collection('NO2_in_µg_per_m3', no2),
+        fake_ee.Geometry.Polygon([])
+    ).getInfo()
+
+    assert numpy.period_mean(aai, no2, np.ones(SHAPE, dtype=bool)) == pytest.approx(expected, rel=1e-9)
+
+
+def test_empty_period_mean_parity(backends):
+
+    """
+    Test a period without images is 0 on both backends.
+    """
+
+    earth_engine, numpy = backends
+    empty = np.full((3,) + SHAPE, np.nan)
+
+    expected = earth_engine.period_mean(
+        ee_collection('absorbing_aerosol_index', []),
+        ee_collection('NO2_in_µg_per_m3', []),
+        fake_ee.Geometry.Polygon([])
+    ).getInfo()
+
+    assert expected == 0
+    assert numpy.period_mean(empty, empty, np.ones(SHAPE, dtype=bool)) == 0
+
+
+def test_masked_mean_vectorized_over_time():
+
+    """
+    Test the AOI mean of a stack equals the per-day means.
+    """
+
+    numpy = NumPyBackend()
+    stack = random_stack(5, 10)
+    stack[2] = np.nan
+    mask = np.zeros(SHAPE, dtype=bool)
+    mask[1:3, 2:5] = True
+
+    means = numpy.masked_mean(stack, mask)
+
+    assert means.shape == (5,)
+    assert np.isnan(means[2])
+    for day in (0, 1, 3, 4):
+        assert means[day] == pytest.approx(np.nanmean(stack[day][mask]))
+
+
+def test_aoi_mask(monkeypatch):
+
+    """
+    Test the AOI mask covers Hamburg cells only.
+    """
+
+    monkeypatch.setattr(vector_utils, 'ee', fake_ee)
+    monkeypatch.setattr(vector_utils, '_aoi_cache', {})
+    grid = aoi_tile_grid()
+    mask = aoi_mask(grid)
+
+    col, row = ~grid.transform * (10.0, 53.55)
+    assert mask.shape == (grid.rows, grid.cols)
+    assert mask[int(row), int(col)]
+    assert not mask[0, 0]
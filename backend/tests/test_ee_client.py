@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from sentinel5plib.ee_client import EarthEngineClient, EarthEngineTimeout
+from tests import fake_ee
+
+client = TestClient(app)
+LATENCY = 0.2
+
+
+@pytest.fixture
+def ee_client():
+    fake_ee.reset(LATENCY)
+    yield EarthEngineClient(max_workers=8, timeout=5, backoff_seconds=0.001)
+    fake_ee.reset()
+
+
+def test_concurrent_calls_run_in_parallel(ee_client):
+
+    """
+    Test distinct evaluations awaited together overlap instead of running one by one.
+    """
+
+    async def evaluate_all():
+        return await asyncio.gather(*[
+            ee_client.get_info_async(fake_ee.Dictionary({'index': index})) for index in range(8)
+        ])
+
+    start = time.perf_counter()
+    results = asyncio.run(evaluate_all())
+
+    assert results == [{'index': index} for index in range(8)]
+    assert fake_ee.calls == 8
+    assert time.perf_counter() - start < 8 * LATENCY / 2
+
+
+def test_pool_bounds_concurrency():
+
+    """
+    Test no more than max_workers calls run at the same time and the rest are queued.
+    """
+
+    ee_client = EarthEngineClient(max_workers=2, timeout=5)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+    release = threading.Event()
+
+    def call():
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        release.wait(5)
+        with lock:
+            running[0] -= 1
+
+    futures = [ee_client.submit(call) for _ in range(6)]
+    time.sleep(0.05)
+    assert ee_client.stats()["running"] == 2
+    assert ee_client.stats()["queued"] == 4
+
+    release.set()
+    for future in futures:
+        ee_client.result(future)
+    assert peak[0] == 2
+    assert ee_client.stats()["queued"] == ee_client.stats()["running"] == 0
+
+
+def test_identical_graphs_coalesced(ee_client):
+
+    """
+    Test concurrent evaluations of the same ee graph share one Earth Engine call.
+    """
+
+    async def evaluate_twice():
+        return await asyncio.gather(
+            ee_client.get_info_async(fake_ee.Dictionary({'mean': 1.5})),
+            ee_client.get_info_async(fake_ee.Dictionary({'mean': 1.5}))
+        )
+
+    assert asyncio.run(evaluate_twice()) == [{'mean': 1.5}, {'mean': 1.5}]
+    assert fake_ee.calls == 1
+    assert ee_client.stats()["coalesced"] == 1
+    assert ee_client.stats()["in_flight"] == 0
+
+    assert ee_client.get_info(fake_ee.Dictionary({'mean': 1.5})) == {'mean': 1.5}
+    assert fake_ee.calls == 2
+
+
+def test_timeout_does_not_cancel_shared_call(ee_client):
+
+    """
+    Test a waiter timing out gets EarthEngineTimeout while others still receive the result.
+    """
+
+    async def evaluate():
+        graph = fake_ee.Dictionary({'mean': 2.0})
+        impatient = ee_client.get_info_async(graph, timeout=0.01)
+        patient = ee_client.get_info_async(fake_ee.Dictionary({'mean': 2.0}))
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    impatient, patient = asyncio.run(evaluate())
+
+    assert isinstance(impatient, EarthEngineTimeout)
+    assert patient == {'mean': 2.0}
+    assert ee_client.stats()["timeouts"] == 1
+    assert fake_ee.calls == 1
+
+
+def test_quota_errors_retried(ee_client):
+
+    """
+    Test quota errors are retried with backoff and other errors fail right away.
+    """
+
+    attempts = []
+
+    def flaky():
+        attempts.append(time.perf_counter())
+        if len(attempts) < 3:
+            raise Exception("Too many concurrent aggregations.")
+        return 42
+
+    assert ee_client.call(flaky) == 42
+    assert len(attempts) == 3
+    assert ee_client.stats()["retries"] == 2
+
+    def broken():
+        raise ValueError("Image.select: Pattern 'PM25' did not match any bands.")
+
+    with pytest.raises(ValueError):
+        ee_client.call(broken)
+    assert ee_client.stats()["failures"] == 1
+    assert ee_client.stats()["calls"] == 4
+
+
+def test_quota_retries_exhausted():
+
+    """
+    Test the quota error is raised once max_retries is reached.
+    """
+
+    ee_client = EarthEngineClient(max_workers=1, timeout=5, max_retries=2, backoff_seconds=0.001)
+
+    def exhausted():
+        raise Exception("Quota exceeded for quota metric 'Requests'.")
+
+    with pytest.raises(Exception, match="Quota exceeded"):
+        ee_client.call(exhausted)
+    assert ee_client.stats()["calls"] == 3
+
+
+def test_earth_engine_stats_endpoint():
+
+    """
+    Test the Earth Engine client queue metrics are exposed.
+    """
+
+    response = client.get("/pm25/ee/stats")
+    assert response.status_code == 200
+    assert {"max_workers", "queued", "running", "in_flight", "coalesced"} <= set(response.json())
@@ -24,6 +24,9 @@ def test_pm25_averages_precompute(mock_precompute):
 
     with patch("os.path.exists", return_value=False):
         response = client.get("/pm25/averages")
-    assert response.status_code == 200
-    assert response.json() == {"message": "Precomputing PM2.5 averages, try again later."}
-    assert mock_precompute.called
+    assert response.status_code == 202
+    assert response.json() == {
+        "message": "Precomputing PM2.5 averages, try again later.",
+        "job": {"id": "job", "status": "queued"}
+    }
+    mock_precompute.assert_called_once_with(["averages"])
@@ -1,3 +1,4 @@
+import datetime
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from main import app
@@ -24,6 +25,85 @@ def test_air_quality_indicator_precompute(mock_precompute):
 
     with patch("os.path.exists", return_value=False):
         response = client.get("/pm25/indicator")
+    assert response.status_code == 202
+    assert response.json() == {
+        "message": "Precomputing PM2.5 indicator, try again later.",
+        "job": {"id": "job", "status": "queued"}
+    }
+    mock_precompute.assert_called_once_with(["indicator"])
+
+
+def test_air_quality_indicator_missing_in_backoff(mock_precompute):
+
+    """
+    Test a missing indicator whose last run failed is not resubmitted before the backoff.
+    """
+
+    failed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    manifest = {"indicator": {"failed_at": failed_at, "error": "Test Error"}}
+    with patch("os.path.exists", return_value=False), \
+            patch("utils_f.cache.read_manifest", return_value=manifest):
+        response = client.get("/pm25/indicator")
+
+    assert response.status_code == 202
+    assert response.json()["job"] == {"status": "idle"}
+    mock_precompute.assert_not_called()
+
+
+def test_air_quality_indicator_not_modified(mock_cache_file):
+
+    """
+    Test a matching If-None-Match is answered with 304 and no body.
+    """
+
+    etag = client.get("/pm25/indicator").headers["etag"]
+    response = client.get("/pm25/indicator", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_air_quality_indicator_compressed(mock_cache_file):
+
+    """
+    Test the precompressed variants are served according to Accept-Encoding.
+    """
+
+    response = client.get("/pm25/indicator", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == {"data": "mocked_value"}
+
+    response = client.get("/pm25/indicator", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"data": "mocked_value"}
+
+
+def test_air_quality_indicator_served_from_memory(mock_cache_file):
+
+    """
+    Test the cache file is read from disk only once.
+    """
+
+    client.get("/pm25/indicator")
+    with patch("builtins.open", side_effect=AssertionError("cache file was read again")):
+        response = client.get("/pm25/indicator")
+    assert response.status_code == 200
+    assert response.json() == {"data": "mocked_value"}
+
+
+def test_air_quality_indicator_stale_while_revalidate(mock_cache_file, mock_precompute):
+
+    """
+    Test an outdated indicator is still served, with its age and generation, and left to
+    the scheduler to refresh.
+    """
+
+    with patch("routers.pm25.SCHEDULER.is_stale", return_value=True):
+        response = client.get("/pm25/indicator")
+
     assert response.status_code == 200
-    assert response.json() == {"message": "Precomputing PM2.5 indicator, try again later."}
-    assert mock_precompute.called
+    assert response.json() == {"data": "mocked_value"}
+    assert response.headers["x-cache-status"] == "stale"
+    assert int(response.headers["age"]) >= 0
+    assert "x-cache-generation" in response.headers
+    mock_precompute.assert_not_called()
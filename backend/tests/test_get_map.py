@@ -1,6 +1,12 @@
+import math
+import os
 from unittest.mock import patch
 from fastapi.testclient import TestClient
 from main import app 
+from sentinel5plib.defaults import DEFAULT_MAP_RASTER_OUTPUT_PATH
+from sentinel5plib.raster_utils import read_raster, grid_payload_to_raster, downsample_raster
+from utils_f import cache
+from utils_f.cache import ARTIFACTS
 
 client = TestClient(app)
 
@@ -24,6 +30,91 @@ def test_pm25_map_precompute(mock_precompute):
 
     with patch("os.path.exists", return_value=False):
         response = client.get("/pm25/map-data")
+    assert response.status_code == 202
+    assert response.json() == {
+        "message": "Precomputing PM2.5 Map, try again later.",
+        "job": {"id": "job", "status": "queued"}
+    }
+    mock_precompute.assert_called_once_with(["map"])
+
+
+def test_pm25_map_grid_format(mock_cache_file):
+
+    """
+    Test the grid payload cache file (pm25_map_grid.json) is served for format=grid.
+    """
+
+    response = client.get("/pm25/map-data?format=grid")
+    assert response.status_code == 200
+    assert list(ARTIFACTS) == ["cache/pm25_map_grid.json"]
+
+
+def test_pm25_map_grid_accept_header(mock_cache_file):
+
+    """
+    Test the grid payload is selected by the Accept header.
+    """
+
+    response = client.get("/pm25/map-data", headers={"Accept": "application/vnd.pm25.grid+json"})
+    assert response.status_code == 200
+    assert list(ARTIFACTS) == ["cache/pm25_map_grid.json"]
+
+
+def test_pm25_map_invalid_format():
+
+    """
+    Test an unknown map format is rejected.
+    """
+
+    response = client.get("/pm25/map-data?format=csv")
+    assert response.status_code == 422
+
+
+def test_pm25_map_viewport_from_pyramid(tmp_path, monkeypatch):
+
+    """
+    Test zoom selects a precomputed pyramid level and bbox returns only the cells in view.
+    """
+
+    image, transform, nodata = read_raster(os.path.abspath(DEFAULT_MAP_RASTER_OUTPUT_PATH))
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(cache.CACHE_DIR)
+    cache.store_map_raster(image, transform, nodata, "2025-01-01", "2025-12-31")
+    cache._map_raster = None
+
+    response = client.get("/pm25/map-data?format=grid&zoom=7")
     assert response.status_code == 200
-    assert response.json() == {"message": "Precomputing PM2.5 Map, try again later."}
-    assert mock_precompute.called
+    level, level_transform, _ = grid_payload_to_raster(response.json())
+    expected = downsample_raster(image, transform, nodata, 8)[0]
+    assert level.shape == (math.ceil(image.shape[0] / 8), math.ceil(image.shape[1] / 8))
+    assert level_transform.a == transform.a * 8
+    assert (level == expected.astype(level.dtype)).all()
+
+    west, north = transform * (10, 5)
+    east, south = transform * (20, 12)
+    response = client.get(f"/pm25/map-data?format=grid&bbox={west},{south},{east},{north}")
+    window, window_transform, _ = grid_payload_to_raster(response.json())
+    assert (window == image[5:12, 10:20]).all()
+    assert window_transform * (0, 0) == (west, north)
+
+
+def test_pm25_map_viewport_precompute(mock_precompute):
+
+    """
+    Test a viewport query before the map raster was precomputed starts the precompute.
+    """
+
+    with patch("services.pm25_services.load_map_raster", return_value=None):
+        response = client.get("/pm25/map-data?zoom=8")
+    assert response.status_code == 202
+    mock_precompute.assert_called_once_with(["map"])
+
+
+def test_pm25_map_invalid_bbox():
+
+    """
+    Test malformed and inverted bounding boxes are rejected.
+    """
+
+    assert client.get("/pm25/map-data?bbox=10,53").status_code == 422
+    assert client.get("/pm25/map-data?bbox=10.2,53.4,10.1,53.6").status_code == 422
@@ -0,0 +1,104 @@
+import os
+import numpy as np
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from rasterio.transform import from_origin
+from sentinel5plib.map_tiles import AQI_COLORS
+from tests.test_map_tiles import decode_png, tile_index
+from utils_f import cache
+from utils_f.result_cache import MAP_TILES
+
+client = TestClient(app)
+TRANSFORM = from_origin(9.7, 53.75, 0.01, 0.01)
+
+
+def store_map(tmp_path, monkeypatch, value: float):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(cache.CACHE_DIR, exist_ok=True)
+    cache.store_map_raster(np.full((40, 80), value), TRANSFORM, -9999.0, "2025-01-01", "2025-12-31")
+    cache._map_raster = None
+
+
+def test_pm25_map_tile(tmp_path, monkeypatch):
+
+    """
+    Test a tile over Hamburg is rendered as PNG in the AQI colors and cached.
+    """
+
+    store_map(tmp_path, monkeypatch, 20.0)
+    x, y = tile_index(10.1, 53.55, 10)
+
+    response = client.get(f"/pm25/tiles/10/{x}/{y}.png")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["cache-control"] == "no-cache"
+    rgba = decode_png(response.content)
+    assert (rgba[rgba[..., 3] > 0] == AQI_COLORS[1]).all()
+
+    with patch("services.pm25_services.render_pyramid_tile") as mock_render:
+        cached = client.get(f"/pm25/tiles/10/{x}/{y}.png")
+    assert cached.content == response.content
+    mock_render.assert_not_called()
+    assert MAP_TILES.stats()["hits"] == 1
+
+
+def test_pm25_map_tile_new_generation(tmp_path, monkeypatch):
+
+    """
+    Test tiles of a recomputed map are rendered again instead of served from the cache.
+    """
+
+    store_map(tmp_path, monkeypatch, 20.0)
+    x, y = tile_index(10.1, 53.55, 10)
+    client.get(f"/pm25/tiles/10/{x}/{y}.png")
+
+    store_map(tmp_path, monkeypatch, 200.0)
+    rgba = decode_png(client.get(f"/pm25/tiles/10/{x}/{y}.png").content)
+    assert (rgba[rgba[..., 3] > 0] == AQI_COLORS[4]).all()
+
+
+def test_pm25_map_tile_revalidated(tmp_path, monkeypatch):
+
+    """
+    Test a tile is revalidated with its ETag: 304 without rendering while the map is
+    unchanged, the new tile once the map was recomputed.
+    """
+
+    store_map(tmp_path, monkeypatch, 20.0)
+    x, y = tile_index(10.1, 53.55, 10)
+    etag = client.get(f"/pm25/tiles/10/{x}/{y}.png").headers["etag"]
+
+    with patch("routers.pm25.get_pm25_map_tile") as mock_tile:
+        response = client.get(f"/pm25/tiles/10/{x}/{y}.png", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    mock_tile.assert_not_called()
+
+    store_map(tmp_path, monkeypatch, 200.0)
+    response = client.get(f"/pm25/tiles/10/{x}/{y}.png", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_pm25_map_tile_precompute(mock_precompute):
+
+    """
+    Test a tile request before the map raster was precomputed starts the precompute.
+    """
+
+    with patch("services.pm25_services.load_map_raster", return_value=None):
+        response = client.get("/pm25/tiles/10/540/330.png")
+    assert response.status_code == 202
+    mock_precompute.assert_called_once_with(["map"])
+
+
+def test_pm25_map_tile_invalid_index():
+
+    """
+    Test tile indices outside the zoom level are rejected.
+    """
+
+    assert client.get("/pm25/tiles/2/4/0.png").status_code == 422
+    assert client.get("/pm25/tiles/2/0/-1.png").status_code == 422
+    assert client.get("/pm25/tiles/23/0/0.png").status_code == 422
@@ -0,0 +1,100 @@
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from unittest.mock import patch
+import pytest
+from sentinel5plib import ee_client
+from sentinel5plib.lazy_imports import lazy_import, is_loaded
+from tests import fake_ee
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("pandas", "geopandas", "rasterio", "shapely", "ee")
+
+
+def test_app_import_skips_heavy_modules():
+
+    """
+    Test importing the app neither imports the heavy dependencies nor Earth Engine.
+    """
+
+    script = f"import sys, main; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=BACKEND_DIR, stdout=subprocess.PIPE,
+        universal_newlines=True, check=True
+    )
+
+    assert result.stdout.strip() == ""
+
+
+def test_import_hook_runs_once():
+
+    """
+    Test concurrent first uses import the module and run its hook exactly once.
+    """
+
+    calls = []
+    module = lazy_import("tests.fake_ee", on_import=calls.append)
+    barrier = threading.Barrier(8)
+
+    def use():
+        barrier.wait()
+        module.Dictionary({"day": 1.0})
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [fake_ee]
+    assert is_loaded(module)
+    assert module.Dictionary is fake_ee.Dictionary
+
+
+def test_failed_hook_retried():
+
+    """
+    Test a failed initialisation is retried on the next use instead of being skipped.
+    """
+
+    attempts = []
+
+    def initialize(module):
+        attempts.append(module)
+        if len(attempts) == 1:
+            raise RuntimeError("not authenticated")
+
+    module = lazy_import("tests.fake_ee", on_import=initialize)
+
+    with pytest.raises(RuntimeError):
+        module.Dictionary
+    assert not is_loaded(module)
+    assert module.Dictionary is fake_ee.Dictionary
+    assert len(attempts) == 2
+
+
+def test_ee_initialised_on_first_use():
+
+    """
+    Test the shared ee stand-in calls ee.Initialize once, on first attribute access.
+    """
+
+    module = lazy_import("tests.fake_ee", on_import=ee_client.initialize_ee)
+    with patch.object(fake_ee, "Initialize", create=True) as initialize:
+        assert not initialize.called
+        module.Dictionary
+        module.Image
+        assert initialize.call_count == 1
+
+
+def test_patch_lazy_module_attribute():
+
+    """
+    Test attributes of a lazy module can be patched and are restored afterwards.
+    """
+
+    module = lazy_import("tests.fake_ee")
+    with patch.object(module, "Dictionary", "patched"):
+        assert module.Dictionary == "patched"
+    assert module.Dictionary is fake_ee.Dictionary
@@ -0,0 +1,109 @@
+import pytest
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+from main import app
+from sentinel5plib import data_utils, vector_utils
+from sentinel5plib.ee_client import EarthEngineClient
+from sentinel5plib.log_utils import (
+    configure_logging,
+    bind_request_id,
+    reset_request_id,
+    request_id_from_header,
+    sample_request
+)
+from sentinel5plib.defaults import HAMBURG_GEOJSON_PATH
+from loguru import logger
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def records():
+
+    """
+    Route log records at DEBUG into a list, restore the default sink afterwards.
+    """
+
+    messages = []
+    configure_logging(level="DEBUG", sink=lambda message: messages.append(message.record))
+    yield messages
+    configure_logging()
+
+
+def test_request_id_bound_to_records(records):
+
+    """
+    Test records carry the bound correlation ID, also from Earth Engine pool threads.
+    """
+
+    def call():
+        logger.info("inside the pool")
+
+    token = bind_request_id("abc123")
+    try:
+        logger.info("inside the request")
+        EarthEngineClient(max_workers=1).call(call)
+    finally:
+        reset_request_id(token)
+    logger.info("outside the request")
+
+    assert [record["extra"]["request_id"] for record in records] == ["abc123", "abc123", "-"]
+
+
+def test_request_id_from_header():
+
+    """
+    Test client IDs are kept when they are plain tokens and replaced otherwise.
+    """
+
+    assert request_id_from_header("req-42.a_b") == "req-42.a_b"
+    assert len(request_id_from_header(None)) == 16
+    assert request_id_from_header("bad id\n") != "bad id\n"
+    assert request_id_from_header("x" * 65) != "x" * 65
+
+
+def test_sample_request():
+
+    """
+    Test failed and slow requests are always logged, fast ones by the sample rate.
+    """
+
+    assert not sample_request(200, 0.01, rate=0.0)
+    assert sample_request(200, 0.01, rate=1.0)
+    assert sample_request(500, 0.01, rate=0.0)
+    assert sample_request(200, 5.0, rate=0.0, slow_seconds=1.0)
+
+
+def test_request_span_logged(records, mock_cache_file):
+
+    """
+    Test a request logs one span with its correlation ID, echoed in X-Request-ID.
+    """
+
+    response = client.get("/pm25/indicator", headers={"X-Request-ID": "span-1"})
+
+    assert response.headers["x-request-id"] == "span-1"
+    spans = [record for record in records if record["extra"].get("route") == "/pm25/indicator"]
+    assert len(spans) == 1
+    assert spans[0]["extra"]["request_id"] == "span-1"
+    assert spans[0]["extra"]["status"] == 200
+    assert spans[0]["message"].startswith("GET /pm25/indicator 200 in ")
+
+
+def test_hot_path_helpers_do_not_log(records, monkeypatch):
+
+    """
+    Test the mapped ee helpers log nothing and the geometry conversion only at DEBUG.
+    """
+
+    image = MagicMock()
+    for helper in (data_utils.selectAAI, data_utils.selectNO2, data_utils.addDAY_of_year,
+                   data_utils.addWEEK_of_year, data_utils.addMONTH_of_year,
+                   data_utils.convertNO2MolM2ToMicrogramM3, data_utils.getPM):
+        helper(image)
+    assert records == []
+
+    monkeypatch.setattr(vector_utils, "ee", MagicMock())
+    vector_utils.vector_to_ee_geometry_object(HAMBURG_GEOJSON_PATH)
+    assert len(records) <= 3
+    assert all(record["level"].name == "DEBUG" for record in records)
@@ -0,0 +1,122 @@
+import math
+import struct
+import zlib
+import numpy as np
+from rasterio.transform import from_origin, Affine
+from sentinel5plib.map_tiles import (
+    AQI_COLORS,
+    PNG_SIGNATURE,
+    colorize,
+    encode_png,
+    render_tile,
+    render_pyramid_tile,
+    tile_pixel_centers
+)
+from sentinel5plib.raster_utils import build_raster_pyramid
+
+TRANSFORM = from_origin(9.7, 53.75, 0.01, 0.01)
+NODATA = -9999.0
+
+
+def tile_index(lon: float, lat: float, z: int):
+    tiles = 2 ** z
+    y = (1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * tiles
+    return int((lon + 180) / 360 * tiles), int(y)
+
+
+def decode_png(body: bytes) -> np.ndarray:
+    assert body[:8] == PNG_SIGNATURE
+    offset, chunks = 8, {}
+    while offset < len(body):
+        length, = struct.unpack('>I', body[offset:offset + 4])
+        tag, data = body[offset + 4:offset + 8], body[offset + 8:offset + 8 + length]
+        crc, = struct.unpack('>I', body[offset + 8 + length:offset + 12 + length])
+        assert crc == zlib.crc32(tag + data) & 0xffffffff
+        chunks[tag] = data
+        offset += length + 12
+
+    width, height, depth, color_type = struct.unpack('>IIBB', chunks[b'IHDR'][:10])
+    assert (depth, color_type) == (8, 6)
+    scanlines = np.frombuffer(zlib.decompress(chunks[b'IDAT']), dtype=np.uint8).reshape(height, -1)
+    assert (scanlines[:, 0] == 0).all()
+    return scanlines[:, 1:].reshape(height, width, 4)
+
+
+def test_colorize_aqi_bands():
+
+    """
+    Test PM2.5 values get the color of their AQI band, nodata and NaN are transparent.
+    """
+
+    values = np.array([0.0, 12.0, 12.1, 35.5, 100.0, 200.0, 500.0, NODATA, np.nan])
+    rgba = colorize(values, NODATA)
+
+    assert (rgba[:7] == AQI_COLORS[[0, 0, 1, 2, 3, 4, 5]]).all()
+    assert (rgba[7:] == 0).all()
+
+
+def test_encode_png_roundtrip():
+
+    """
+    Test the PNG encoder writes valid chunks holding the RGBA pixels.
+    """
+
+    rgba = np.random.default_rng(0).integers(0, 256, (5, 7, 4), dtype=np.uint8)
+    assert (decode_png(encode_png(rgba)) == rgba).all()
+
+
+def test_render_tile_georeferencing():
+
+    """
+    Test pixels over the raster sample the cell under their center and pixels outside the
+    raster are transparent.
+    """
+
+    image = np.full((40, 80), 20.0)
+    image[:, 40:] = 60.0
+    image[:10] = NODATA
+    z = 10
+    x, y = tile_index(10.1, 53.55, z)
+    rgba = render_tile(image, TRANSFORM, NODATA, z, x, y)
+
+    lons, lats = tile_pixel_centers(z, x, y)
+    cols = np.floor((lons - 9.7) / 0.01).astype(int)
+    rows = np.floor((53.75 - lats) / 0.01).astype(int)
+    inside = ((rows >= 10) & (rows < 40))[:, None] & ((cols >= 0) & (cols < 80))[None, :]
+    moderate = inside & (cols < 40)[None, :]
+    unhealthy = inside & (cols >= 40)[None, :]
+
+    assert rgba.shape == (256, 256, 4)
+    assert moderate.any() and unhealthy.any() and (~inside).any()
+    assert (rgba[moderate] == AQI_COLORS[1]).all()
+    assert (rgba[unhealthy] == AQI_COLORS[3]).all()
+    assert (rgba[~inside] == 0).all()
+
+
+def test_render_tile_outside_raster():
+
+    """
+    Test tiles away from the raster are fully transparent.
+    """
+
+    rgba = render_tile(np.full((40, 80), 20.0), TRANSFORM, NODATA, 10, 0, 0)
+    assert (rgba == 0).all()
+
+
+def test_render_pyramid_tile_uses_coarse_level():
+
+    """
+    Test zoomed-out tiles are rendered from the pyramid level, zoomed-in tiles from the
+    full raster.
+    """
+
+    image = np.random.default_rng(1).uniform(0, 80, (40, 80))
+    levels = build_raster_pyramid(image, TRANSFORM, NODATA)
+
+    x, y = tile_index(10.1, 53.55, 4)
+    expected = render_tile(levels[8], TRANSFORM * Affine.scale(8), NODATA, 4, x, y)
+    assert (render_pyramid_tile((image, TRANSFORM, NODATA), levels, 4, x, y) == expected).all()
+
+    x, y = tile_index(10.1, 53.55, 12)
+    expected = render_tile(image, TRANSFORM, NODATA, 12, x, y)
+    assert (render_pyramid_tile((image, TRANSFORM, NODATA), levels, 12, x, y) == expected).all()
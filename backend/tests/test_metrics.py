@@ -0,0 +1,113 @@
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from sentinel5plib.ee_client import EE_CLIENT
+from sentinel5plib.metrics import Registry, FUNCTION_DURATION, FUNCTION_ERRORS, timed
+from utils_f.instrumentation import REQUEST_DURATION, RESPONSE_BYTES, REQUEST_EE_CALLS
+from tests import fake_ee
+
+client = TestClient(app)
+
+
+def test_exposition_format():
+
+    """
+    Test counters and histograms are written in the Prometheus text format.
+    """
+
+    registry = Registry()
+    counter = registry.counter("test_requests", "Requests.", ["route"])
+    histogram = registry.histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1))
+    counter.inc(route='/a"b')
+    counter.inc(2, route='/a"b')
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+
+    lines = registry.exposition().splitlines()
+
+    assert "# TYPE test_requests_total counter" in lines
+    assert 'test_requests_total{route="/a\\"b"} 3' in lines
+    assert "# TYPE test_latency_seconds histogram" in lines
+    assert 'test_latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_latency_seconds_bucket{le="1"} 2' in lines
+    assert 'test_latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "test_latency_seconds_sum 5.55" in lines
+    assert "test_latency_seconds_count 3" in lines
+
+    with pytest.raises(ValueError):
+        counter.inc(method="GET")
+
+
+def test_timed_decorator():
+
+    """
+    Test the decorator records durations and exceptions under the function label.
+    """
+
+    @timed("test.divide")
+    def divide(a, b):
+        return a / b
+
+    assert divide(4, 2) == 2
+    with pytest.raises(ZeroDivisionError):
+        divide(1, 0)
+
+    assert FUNCTION_DURATION.count(function="test.divide") == 2
+    assert FUNCTION_ERRORS.value(function="test.divide") == 1
+    assert divide.__name__ == "divide"
+
+
+def test_request_metrics(mock_cache_file):
+
+    """
+    Test requests are recorded by route template, status and response size.
+    """
+
+    before = REQUEST_DURATION.count(method="GET", route="/pm25/map-data", status="200")
+    response = client.get("/pm25/map-data")
+
+    assert REQUEST_DURATION.count(method="GET", route="/pm25/map-data", status="200") == before + 1
+    assert RESPONSE_BYTES.sum(route="/pm25/map-data") >= len(response.content)
+
+    client.get("/pm25/tiles/2/9/0.png")
+    assert REQUEST_DURATION.count(method="GET", route="/pm25/tiles/{z}/{x}/{y}.png", status="422") >= 1
+
+
+def test_request_ee_calls():
+
+    """
+    Test Earth Engine calls made by a handler in the threadpool are counted for its request.
+    """
+
+    def indicator(request):
+        EE_CLIENT.get_info(fake_ee.Dictionary({"day": 1.0}))
+        EE_CLIENT.get_info(fake_ee.Dictionary({"week": 2.0}))
+        return {"result": "success"}
+
+    before = REQUEST_EE_CALLS.sum(route="/pm25/indicator")
+    with patch("routers.pm25.post_air_quality_indicator", side_effect=indicator):
+        response = client.post("/pm25/indicator", json={"point_x": 10.0, "point_y": 53.55})
+
+    assert response.status_code == 200
+    assert REQUEST_EE_CALLS.sum(route="/pm25/indicator") == before + 2
+
+
+def test_metrics_endpoint(mock_cache_file):
+
+    """
+    Test the metrics endpoint exposes request, cache and Earth Engine metrics.
+    """
+
+    client.get("/pm25/indicator")
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    assert 'pm25_http_request_duration_seconds_count{method="GET",route="/pm25/indicator",status="200"}' in body
+    assert 'pm25_artifact_requests_total{status="fresh"}' in body
+    assert 'pm25_cache_hit_ratio{cache="results"}' in body
+    assert "pm25_ee_queued 0" in body
+    assert "# TYPE pm25_precompute_stage_duration_seconds histogram" in body
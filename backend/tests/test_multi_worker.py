@@ -0,0 +1,255 @@
+import datetime
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+import pytest
+from utils_f import cache, jobs
+from utils_f.leader import LeaderElection
+from utils_f.result_cache import ResultCache
+from sentinel5plib.tile_store import TileStore, TileGrid
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+WORKERS = 3
+TIMEOUT_SECONDS = 60
+
+# One worker process: runs the refresh scheduler with a stub indicator stage that logs the
+# PID of the process running it, waits until it can serve the indicator, forwards one more
+# precompute when it is not the leader, reports, and runs until the stop file appears.
+WORKER_SCRIPT = """
+import json, os, sys, time
+from utils_f import cache, jobs
+from utils_f.leader import LEADER
+from utils_f.scheduler import RefreshScheduler
+
+def precompute_indicator():
+    with open("precompute.log", "a") as f:
+        f.write(f"{os.getpid()}\\n")
+    cache.store_artifact(cache.INDICATOR_CACHE_FILE, json.dumps({"pid": os.getpid()}).encode())
+
+cache.PRECOMPUTE_STAGES.clear()
+cache.PRECOMPUTE_STAGES["indicator"] = precompute_indicator
+cache.latest_offl_granule = lambda: None
+cache.ARTIFACT_RECHECK_SECONDS = 0.0
+os.makedirs(cache.CACHE_DIR, exist_ok=True)
+
+scheduler = RefreshScheduler(tick_seconds=0.2, poll_seconds=0.1)
+scheduler.start()
+while cache.load_artifact(cache.INDICATOR_CACHE_FILE) is None:
+    time.sleep(0.05)
+forwarded = None if LEADER.is_leader else jobs.submit_precompute(["indicator"])
+report = {
+    "pid": os.getpid(),
+    "leader": LEADER.is_leader,
+    "indicator": json.loads(cache.load_artifact(cache.INDICATOR_CACHE_FILE).body),
+    "forwarded": forwarded
+}
+cache.write_atomic(f"report_{os.getpid()}.json", json.dumps(report).encode())
+while not os.path.exists("stop"):
+    time.sleep(0.05)
+scheduler.stop()
+"""
+
+
+def wait_for(condition, timeout: float = TIMEOUT_SECONDS):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not met in time.")
+        time.sleep(0.05)
+
+
+def test_workers_share_one_leader(tmp_path):
+
+    """
+    Test several worker processes elect one leader: only it runs precompute, including
+    the runs the other workers forward to it, and every worker serves its results.
+    """
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), env.get("PYTHONPATH")]))
+    env["PM25_LOG_LEVEL"] = "WARNING"
+    workers = [
+        subprocess.Popen([sys.executable, "-c", WORKER_SCRIPT], cwd=tmp_path, env=env)
+        for _ in range(WORKERS)
+    ]
+    try:
+        wait_for(lambda: len(list(tmp_path.glob("report_*.json"))) == WORKERS)
+        reports = [json.loads(path.read_text()) for path in tmp_path.glob("report_*.json")]
+        # The forwarded requests are claimed and the leader's last job is done.
+        requests_dir = tmp_path / cache.CACHE_DIR / os.path.basename(jobs.PRECOMPUTE_REQUESTS_DIR)
+        status_file = tmp_path / cache.CACHE_DIR / os.path.basename(jobs.JOB_STATUS_FILE)
+        wait_for(lambda: not any(requests_dir.glob("*.json")) and status_file.exists()
+                 and json.loads(status_file.read_text())["status"] == jobs.JOB_DONE)
+    finally:
+        (tmp_path / "stop").touch()
+        for worker in workers:
+            worker.wait(TIMEOUT_SECONDS)
+
+    leaders = [report["pid"] for report in reports if report["leader"]]
+    assert len(leaders) == 1
+    runs = (tmp_path / "precompute.log").read_text().split()
+    assert set(runs) == {str(leaders[0])}
+    assert all(report["indicator"] == {"pid": leaders[0]} for report in reports)
+    assert all(report["forwarded"] is not None for report in reports if not report["leader"])
+    assert all(worker.returncode == 0 for worker in workers)
+
+
+def test_leader_lock_is_exclusive(tmp_path):
+
+    """
+    Test only one holder of the lock file leads, and the next one takes over on release.
+    """
+
+    first = LeaderElection(str(tmp_path / "leader.lock"))
+    second = LeaderElection(str(tmp_path / "leader.lock"))
+
+    assert first.try_acquire()
+    assert not second.try_acquire()
+    assert first.leader_pid() == os.getpid()
+
+    first.release()
+    assert second.try_acquire()
+    assert not first.try_acquire()
+    second.release()
+
+
+def test_follower_forwards_precompute(tmp_path, monkeypatch):
+
+    """
+    Test a worker that is not the leader leaves the trigger for the leader instead of
+    running precompute, and the leader runs it.
+    """
+
+    leader = LeaderElection(str(tmp_path / "leader.lock"))
+    follower = LeaderElection(str(tmp_path / "leader.lock"))
+    assert leader.try_acquire()
+    monkeypatch.setattr(jobs, "LEADER", follower)
+    monkeypatch.setattr(cache, "precompute_metrics", lambda stages, granule: None)
+
+    job = jobs.submit_precompute(["map"])
+
+    assert job["status"] == jobs.JOB_QUEUED
+    assert len(os.listdir(jobs.PRECOMPUTE_REQUESTS_DIR)) == 1
+    assert jobs.get_precompute_status() == {"status": "idle"}
+
+    monkeypatch.setattr(jobs, "LEADER", leader)
+    claimed = jobs.claim_forwarded_precompute()
+
+    assert claimed["stages"] == ["map"]
+    assert os.listdir(jobs.PRECOMPUTE_REQUESTS_DIR) == []
+    assert jobs.claim_forwarded_precompute() is None
+    wait_for(lambda: jobs.get_precompute_status()["status"] == jobs.JOB_DONE)
+    leader.release()
+
+
+def test_forwarded_request_kept_while_job_active(tmp_path, monkeypatch):
+
+    """
+    Test a request forwarded while the leader's job is running is not dropped by joining
+    that job, but runs as the next job once the active one finished.
+    """
+
+    leader = LeaderElection(str(tmp_path / "leader.lock"))
+    follower = LeaderElection(str(tmp_path / "leader.lock"))
+    assert leader.try_acquire()
+    started, release, runs = threading.Event(), threading.Event(), []
+
+    def slow_precompute(stages, granule):
+        runs.append(stages)
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(cache, "precompute_metrics", slow_precompute)
+    monkeypatch.setattr(jobs, "LEADER", leader)
+    active = jobs.submit_precompute(["indicator"])
+    assert started.wait(5)
+
+    # Written before the follower could see the leader's published job.
+    monkeypatch.setattr(jobs, "LEADER", follower)
+    monkeypatch.setattr(jobs, "read_published_status", lambda: None)
+    jobs.submit_precompute(["map"])
+    monkeypatch.setattr(jobs, "LEADER", leader)
+
+    joined = jobs.claim_forwarded_precompute()
+    assert joined["id"] == active["id"]
+    assert len(os.listdir(jobs.PRECOMPUTE_REQUESTS_DIR)) == 1
+
+    release.set()
+    wait_for(lambda: jobs.get_precompute_status()["status"] == jobs.JOB_DONE)
+    claimed = jobs.claim_forwarded_precompute()
+    assert claimed["id"] != active["id"]
+    assert os.listdir(jobs.PRECOMPUTE_REQUESTS_DIR) == []
+    wait_for(lambda: jobs.get_precompute_status()["status"] == jobs.JOB_DONE)
+    assert runs == [["indicator"], ["map"]]
+    leader.release()
+
+
+def test_artifact_reloaded_when_replaced(tmp_path, monkeypatch):
+
+    """
+    Test a loaded cache file is read again once another process replaced it.
+    """
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(cache.CACHE_DIR)
+    monkeypatch.setattr(cache, "ARTIFACT_RECHECK_SECONDS", 0.0)
+    cache.store_artifact(cache.INDICATOR_CACHE_FILE, b'{"v": 1}')
+    assert cache.load_artifact(cache.INDICATOR_CACHE_FILE).body == b'{"v": 1}'
+
+    # Another worker writes the next generation.
+    cache.write_atomic(cache.INDICATOR_CACHE_FILE, b'{"v": 2}')
+    later = time.time() + 5
+    os.utime(cache.INDICATOR_CACHE_FILE, (later, later))
+    cache.write_atomic(cache.GENERATIONS_FILE, json.dumps({cache.INDICATOR_CACHE_FILE: 2}).encode())
+
+    artifact = cache.load_artifact(cache.INDICATOR_CACHE_FILE)
+    assert artifact.body == b'{"v": 2}'
+    assert artifact.generation == 2
+
+
+def test_result_cache_shared_between_processes(tmp_path):
+
+    """
+    Test a result stored by one worker is a hit in another worker's cache.
+    """
+
+    first = ResultCache(str(tmp_path), 1024 * 1024)
+    second = ResultCache(str(tmp_path), 1024 * 1024)
+    assert second.get("key") is None
+
+    first.put("key", b"body", ttl=60)
+
+    assert second.get("key") == b"body"
+
+
+def test_readonly_tile_store_follows_writer(tmp_path):
+
+    """
+    Test a read-only tile store sees the days flushed by the writing store.
+    """
+
+    grid = TileGrid(west=9.7, north=53.75, cell_size=0.05, rows=2, cols=2)
+    first_day, next_day = datetime.date(2025, 3, 1), datetime.date(2025, 3, 2)
+    writer = TileStore(str(tmp_path), grid)
+    writer.write_day(first_day, {"aai": np.ones((2, 2)), "no2": np.ones((2, 2))}, final=True)
+    writer.flush()
+
+    reader = TileStore(str(tmp_path), grid, readonly=True)
+    assert reader.covers(first_day, next_day)
+    assert not reader.covers(next_day, next_day + datetime.timedelta(days=1))
+
+    writer.write_day(next_day, {"aai": np.full((2, 2), 2.0), "no2": np.ones((2, 2))}, final=False)
+    writer.flush()
+    later = time.time() + 5
+    os.utime(tmp_path / "index.json", (later, later))
+
+    assert reader.refresh()
+    assert reader.version == 1
+    assert np.all(reader.read("aai", next_day, next_day + datetime.timedelta(days=1)) == 2.0)
+    with pytest.raises(ValueError):
+        reader._array("aai", 2025)[0] = 0.0
@@ -0,0 +1,87 @@
+import pandas as pd
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+
+client = TestClient(app)
+
+
+def test_post_pm25_avg_batch_points_and_features():
+
+    """
+    Test points and FeatureCollection points are combined into one batch.
+    """
+
+    table = pd.DataFrame([{"point_x": 10.0, "point_y": 53.5, "Average_PM2.5_week": 1.0}])
+    with patch("services.pm25_services.extract_average_data_points", return_value=table) as mock_func:
+        response = client.post("/pm25/averages/batch", json={
+            "points": [[10.0, 53.5]],
+            "features": {
+                "type": "FeatureCollection",
+                "features": [
+                    {"type": "Feature", "geometry": {"type": "Point", "coordinates": [9.9, 53.6]}}
+                ]
+            },
+            "week_number": 1,
+            "month_number": 1,
+            "year": 2025
+        })
+    assert response.status_code == 200
+    assert response.json() == table.to_dict(orient="records")
+    assert mock_func.call_args[0][0] == [(10.0, 53.5), (9.9, 53.6)]
+
+
+def test_post_pm25_avg_batch_without_points():
+
+    """
+    Test a batch without points returns a message instead of querying Earth Engine.
+    """
+
+    with patch("services.pm25_services.extract_average_data_points") as mock_func:
+        response = client.post("/pm25/averages/batch", json={
+            "points": [],
+            "features": {"type": "FeatureCollection", "features": []},
+            "week_number": 1,
+            "month_number": 1,
+            "year": 2025
+        })
+    assert response.status_code == 200
+    assert response.json() == "Please input a list of points or a FeatureCollection."
+    mock_func.assert_not_called()
+
+
+def test_post_pm25_avg_batch_invalid_features():
+
+    """
+    Test malformed features return a message instead of an error.
+    """
+
+    for features in (
+        {"type": "FeatureCollection", "features": "not a list"},
+        {"type": "FeatureCollection", "features": ["not a feature"]},
+        {"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": "not a geometry"}]},
+        {"type": "FeatureCollection", "features": [{"type": "Feature", "geometry": {"type": "Point"}}]},
+        {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [9.9]}}]},
+        {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": ["9.9", 53.6]}}]},
+        {"type": "FeatureCollection", "features": [
+            {"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[9.9, 53.6], [10.0, 53.5]]}}]},
+    ):
+        with patch("services.pm25_services.extract_average_data_points") as mock_func:
+            response = client.post("/pm25/averages/batch", json={"features": features, "year": 2025})
+        assert response.status_code == 200
+        assert response.json() == "Only Point features are supported."
+        mock_func.assert_not_called()
+
+
+def test_post_pm25_avg_batch_error():
+
+    """
+    Test /pm25/averages/batch error handling.
+    """
+
+    with patch("routers.pm25.post_pm25_averages_batch", side_effect=Exception("Test Error")):
+        response = client.post("/pm25/averages/batch", json={"points": [[10.0, 53.5]]})
+        assert response.status_code == 500
+        assert response.json() == {"detail": "Test Error"}
@@ -1,6 +1,14 @@
-from unittest.mock import patch
+import base64
+import io
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
 from fastapi.testclient import TestClient
-from main import app 
+from main import app
+from sentinel5plib.defaults import DEFAULT_MAP_RASTER_OUTPUT_PATH
+from sentinel5plib.raster_utils import read_raster, write_raster
 
 client = TestClient(app)
 
@@ -32,3 +40,80 @@ def test_post_pm25_map_data_error():
         })
         assert response.status_code == 500
         assert response.json() == {"detail": "Test Error"}
+
+
+def test_post_pm25_map_data_streams_geojson():
+
+    """
+    Test /pm25/map-data streams the downloaded raster as a GeoJSON FeatureCollection.
+    """
+
+    with patch("services.pm25_services.download_pm_raster", return_value=read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)):
+        response = client.post("/pm25/map-data", json={
+            "start_date": '2025-01-01', 
+            "end_date": '2025-01-31'
+        })
+    assert response.status_code == 200
+    assert response.json()["type"] == "FeatureCollection"
+    assert len(response.json()["features"]) > 0
+
+
+def test_post_pm25_map_data_concurrent_ranges(tmp_path):
+
+    """
+    Test two time frames are downloaded at the same time into memory, each request gets
+    its own raster and nothing is written to the shared raster path.
+    """
+
+    transform = read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)[1]
+    downloads = {}
+    for month in (1, 2):
+        path = tmp_path / f"{month}.tif"
+        write_raster(path, np.full((3, 4), float(month), dtype=np.float32), transform, -9999.0)
+        downloads[f"2025-0{month}-01"] = path.read_bytes()
+
+    both_downloading = threading.Barrier(2, timeout=5)
+
+    def get_pm_image(aoi, start_date, end_date):
+        image = MagicMock()
+        image.getDownloadURL.return_value = start_date
+        return image
+
+    def urlopen(url, timeout=None):
+        both_downloading.wait()
+        return io.BytesIO(downloads[url])
+
+    def post(month):
+        return client.post("/pm25/map-data?format=grid", json={
+            "start_date": f"2025-0{month}-01",
+            "end_date": f"2025-0{month}-28"
+        })
+
+    raster_mtime = os.path.getmtime(DEFAULT_MAP_RASTER_OUTPUT_PATH)
+    with patch("sentinel5plib.analysis.get_aoi_geometry"), \
+            patch("sentinel5plib.analysis.get_pm_image", side_effect=get_pm_image), \
+            patch("sentinel5plib.analysis.urlopen", side_effect=urlopen):
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            responses = list(executor.map(post, (1, 2)))
+
+    for month, response in zip((1, 2), responses):
+        assert response.status_code == 200
+        image = np.frombuffer(base64.b64decode(response.json()["values"]), dtype="<f4")
+        assert np.all(image == month)
+    assert os.path.getmtime(DEFAULT_MAP_RASTER_OUTPUT_PATH) == raster_mtime
+
+
+def test_post_pm25_map_data_zoom():
+
+    """
+    Test a zoomed out POST map is downsampled before serialization.
+    """
+
+    image, transform, nodata = read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)
+    with patch("services.pm25_services.download_pm_raster", return_value=(image, transform, nodata)):
+        response = client.post("/pm25/map-data?format=grid&zoom=8", json={
+            "start_date": '2025-01-01',
+            "end_date": '2025-01-31'
+        })
+    assert response.status_code == 200
+    assert response.json()["shape"] == [-(-image.shape[0] // 4), -(-image.shape[1] // 4)]
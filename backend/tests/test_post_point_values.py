@@ -0,0 +1,98 @@
+import os
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from sentinel5plib.raster_utils import read_raster
+from sentinel5plib.defaults import (
+    DEFAULT_MAP_RASTER_OUTPUT_PATH,
+    DEFAULT_MAP_DATA_START_DATE,
+    DEFAULT_MAP_DATA_END_DATE
+)
+from utils_f.cache import store_map_raster, CACHE_DIR
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def cached_map_raster(tmp_path, monkeypatch):
+
+    """
+    Precomputed map raster of the default time frame in a temporary cache directory.
+    """
+
+    image, transform, nodata = read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(CACHE_DIR)
+    store_map_raster(image, transform, nodata, DEFAULT_MAP_DATA_START_DATE, DEFAULT_MAP_DATA_END_DATE)
+    yield image, transform
+
+
+def test_point_values_from_cache(cached_map_raster):
+
+    """
+    Test points of the cached time frame are sampled locally, without Earth Engine.
+    """
+
+    image, transform = cached_map_raster
+    point_x, point_y = transform * (100.5, 50.5)
+
+    with patch("services.pm25_services.get_pm_point_values", side_effect=AssertionError("remote")):
+        response = client.post("/pm25/point-values", json={
+            "points": [[point_x, point_y], [0.0, 0.0]]
+        })
+    assert response.status_code == 200
+    assert response.json()["source"] == "cache"
+    values = [value["PM2.5"] for value in response.json()["values"]]
+    assert values == [pytest.approx(image[50, 100]), None]
+
+
+def test_point_values_bilinear(cached_map_raster):
+
+    """
+    Test bilinear interpolation at a pixel centre returns that pixel.
+    """
+
+    image, transform = cached_map_raster
+    point_x, point_y = transform * (100.5, 50.5)
+
+    response = client.post("/pm25/point-values", json={
+        "point_x": point_x,
+        "point_y": point_y,
+        "interpolation": "bilinear"
+    })
+    assert response.status_code == 200
+    assert response.json()["values"][0]["PM2.5"] == pytest.approx(image[50, 100])
+
+
+def test_point_values_uncached_period(cached_map_raster):
+
+    """
+    Test a time frame that is not cached falls back to Earth Engine.
+    """
+
+    with patch("services.pm25_services.get_pm_point_values", return_value=[12.5]) as mock_func:
+        response = client.post("/pm25/point-values", json={
+            "point_x": 10.0,
+            "point_y": 53.55,
+            "start_date": "2025-02-01",
+            "end_date": "2025-02-28"
+        })
+    assert response.status_code == 200
+    assert response.json()["source"] == "earth_engine"
+    assert response.json()["values"] == [{"point_x": 10.0, "point_y": 53.55, "PM2.5": 12.5}]
+    mock_func.assert_called_once_with([(10.0, 53.55)], "2025-02-01", "2025-02-28")
+
+
+def test_point_values_invalid_interpolation():
+
+    """
+    Test an unknown interpolation method is rejected.
+    """
+
+    response = client.post("/pm25/point-values", json={
+        "point_x": 10.0,
+        "point_y": 53.55,
+        "interpolation": "cubic"
+    })
+    assert response.status_code == 422
@@ -0,0 +1,105 @@
+import datetime
+import functools
+import numpy as np
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from services.pm25_services import post_pm25_timeseries
+from sentinel5plib.prefix_cube import PrefixSumCube
+from sentinel5plib.tile_store import TileGrid, TileStore, date_range
+
+client = TestClient(app)
+GRID = TileGrid(west=9.7, north=53.75, cell_size=0.05, rows=4, cols=6)
+# After the ingested year, so the requests do not depend on the date the tests run.
+TODAY = datetime.date(2026, 3, 1)
+
+
+@pytest.fixture
+def cube(tmp_path):
+    store = TileStore(str(tmp_path), GRID)
+    for offset, day in enumerate(date_range(datetime.date(2025, 1, 1), datetime.date(2026, 1, 1))):
+        aai = np.full((GRID.rows, GRID.cols), 0.1 * (offset % 10))
+        no2 = np.full((GRID.rows, GRID.cols), 10.0)
+        no2[3, 5] = 20.0
+        store.write_day(day, {'aai': aai, 'no2': no2}, final=True)
+    store.flush()
+
+    mask = np.zeros((GRID.rows, GRID.cols), dtype=bool)
+    mask[1:, :5] = True
+    with patch("services.pm25_services.load_prefix_cube", return_value=PrefixSumCube(store, mask)), \
+            patch("routers.pm25.post_pm25_timeseries", functools.partial(post_pm25_timeseries, today=TODAY)):
+        yield
+
+
+def test_post_pm25_timeseries_year(cube):
+
+    """
+    Test a year is aggregated into calendar buckets and rolling means in one call.
+    """
+
+    response = client.post("/pm25/timeseries", json={"year": 2025})
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["end_date"] == "2026-01-01"
+    assert len(data["daily"]) == 365
+    assert data["daily"][0] == {"date": "2025-01-01", "PM2.5": pytest.approx(50.0)}
+    assert [row["days"] for row in data["monthly"]] == [31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31]
+    assert data["yearly"] == [{"year": 2025, "PM2.5": pytest.approx(50 + 3 * 1630 / 365), "days": 365}]
+    assert data["weekly"][0] == {"year": 2025, "week": 1, "PM2.5": pytest.approx(56.0), "days": 5}
+    assert data["rolling_7"][6]["PM2.5"] == pytest.approx(59.0)
+    assert len(data["rolling_30"]) == 365
+
+
+def test_post_pm25_timeseries_point(cube):
+
+    """
+    Test a point uses the series of its grid cell.
+    """
+
+    with patch("sentinel5plib.analysis.aoi_contains_point", return_value=True):
+        response = client.post("/pm25/timeseries", json={
+            "point_x": 9.99, "point_y": 53.59, "start_date": "2025-01-01", "end_date": "2025-01-02"
+        })
+
+    assert response.status_code == 200
+    assert response.json()["daily"] == [{"date": "2025-01-01", "PM2.5": pytest.approx(100.0)}]
+
+
+def test_post_pm25_timeseries_not_ingested(cube, mock_precompute):
+
+    """
+    Test a time frame missing from the tile store starts the ingest.
+    """
+
+    with patch("services.pm25_services.extract_timeseries_data", return_value=None):
+        response = client.post("/pm25/timeseries", json={"year": 2025})
+
+    assert response.status_code == 202
+    mock_precompute.assert_called_once_with(["tiles"])
+
+
+def test_post_pm25_timeseries_invalid_dates(cube):
+
+    """
+    Test invalid time frames return a message.
+    """
+
+    response = client.post("/pm25/timeseries", json={"start_date": "2025-01-01"})
+    assert response.json() == "Please input both start and end date."
+
+    response = client.post("/pm25/timeseries", json={"year": 2020})
+    assert response.json() == "Time series are available from 2025-01-01."
+
+
+def test_post_pm25_timeseries_error():
+
+    """
+    Test /pm25/timeseries error handling.
+    """
+
+    with patch("routers.pm25.post_pm25_timeseries", side_effect=Exception("Test Error")):
+        response = client.post("/pm25/timeseries", json={"year": 2025})
+        assert response.status_code == 500
+        assert response.json() == {"detail": "Test Error"}
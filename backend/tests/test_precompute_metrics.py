@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from sentinel5plib.defaults import DEFAULT_MAP_RASTER_OUTPUT_PATH
+from sentinel5plib.raster_utils import read_raster
+from utils_f import cache
+
+MAP_RASTER = read_raster(os.path.abspath(DEFAULT_MAP_RASTER_OUTPUT_PATH))
+
+
+def records(data):
+    frame = MagicMock()
+    frame.to_dict.return_value = data
+    return frame
+
+
+def test_precompute_stages_run_concurrently(tmp_path, monkeypatch):
+
+    """
+    Test the indicator, averages, map and tiles stages run at the same time.
+    """
+
+    monkeypatch.chdir(tmp_path)
+    barrier = threading.Barrier(len(cache.PRECOMPUTE_STAGES), timeout=5)
+
+    def stage(result):
+        def run(*args, **kwargs):
+            barrier.wait()
+            return result
+        return run
+
+    with patch("utils_f.cache.calculate_pm25_indicator", side_effect=stage(records([{"a": 1}]))), \
+            patch("utils_f.cache.extract_average_data", side_effect=stage(records([{"b": 2}]))), \
+            patch("utils_f.cache.download_pm_raster", side_effect=stage(MAP_RASTER)), \
+            patch.dict(cache.PRECOMPUTE_STAGES, tiles=stage(None)):
+        timings = cache.precompute_metrics()
+
+    assert set(timings) == {"indicator", "averages", "map", "tiles"}
+    for cache_file in (cache.INDICATOR_CACHE_FILE, cache.AVERAGES_CACHE_FILE,
+                       cache.MAP_CACHE_FILE, cache.MAP_GRID_CACHE_FILE):
+        assert os.path.exists(cache_file)
+        assert cache_file in cache.ARTIFACTS
+    assert not [name for name in os.listdir(cache.CACHE_DIR) if name.endswith(".tmp")]
+
+
+def test_precompute_failed_stage_keeps_others(tmp_path, monkeypatch):
+
+    """
+    Test a failing stage is reported while the other stages are still cached.
+    """
+
+    monkeypatch.chdir(tmp_path)
+
+    with patch("utils_f.cache.calculate_pm25_indicator", return_value=records([{"a": 1}])), \
+            patch("utils_f.cache.extract_average_data", side_effect=Exception("Test Error")), \
+            patch("utils_f.cache.download_pm_raster", return_value=MAP_RASTER), \
+            patch.dict(cache.PRECOMPUTE_STAGES, tiles=lambda: None):
+        with pytest.raises(RuntimeError, match="averages: Test Error"):
+            cache.precompute_metrics()
+
+    assert os.path.exists(cache.INDICATOR_CACHE_FILE)
+    assert os.path.exists(cache.MAP_CACHE_FILE)
+    assert not os.path.exists(cache.AVERAGES_CACHE_FILE)
+
+
+def test_store_artifact_generations(tmp_path, monkeypatch):
+
+    """
+    Test each write of a cache file is a new generation, persisted across restarts, and
+    readers only ever see complete files.
+    """
+
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(cache.CACHE_DIR)
+    bodies = [json.dumps({"value": index, "padding": "x" * 100000}).encode() for index in range(20)]
+    seen = []
+    done = threading.Event()
+
+    def read():
+        while not done.is_set():
+            if os.path.exists(cache.INDICATOR_CACHE_FILE):
+                with open(cache.INDICATOR_CACHE_FILE, "rb") as f:
+                    seen.append(f.read())
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for body in bodies:
+        artifact = cache.store_artifact(cache.INDICATOR_CACHE_FILE, body)
+    done.set()
+    reader.join()
+
+    assert artifact.generation == 20
+    assert seen and all(body in bodies for body in seen)
+
+    cache.ARTIFACTS.clear()
+    cache._generations = None
+    assert cache.load_artifact(cache.INDICATOR_CACHE_FILE).generation == 20
+    assert cache.store_artifact(cache.INDICATOR_CACHE_FILE, b"{}").generation == 21
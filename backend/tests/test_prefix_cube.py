@@ -0,0 +1,100 @@
+import datetime
+import numpy as np
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from sentinel5plib.analysis import get_local_pm_raster
+from sentinel5plib.compute import NumPyBackend
+from sentinel5plib.prefix_cube import PrefixSumCube
+from sentinel5plib.tile_store import TileGrid, TileStore, date_range
+
+client = TestClient(app)
+GRID = TileGrid(west=9.7, north=53.75, cell_size=0.05, rows=4, cols=6)
+START = datetime.date(2024, 12, 20)
+END = datetime.date(2025, 1, 20)
+
+
+@pytest.fixture
+def cube(tmp_path):
+    rng = np.random.default_rng(3)
+    store = TileStore(str(tmp_path), GRID)
+    for day in date_range(START, END):
+        rasters = {
+            'aai': rng.random((GRID.rows, GRID.cols)) * 3,
+            'no2': rng.random((GRID.rows, GRID.cols)) * 40
+        }
+        for values in rasters.values():
+            values[rng.random(values.shape) < 0.3] = np.nan
+        store.write_day(day, rasters, final=True)
+    store.flush()
+
+    mask = np.ones((GRID.rows, GRID.cols), dtype=bool)
+    mask[0, :2] = False
+    yield PrefixSumCube(store, mask)
+
+
+@pytest.mark.parametrize('start, end', [
+    (datetime.date(2024, 12, 20), datetime.date(2024, 12, 21)),
+    (datetime.date(2024, 12, 25), datetime.date(2025, 1, 1)),
+    (datetime.date(2024, 12, 28), datetime.date(2025, 1, 9)),
+    (START, END),
+])
+def test_prefix_cube_matches_direct_mean(cube, start, end):
+
+    """
+    Test range means from prefix sums match the composite of the daily rasters.
+    """
+
+    backend = NumPyBackend()
+    aai = backend.composite(cube.store.read('aai', start, end))
+    no2 = backend.composite(cube.store.read('no2', start, end))
+    expected = np.where(cube.mask, backend.pm25(aai, no2), np.nan)
+
+    np.testing.assert_allclose(cube.pm25_mean(start, end), expected, rtol=1e-9)
+    assert np.isnan(cube.pm25_mean(start, end)[0, :2]).all()
+
+
+def test_prefix_cube_rebuilt_after_ingest(cube):
+
+    """
+    Test new days in the store invalidate the cached year cubes.
+    """
+
+    day = datetime.date(2025, 1, 25)
+    assert np.isnan(cube.range_mean('aai', day, day + datetime.timedelta(days=1))).all()
+
+    cube.store.write_day(day, {'aai': np.full((4, 6), 2.0), 'no2': np.full((4, 6), 1.0)}, final=True)
+    cube.store.flush()
+
+    assert cube.range_mean('aai', day, day + datetime.timedelta(days=1)) == pytest.approx(2.0)
+
+
+def test_local_pm_raster_requires_covered_range(cube):
+
+    """
+    Test time frames with days missing from the store are not computed locally.
+    """
+
+    image, transform, nodata = get_local_pm_raster(cube, '2024-12-20', '2025-01-20')
+    assert image.shape == (4, 6)
+    assert transform == GRID.transform
+    assert get_local_pm_raster(cube, '2024-12-01', '2025-01-20') is None
+
+
+def test_post_pm25_map_from_local_tiles(cube):
+
+    """
+    Test a covered time frame is served from the tile store without Earth Engine.
+    """
+
+    with patch("services.pm25_services.load_prefix_cube", return_value=cube), \
+            patch("services.pm25_services.download_pm_raster") as mock_export:
+        response = client.post("/pm25/map-data?format=grid", json={
+            "start_date": "2024-12-25",
+            "end_date": "2025-01-05"
+        })
+
+    assert response.status_code == 200
+    assert response.json()["shape"] == [4, 6]
+    mock_export.assert_not_called()
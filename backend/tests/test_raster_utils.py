@@ -0,0 +1,176 @@
+import io
+import json
+import zipfile
+import numpy as np
+import pytest
+import rasterio
+from rasterio.transform import Affine
+from sentinel5plib.raster_utils import (
+    raster_array_to_points,
+    raster_to_vector,
+    read_raster,
+    read_raster_bytes,
+    iter_raster_geojson,
+    raster_to_grid_payload,
+    grid_payload_to_raster,
+    downsample_raster,
+    crop_raster,
+    zoom_factor
+)
+from sentinel5plib.vector_utils import convert_geodf_to_dict
+from sentinel5plib.defaults import DEFAULT_MAP_RASTER_OUTPUT_PATH
+
+
+def test_raster_array_to_points_matches_pixel_loop():
+
+    """
+    Test vectorized conversion returns the same points, in the same order, as a per-pixel loop.
+    """
+
+    with rasterio.open(DEFAULT_MAP_RASTER_OUTPUT_PATH) as src:
+        image = src.read(1)
+        transform = src.transform
+        nodata = src.nodata
+
+    expected = []
+    for row in range(image.shape[0]):
+        for col in range(image.shape[1]):
+            if image[row, col] != nodata:
+                x, y = transform * (col, row)
+                expected.append((x, y, image[row, col]))
+
+    x, y, values = raster_array_to_points(image, transform, nodata)
+    assert np.allclose(np.column_stack([x, y, values]), np.array(expected))
+
+
+def test_raster_array_to_points_center_offset():
+
+    """
+    Test pixel-centre coordinates and nodata masking.
+    """
+
+    image = np.array([[1.0, 0.0], [0.0, 4.0]])
+    transform = Affine(2.0, 0.0, 10.0, 0.0, -2.0, 50.0)
+
+    x, y, values = raster_array_to_points(image, transform, nodata=0.0, offset='center')
+    assert x.tolist() == [11.0, 13.0]
+    assert y.tolist() == [49.0, 47.0]
+    assert values.tolist() == [1.0, 4.0]
+
+
+def test_raster_to_vector_skips_vector_file(tmp_path):
+
+    """
+    Test the GeoJSON vector file is not written when write_vector_file is False.
+    """
+
+    vector_file = tmp_path / 'vector_map.geojson'
+    gdf = raster_to_vector(DEFAULT_MAP_RASTER_OUTPUT_PATH, vector_file, write_vector_file=False)
+    assert len(gdf) > 0
+    assert not vector_file.exists()
+
+
+def test_iter_raster_geojson_matches_geodf_dict():
+
+    """
+    Test the streamed FeatureCollection equals the convert_geodf_to_dict output.
+    """
+
+    image, transform, nodata = read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)
+    streamed = json.loads(b''.join(iter_raster_geojson(image, transform, nodata, chunk_size=1000)))
+
+    gdf = raster_to_vector(DEFAULT_MAP_RASTER_OUTPUT_PATH, write_vector_file=False)
+    assert streamed == convert_geodf_to_dict(gdf)
+
+
+def test_iter_raster_geojson_empty_raster():
+
+    """
+    Test a raster without any data cells yields an empty FeatureCollection.
+    """
+
+    image = np.zeros((2, 2))
+    transform = Affine(1.0, 0.0, 0.0, 0.0, -1.0, 0.0)
+
+    streamed = b''.join(iter_raster_geojson(image, transform, nodata=0.0))
+    assert json.loads(streamed) == {"type": "FeatureCollection", "features": []}
+
+
+def test_grid_payload_round_trip():
+
+    """
+    Test the grid payload restores the raster as float32 with its transform and nodata.
+    """
+
+    image, transform, nodata = read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)
+    payload = json.loads(json.dumps(raster_to_grid_payload(image, transform, nodata)))
+
+    grid_image, grid_transform, grid_nodata = grid_payload_to_raster(payload)
+    assert payload["shape"] == list(image.shape)
+    assert np.allclose(grid_image, image.astype(np.float32))
+    assert grid_transform == transform
+    assert grid_nodata == nodata
+
+
+def test_read_raster_bytes_matches_file():
+
+    """
+    Test GeoTIFF bytes, plain or zipped like Earth Engine downloads, read like the file.
+    """
+
+    with open(DEFAULT_MAP_RASTER_OUTPUT_PATH, 'rb') as f:
+        data = f.read()
+    zipped = io.BytesIO()
+    with zipfile.ZipFile(zipped, 'w') as archive:
+        archive.writestr('download.PM25.tif', data)
+
+    image, transform, nodata = read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)
+    for raster_bytes in (data, zipped.getvalue()):
+        read_image, read_transform, read_nodata = read_raster_bytes(raster_bytes)
+        np.testing.assert_array_equal(read_image, image)
+        assert read_transform == transform
+        assert read_nodata == nodata
+
+
+def test_downsample_raster_matches_block_means():
+
+    """
+    Test block means skip nodata cells, edge blocks average the cells they contain, and
+    blocks without data are nodata.
+    """
+
+    rng = np.random.default_rng(5)
+    image = rng.random((9, 7)) * 50
+    image[rng.random(image.shape) < 0.3] = -9999.0
+    image[4:8, 4:8] = -9999.0
+    transform = Affine(0.01, 0.0, 9.7, 0.0, -0.01, 53.75)
+
+    downsampled, down_transform, nodata = downsample_raster(image, transform, -9999.0, 4)
+
+    assert downsampled.shape == (3, 2)
+    assert down_transform == Affine(0.04, 0.0, 9.7, 0.0, -0.04, 53.75)
+    for row in range(3):
+        for col in range(2):
+            block = image[row * 4:row * 4 + 4, col * 4:col * 4 + 4]
+            valid = block[block != -9999.0]
+            expected = valid.mean() if valid.size else -9999.0
+            assert downsampled[row, col] == pytest.approx(expected)
+    assert downsampled[1, 1] == nodata
+
+
+def test_crop_raster_and_zoom_factor():
+
+    """
+    Test the bbox window keeps every intersecting cell and zoom levels pick coarser cells
+    when zoomed out.
+    """
+
+    image = np.arange(20.0).reshape(4, 5)
+    transform = Affine(0.1, 0.0, 10.0, 0.0, -0.1, 54.0)
+
+    window, window_transform, _ = crop_raster(image, transform, None, [10.15, 53.75, 10.25, 53.95])
+    assert window.tolist() == [[1.0, 2.0], [6.0, 7.0], [11.0, 12.0]]
+    assert window_transform * (0, 0) == pytest.approx((10.1, 54.0))
+    assert crop_raster(image, transform, None, [0.0, 0.0, 1.0, 1.0])[0].size == 0
+
+    assert [zoom_factor(zoom, 0.01) for zoom in (12, 10, 9, 8, 7, 3)] == [1, 1, 2, 4, 8, 8]
@@ -1,3 +1,6 @@
+import threading
+import time
+from unittest.mock import patch
 from fastapi.testclient import TestClient
 from main import app 
 
@@ -11,6 +14,60 @@ def test_recompute_pm25(mock_precompute):
     """
 
     response = client.post("/pm25/recompute")
-    assert response.status_code == 200
-    assert response.json() == {"message": "PM2.5 data recomputed successfully"}
+    assert response.status_code == 202
+    assert response.json() == {
+        "message": "PM2.5 data recompute started",
+        "job": {"id": "job", "status": "queued"}
+    }
     assert mock_precompute.called
+
+
+def test_recompute_single_flight():
+
+    """
+    Test concurrent triggers join the running precompute job instead of starting new ones.
+    """
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_precompute(*args):
+        started.set()
+        release.wait(5)
+
+    with patch("utils_f.cache.precompute_metrics", side_effect=slow_precompute) as mock_func:
+        first = client.post("/pm25/recompute").json()["job"]
+        assert started.wait(5)
+        second = client.post("/pm25/recompute").json()["job"]
+        status = client.get("/pm25/recompute/status").json()
+        release.set()
+
+        assert second["id"] == first["id"]
+        assert status["status"] == "running"
+        assert status["started_at"] is not None
+
+        for _ in range(100):
+            status = client.get("/pm25/recompute/status").json()
+            if status["status"] == "done":
+                break
+            time.sleep(0.05)
+    assert status["status"] == "done"
+    assert status["finished_at"] is not None
+    assert mock_func.call_count == 1
+
+
+def test_recompute_failed_status():
+
+    """
+    Test a failing precompute is reported as failed with its error.
+    """
+
+    with patch("utils_f.cache.precompute_metrics", side_effect=Exception("Test Error")):
+        client.post("/pm25/recompute")
+        for _ in range(100):
+            status = client.get("/pm25/recompute/status").json()
+            if status["status"] == "failed":
+                break
+            time.sleep(0.05)
+    assert status["status"] == "failed"
+    assert status["error"] == "Test Error"
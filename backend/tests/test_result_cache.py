@@ -0,0 +1,118 @@
+import datetime
+import pandas as pd
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from main import app
+from sentinel5plib.defaults import DEFAULT_MAP_RASTER_OUTPUT_PATH
+from sentinel5plib.raster_utils import read_raster
+from utils_f import result_cache
+from utils_f.result_cache import ResultCache, period_ttl, RESULT_TTL_CURRENT, RESULT_TTL_HISTORICAL
+
+client = TestClient(app)
+
+
+def test_result_cache_lru_eviction_and_counters(tmp_path):
+
+    """
+    Test least recently used entries are evicted once the byte budget is exceeded.
+    """
+
+    results = ResultCache(str(tmp_path), max_bytes=10)
+    results.put("a", b"aaaa", ttl=60)
+    results.put("b", b"bbbb", ttl=60)
+    assert results.get("a") == b"aaaa"
+    results.put("c", b"cccc", ttl=60)
+
+    assert results.get("b") is None
+    assert results.get("a") == b"aaaa"
+    assert results.get("c") == b"cccc"
+    assert not (tmp_path / "b").exists()
+    assert results.stats() == {
+        "hits": 3, "misses": 1, "evictions": 1, "entries": 2, "bytes": 8, "max_bytes": 10
+    }
+
+
+def test_result_cache_ttl_and_persistence(tmp_path, monkeypatch):
+
+    """
+    Test entries survive a restart and expire after their TTL.
+    """
+
+    now = 1000.0
+    monkeypatch.setattr(result_cache.time, "time", lambda: now)
+    results = ResultCache(str(tmp_path), max_bytes=1024)
+    results.put("short", b"1", ttl=10)
+    results.put("long", b"2", ttl=100)
+
+    restarted = ResultCache(str(tmp_path), max_bytes=1024)
+    assert restarted.get("short") == b"1"
+
+    now = 1050.0
+    assert restarted.get("short") is None
+    assert restarted.get("long") == b"2"
+    assert not (tmp_path / "short").exists()
+
+
+def test_period_ttl():
+
+    """
+    Test settled OFFL periods are cached longer than current ones.
+    """
+
+    today = datetime.date(2026, 3, 1)
+    assert period_ttl(datetime.date(2025, 12, 31), today) == RESULT_TTL_HISTORICAL
+    assert period_ttl(datetime.date(2026, 2, 25), today) == RESULT_TTL_CURRENT
+    assert period_ttl(datetime.date(2026, 12, 31), today) == RESULT_TTL_CURRENT
+
+
+def test_post_pm25_averages_served_from_result_cache():
+
+    """
+    Test identical average queries within one grid cell are computed once.
+    """
+
+    table = pd.DataFrame({"Average_week_month_year": [1, 1, 2024], "Average_PM2": [1.0, 2.0, 3.0]})
+    body = {"week_number": 1, "month_number": 1, "year": 2024}
+    with patch("services.pm25_services.extract_average_data", return_value=table) as mock_func, \
+            patch("services.pm25_services.aoi_contains_point", return_value=True):
+        first = client.post("/pm25/averages", json={"point_x": 10.0012, "point_y": 53.5513, **body})
+        second = client.post("/pm25/averages", json={"point_x": 10.0048, "point_y": 53.5587, **body})
+        other_year = client.post("/pm25/averages", json={"point_x": 10.0012, "point_y": 53.5513,
+                                                         **body, "year": 2023})
+
+    assert first.json() == second.json() == table.to_dict(orient="records")
+    assert other_year.status_code == 200
+    assert mock_func.call_count == 2
+    stats = client.get("/pm25/cache/stats").json()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+
+
+def test_post_pm25_averages_outside_hamburg_not_cached():
+
+    """
+    Test error messages are returned uncached.
+    """
+
+    with patch("services.pm25_services.extract_average_data", return_value="Points are out of Hamburg bounding box") \
+            as mock_func, patch("services.pm25_services.aoi_contains_point", return_value=False):
+        for _ in range(2):
+            response = client.post("/pm25/averages", json={"point_x": 1.0, "point_y": 2.0})
+            assert response.json() == "Points are out of Hamburg bounding box"
+    assert mock_func.call_count == 2
+
+
+def test_post_pm25_map_served_from_result_cache():
+
+    """
+    Test a repeated map query is served from the result cache in both formats.
+    """
+
+    body = {"start_date": "2024-01-01", "end_date": "2024-01-31"}
+    with patch("services.pm25_services.download_pm_raster", return_value=read_raster(DEFAULT_MAP_RASTER_OUTPUT_PATH)) as mock_func:
+        first = client.post("/pm25/map-data", json=body)
+        second = client.post("/pm25/map-data", json=body)
+        grid = client.post("/pm25/map-data?format=grid", json=body)
+
+    assert mock_func.call_count == 1
+    assert first.content == second.content
+    assert grid.json()["type"] == "Grid"
@@ -0,0 +1,143 @@
+import datetime
+import os
+import pytest
+from unittest.mock import patch
+from utils_f import cache
+from utils_f.scheduler import RefreshScheduler, due_stages
+
+NOW = datetime.datetime(2025, 6, 2, 12, 0, tzinfo=datetime.timezone.utc)
+TODAY = NOW.astimezone().date()
+GRANULE = "2025-06-01T10:00:00+00:00"
+
+
+def current_manifest(latest_granule=GRANULE):
+    computed_at = (NOW - datetime.timedelta(minutes=10)).isoformat()
+    return {
+        name: {"computed_at": computed_at, "data_window": cache.stage_data_window(name, latest_granule, TODAY)}
+        for name in cache.PRECOMPUTE_STAGES
+    }
+
+
+def test_due_stages():
+
+    """
+    Test only missing, expired NRTI and OFFL stages older than the newest granule are due.
+    """
+
+    assert due_stages({}, GRANULE, NOW) == list(cache.PRECOMPUTE_STAGES)
+    assert due_stages(current_manifest(), GRANULE, NOW) == []
+    assert due_stages(current_manifest(), None, NOW) == []
+    assert due_stages(current_manifest(), GRANULE, NOW + datetime.timedelta(hours=2)) == ["indicator"]
+    assert due_stages(current_manifest(), "2025-06-02T09:00:00+00:00", NOW) == ["averages", "map", "tiles"]
+
+
+def test_due_stages_retries_failed_stage_after_backoff():
+
+    """
+    Test a failed stage keeps its last good window and is retried after the backoff.
+    """
+
+    manifest = current_manifest()
+    manifest["map"].update(failed_at=(NOW - datetime.timedelta(minutes=1)).isoformat(), error="Test Error")
+
+    assert due_stages(manifest, GRANULE, NOW, failed_retry_seconds=900) == []
+    assert due_stages(manifest, GRANULE, NOW, failed_retry_seconds=30) == ["map"]
+
+    # Outdated windows do not bypass the backoff: a newer granule and a stale indicator.
+    manifest["indicator"].update(
+        computed_at=(NOW - datetime.timedelta(days=2)).isoformat(),
+        failed_at=(NOW - datetime.timedelta(minutes=1)).isoformat(),
+        error="Test Error"
+    )
+    newer_granule = "2025-06-02T10:00:00+00:00"
+    assert due_stages(manifest, newer_granule, NOW, indicator_refresh_seconds=3600, failed_retry_seconds=900) == [
+        stage for stage in cache.PRECOMPUTE_STAGES if stage not in ("indicator", "map")]
+    assert sorted(due_stages(manifest, newer_granule, NOW, failed_retry_seconds=30)) == sorted(cache.PRECOMPUTE_STAGES)
+
+
+def test_is_stale_answers_from_last_tick():
+
+    """
+    Test staleness is read from the snapshot of the last tick, not from the manifest.
+    """
+
+    scheduler = RefreshScheduler()
+    manifest = current_manifest()
+    manifest.pop("map")
+
+    with patch("utils_f.cache.latest_offl_granule", return_value=GRANULE), \
+            patch("utils_f.cache.read_manifest", return_value=manifest), \
+            patch("utils_f.scheduler.due_stages", wraps=lambda *args: due_stages(args[0], args[1], NOW)), \
+            patch("utils_f.scheduler.submit_precompute", return_value={"id": "job"}):
+        scheduler.tick()
+
+    with patch("utils_f.cache.read_manifest", side_effect=AssertionError("manifest was read")):
+        assert scheduler.is_stale("map")
+        assert not scheduler.is_stale("indicator")
+
+
+def test_retryable_stages_skip_backoff():
+
+    """
+    Test stages of missing data are submitted unless a failed run is in its backoff.
+    """
+
+    scheduler = RefreshScheduler(failed_retry_seconds=900)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    manifest = {
+        "map": {"failed_at": now.isoformat(), "error": "Test Error"},
+        "tiles": {"failed_at": (now - datetime.timedelta(hours=1)).isoformat(), "error": "Test Error"}
+    }
+
+    with patch("utils_f.cache.read_manifest", return_value=manifest):
+        assert scheduler.retryable_stages(["indicator", "map", "tiles"]) == ["indicator", "tiles"]
+
+
+def test_precompute_records_manifest(tmp_path, monkeypatch):
+
+    """
+    Test successful stages record their data window and failed ones keep the last good one.
+    """
+
+    monkeypatch.chdir(tmp_path)
+    stages = {"indicator": lambda: None, "map": lambda: None}
+
+    with patch.dict(cache.PRECOMPUTE_STAGES, stages, clear=True):
+        cache.precompute_metrics(latest_granule=GRANULE)
+        manifest = cache.read_manifest()
+        assert manifest["map"]["data_window"]["latest_granule"] == GRANULE
+        assert manifest["indicator"]["data_window"]["date"] == datetime.date.today().isoformat()
+
+        def fail():
+            raise Exception("Test Error")
+
+        with patch.dict(cache.PRECOMPUTE_STAGES, map=fail), pytest.raises(RuntimeError):
+            cache.precompute_metrics(["map"], latest_granule="2025-06-02T09:00:00+00:00")
+
+    failed = cache.read_manifest()["map"]
+    assert failed["error"] == "Test Error"
+    assert failed["data_window"] == manifest["map"]["data_window"]
+    assert not [name for name in os.listdir(cache.CACHE_DIR) if name.endswith(".tmp")]
+
+
+def test_scheduler_tick_submits_due_stages():
+
+    """
+    Test a tick only submits the outdated stages and checks OFFL granules once per interval.
+    """
+
+    scheduler = RefreshScheduler(offl_check_seconds=3600)
+    manifest = current_manifest()
+    manifest.pop("averages")
+
+    with patch("utils_f.cache.latest_offl_granule", return_value=GRANULE) as mock_latest, \
+            patch("utils_f.cache.read_manifest", return_value=manifest), \
+            patch("utils_f.scheduler.due_stages", wraps=lambda *args: due_stages(args[0], args[1], NOW)), \
+            patch("utils_f.scheduler.submit_precompute", return_value={"id": "job"}) as mock_submit:
+        assert scheduler.tick() == {"id": "job"}
+        mock_submit.assert_called_once_with(["averages"], GRANULE)
+
+        manifest["averages"] = current_manifest()["averages"]
+        assert scheduler.tick() is None
+
+    mock_latest.assert_called_once()
@@ -0,0 +1,100 @@
+import datetime
+import numpy as np
+import pytest
+from tests import fake_ee
+from sentinel5plib import tile_store
+from sentinel5plib.tile_store import TileGrid, TileStore, ingest_daily_rasters
+
+GRID = TileGrid(west=9.7, north=53.75, cell_size=0.05, rows=4, cols=6)
+START = datetime.date(2024, 12, 28)
+# Days with scenes: day offset from START -> (AAI, NO2 in mol/m²); the other days are empty.
+SCENES = {0: (1.0, 1e-4), 1: (2.0, 2e-4), 4: (3.0, 3e-4), 5: (4.0, 4e-4), 9: (5.0, 5e-4)}
+
+
+def produce_collection(data, aoi, start_date, end_date):
+
+    """
+    Synthetic producer in place of the Sentinel-5P collections: one image per scene day.
+    """
+
+    images = []
+    for offset, (aai, no2) in SCENES.items():
+        day = (START + datetime.timedelta(days=offset)).isoformat()
+        if start_date <= day < end_date:
+            band = ('NO2_column_number_density', no2) if data == 'NO2' else ('absorbing_aerosol_index', aai)
+            values = np.full(fake_ee.GRID_SHAPE, band[1])
+            values[0, 0] = np.nan
+            images.append(fake_ee.Image.from_bands({band[0]: values}, **{'system:time_start': day}))
+    return fake_ee.ImageCollection(images)
+
+
+@pytest.fixture
+def fake_producer(monkeypatch):
+    fake_ee.reset()
+    monkeypatch.setattr(tile_store, 'ee', fake_ee)
+    monkeypatch.setattr(tile_store, 'get_sentinel5p_image_collection_range', produce_collection)
+    yield fake_ee
+
+
+def test_ingest_daily_rasters(tmp_path, fake_producer):
+
+    """
+    Test daily composites across a year boundary are stored with one request per chunk.
+    """
+
+    store = TileStore(str(tmp_path), GRID)
+    end = START + datetime.timedelta(days=10)
+    fetched = ingest_daily_rasters(store, None, START, end, chunk_days=4, today=datetime.date(2025, 6, 1))
+
+    assert fetched == 10
+    assert fake_ee.calls == 3
+    aai = store.read('aai', START, end)
+    no2 = store.read('no2', START, end)
+    assert aai.shape == (10, 4, 6)
+    assert np.isnan(aai[:, 0, 0]).all()
+    for offset in range(10):
+        if offset in SCENES:
+            assert aai[offset, 1, 1] == pytest.approx(SCENES[offset][0])
+            assert no2[offset, 1, 1] == pytest.approx(SCENES[offset][1] / 1000 * 46.0055 * 1e6)
+        else:
+            assert np.isnan(aai[offset]).all()
+    assert store.read('aai', datetime.date(2025, 1, 1), datetime.date(2025, 1, 2))[0, 1, 1] == pytest.approx(3.0)
+
+
+def test_ingest_fetches_only_missing_days(tmp_path, fake_producer):
+
+    """
+    Test a reopened store keeps its final days and only unsettled days are fetched again.
+    """
+
+    end = START + datetime.timedelta(days=10)
+    today = START + datetime.timedelta(days=20)
+    ingest_daily_rasters(TileStore(str(tmp_path), GRID), None, START, end, today=today)
+
+    fake_ee.reset()
+    store = TileStore(str(tmp_path), GRID)
+    fetched = ingest_daily_rasters(store, None, START, end, today=today)
+
+    # Days older than OFFL_SETTLE_DAYS are final, the later ones are fetched again.
+    assert fetched == 4
+    assert fake_ee.calls == 1
+    assert store.read('aai', START, end)[1, 1, 1] == pytest.approx(2.0)
+
+    fake_ee.reset()
+    assert ingest_daily_rasters(store, None, START, end, today=end + datetime.timedelta(days=30)) == 4
+    assert ingest_daily_rasters(store, None, START, end, today=end + datetime.timedelta(days=30)) == 0
+    assert fake_ee.calls == 1
+
+
+def test_tile_store_grid_change_resets(tmp_path, fake_producer):
+
+    """
+    Test tiles stored on another grid are dropped.
+    """
+
+    end = START + datetime.timedelta(days=2)
+    ingest_daily_rasters(TileStore(str(tmp_path), GRID), None, START, end, today=datetime.date(2026, 1, 1))
+
+    store = TileStore(str(tmp_path), GRID._replace(rows=5))
+    assert store.missing_days(START, end) == [START, START + datetime.timedelta(days=1)]
+    assert np.isnan(store.read('aai', START, end)).all()
@@ -0,0 +1,49 @@
+import os
+import shutil
+import pytest
+from unittest.mock import patch
+from tests import fake_ee
+from sentinel5plib import vector_utils
+from sentinel5plib.defaults import HAMBURG_GEOJSON_PATH
+
+
+@pytest.fixture(autouse=True)
+def fake_ee_module(monkeypatch):
+    fake_ee.reset()
+    monkeypatch.setattr(vector_utils, 'ee', fake_ee)
+    monkeypatch.setattr(vector_utils, '_aoi_cache', {})
+    yield fake_ee
+
+
+def test_aoi_contains_point():
+
+    """
+    Test points inside and outside Hamburg are told apart locally.
+    """
+
+    assert vector_utils.aoi_contains_point(HAMBURG_GEOJSON_PATH, 10.0, 53.55)
+    assert not vector_utils.aoi_contains_point(HAMBURG_GEOJSON_PATH, 13.4, 52.52)
+    assert fake_ee.calls == 0
+
+
+def test_load_aoi_memoized_until_file_changes(tmp_path):
+
+    """
+    Test the AOI file is read once, for both geometries, and read again after its mtime
+    changes.
+    """
+
+    aoi_file = str(tmp_path / "aoi.geojson")
+    shutil.copy(HAMBURG_GEOJSON_PATH, aoi_file)
+
+    with patch.object(vector_utils.gpd, "read_file", wraps=vector_utils.gpd.read_file) as read_file:
+        first = vector_utils.get_aoi_geometry(aoi_file)
+        second = vector_utils.get_aoi_geometry(aoi_file)
+        vector_utils.aoi_contains_point(aoi_file, 10.0, 53.55)
+        assert first is second
+        assert read_file.call_count == 1
+
+        mtime = os.path.getmtime(aoi_file)
+        os.utime(aoi_file, (mtime + 10, mtime + 10))
+        vector_utils.get_aoi_geometry(aoi_file)
+        assert read_file.call_count == 2
@@ -1,46 +1,556 @@
+import brotli
+import copy
+import datetime
+import gzip
+import hashlib
 import json
 import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from affine import Affine
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
 from loguru import logger
 from sentinel5plib.analysis import (
     calculate_pm25_indicator,
     extract_average_data,
-    get_pm_map
+    download_pm_raster
+)
+from sentinel5plib.raster_utils import iter_raster_geojson, raster_to_grid_payload, build_raster_pyramid
+from sentinel5plib.tile_store import TileStore, aoi_tile_grid, ingest_daily_rasters
+from sentinel5plib.prefix_cube import PrefixSumCube
+from sentinel5plib.compute import aoi_mask
+from sentinel5plib.vector_utils import get_aoi_geometry
+from sentinel5plib.data_utils import get_latest_granule_time
+from sentinel5plib.ee_client import EE_CLIENT
+from sentinel5plib.metrics import REGISTRY
+from sentinel5plib.defaults import (
+    HAMBURG_GEOJSON_PATH,
+    DEFAULT_AVERAGE_YEAR_VALUE,
+    DEFAULT_AVERAGE_WEEK_VALUE,
+    DEFAULT_AVERAGE_MONTH_VALUE,
+    DEFAULT_MAP_DATA_START_DATE,
+    DEFAULT_MAP_DATA_END_DATE,
+    DEFAULT_TILE_STORE_PATH,
+    DEFAULT_TILE_INGEST_START_DATE
 )
-from sentinel5plib.vector_utils import convert_geodf_to_dict
 
 CACHE_DIR = "cache"
 INDICATOR_CACHE_FILE = f"{CACHE_DIR}/pm25_indicator.json"
 AVERAGES_CACHE_FILE = f"{CACHE_DIR}/aggregated_pm25.json"
 MAP_CACHE_FILE = f"{CACHE_DIR}/pm25_map.json"
+MAP_GRID_CACHE_FILE = f"{CACHE_DIR}/pm25_map_grid.json"
+MAP_ARRAY_CACHE_FILE = f"{CACHE_DIR}/pm25_map.npy"
+MAP_ARRAY_META_CACHE_FILE = f"{CACHE_DIR}/pm25_map_meta.json"
+MANIFEST_FILE = f"{CACHE_DIR}/manifest.json"
+GENERATIONS_FILE = f"{CACHE_DIR}/generations.json"
+# Quality 11 is ~60x slower than 9 on the map GeoJSON, too slow for loading on a request.
+BROTLI_QUALITY = 9
+# Seconds between checks whether a loaded cache file was replaced, e.g. by the leader worker.
+ARTIFACT_RECHECK_SECONDS = float(os.environ.get("PM25_ARTIFACT_RECHECK_SECONDS", 1.0))
+PRECOMPUTE_DURATION = REGISTRY.histogram(
+    "pm25_precompute_stage_duration_seconds", "Duration of precompute stages.", ["stage", "status"])
 
 
-def precompute_metrics():
+class CacheArtifact:
 
     """
-    Precomputes and caches PM2.5 indicator, averages, and map data.
+    Ready to send bytes of a cache file, its compressed variants, validators, and its
+    generation: the number of times the cache file has been written.
+    """
+
+    def __init__(self, body: bytes, last_modified: float, generation: int = 0):
+        self.body = body
+        self.encoded = {
+            "br": brotli.compress(body, quality=BROTLI_QUALITY),
+            "gzip": gzip.compress(body),
+        }
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.last_modified = last_modified
+        self.generation = generation
+        self.checked_at = time.monotonic()
+
+    @property
+    def age(self) -> int:
+        return max(0, int(time.time() - self.last_modified))
+
+
+ARTIFACTS: Dict[str, CacheArtifact] = {}
+
+_artifact_lock = threading.Lock()
+_generations: Optional[Dict[str, int]] = None
+
+
+def write_atomic(path: str, body: bytes):
+
+    """
+    Writes a file through a temp file and a rename, readers see the old or the new file,
+    never a partial one.
+    """
+
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(body)
+    os.replace(tmp_file, path)
+
+
+def _load_generations() -> Dict[str, int]:
+    global _generations
+
+    if _generations is None:
+        _generations = {}
+        if os.path.exists(GENERATIONS_FILE):
+            try:
+                with open(GENERATIONS_FILE, "rb") as f:
+                    _generations = dict(json.load(f))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable cache generations: {str(e)}")
+
+    return _generations
+
+
+def store_artifact(cache_file: str, body: bytes) -> CacheArtifact:
+
+    """
+    Writes the cache file atomically as its next generation and keeps its encoded artifact
+    in memory. Until the rename, readers keep getting the previous generation.
     """
-    
-    os.makedirs(CACHE_DIR, exist_ok=True)
 
+    global _generations
+
+    with _artifact_lock:
+        # Read from disk: another worker may have been the leader before.
+        _generations = None
+        generations = _load_generations()
+        generation = generations.get(cache_file, 0) + 1
+        write_atomic(cache_file, body)
+        last_modified = os.path.getmtime(cache_file)
+        generations[cache_file] = generation
+        write_atomic(GENERATIONS_FILE, json.dumps(generations).encode())
+
+    artifact = CacheArtifact(body, last_modified, generation)
+    with _artifact_lock:
+        current = ARTIFACTS.get(cache_file)
+        if current is None or current.generation < generation:
+            ARTIFACTS[cache_file] = artifact
+
+    return artifact
+
+
+def _replaced_on_disk(cache_file: str, artifact: CacheArtifact) -> bool:
+
+    """
+    Whether the cache file changed since the artifact was loaded, checked at most every
+    ARTIFACT_RECHECK_SECONDS.
+    """
+
+    now = time.monotonic()
+    if now - artifact.checked_at < ARTIFACT_RECHECK_SECONDS:
+        return False
+    artifact.checked_at = now
     try:
-        logger.info('Precomputing and Caching PM2.5 Indicator')
-        indicator_data = calculate_pm25_indicator().to_dict(orient="records")
-        with open(INDICATOR_CACHE_FILE, "w") as f:
-            json.dump(indicator_data, f)
-        logger.success('PM2.5 Indicator successfully cached.')
-
-        logger.info('Precomputing and Caching Average PM2.5')
-        averages_data = extract_average_data().to_dict(orient="records")
-        with open(AVERAGES_CACHE_FILE, "w") as f:
-            json.dump(averages_data, f)
-        logger.success('PM2.5 average values successfully cached.')
-
-        logger.info('Precomputing and Caching Average PM2.5 Maps')
-        geojson_data = get_pm_map()
-        geojson_response = convert_geodf_to_dict(geojson_data)
-        with open(MAP_CACHE_FILE, "w") as f:
-            json.dump(geojson_response, f)
-        logger.success('PM2.5 Average Values Map successfully cached.')
+        return os.path.getmtime(cache_file) != artifact.last_modified
+    except OSError:
+        return False
+
+
+def load_artifact(cache_file: str) -> Optional[CacheArtifact]:
+
+    """
+    Returns the in-memory artifact of a cache file, reading the file from disk only when it
+    has not been loaded yet (e.g. cache files left by a previous run) or when another
+    worker replaced it.
+    """
+
+    global _generations
+
+    artifact = ARTIFACTS.get(cache_file)
+    if artifact is not None and not _replaced_on_disk(cache_file, artifact):
+        return artifact
+
+    if not os.path.exists(cache_file):
+        return artifact
+
+    with _artifact_lock:
+        with open(cache_file, "rb") as f:
+            body = f.read()
+        last_modified = os.path.getmtime(cache_file)
+        if artifact is not None:
+            _generations = None
+        generation = _load_generations().get(cache_file, 0)
+
+    loaded = CacheArtifact(body, last_modified, generation)
+    with _artifact_lock:
+        current = ARTIFACTS.get(cache_file)
+        if current is None or current is artifact:
+            ARTIFACTS[cache_file] = loaded
+
+    return ARTIFACTS[cache_file]
+
 
+class MapRaster(NamedTuple):
+
+    """
+    Cached PM2.5 map raster of one time frame and its downsampled pyramid levels by
+    factor, the images are memory-mapped.
+    """
+
+    image: np.ndarray
+    transform: Affine
+    nodata: Optional[float]
+    start_date: str
+    end_date: str
+    levels: Dict[int, np.ndarray] = {}
+
+
+_map_raster: Optional[MapRaster] = None
+_map_raster_meta: Optional[CacheArtifact] = None
+
+
+def map_level_cache_file(factor: int) -> str:
+    return f"{CACHE_DIR}/pm25_map_{factor}x.npy"
+
+
+def _save_array(path: str, array: np.ndarray):
+    tmp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_file, "wb") as f:
+        np.save(f, np.asarray(array))
+    os.replace(tmp_file, path)
+
+
+def store_map_raster(image, transform, nodata, start_date: str, end_date: str) -> MapRaster:
+
+    """
+    Saves the map raster and its pyramid levels as .npy plus a metadata file and
+    memory-maps them for point and viewport queries. The metadata is written last, so it
+    only lists complete levels.
+    """
+
+    global _map_raster
+
+    _save_array(MAP_ARRAY_CACHE_FILE, image)
+    levels = build_raster_pyramid(image, transform, nodata)
+    for factor, level in levels.items():
+        _save_array(map_level_cache_file(factor), level)
+
+    meta = {
+        "transform": list(transform)[:6],
+        "nodata": nodata,
+        "start_date": start_date,
+        "end_date": end_date,
+        "pyramid": sorted(levels)
+    }
+    store_artifact(MAP_ARRAY_META_CACHE_FILE, json.dumps(meta).encode())
+
+    _map_raster = None
+    return load_map_raster()
+
+
+def load_map_raster() -> Optional[MapRaster]:
+
+    """
+    Returns the memory-mapped cached map raster, None when it has not been precomputed.
+    The arrays are mapped again when the metadata shows a new map generation.
+    """
+
+    global _map_raster, _map_raster_meta
+
+    meta_artifact = load_artifact(MAP_ARRAY_META_CACHE_FILE)
+    if _map_raster is None or meta_artifact is not _map_raster_meta:
+        if meta_artifact is None or not os.path.exists(MAP_ARRAY_CACHE_FILE):
+            return None
+        meta = json.loads(meta_artifact.body)
+        _map_raster = MapRaster(
+            image=np.load(MAP_ARRAY_CACHE_FILE, mmap_mode="r"),
+            transform=Affine(*meta["transform"]),
+            nodata=meta["nodata"],
+            start_date=meta["start_date"],
+            end_date=meta["end_date"],
+            levels={
+                factor: np.load(map_level_cache_file(factor), mmap_mode="r")
+                for factor in meta.get("pyramid", [])
+            }
+        )
+        _map_raster_meta = meta_artifact
+
+    return _map_raster
+
+
+def precompute_indicator():
+
+    """
+    Precomputes and caches the PM2.5 indicator.
+    """
+
+    indicator_data = calculate_pm25_indicator().to_dict(orient="records")
+    store_artifact(INDICATOR_CACHE_FILE, json.dumps(indicator_data).encode())
+
+
+def precompute_averages():
+
+    """
+    Precomputes and caches the PM2.5 averages.
+    """
+
+    averages_data = extract_average_data().to_dict(orient="records")
+    store_artifact(AVERAGES_CACHE_FILE, json.dumps(averages_data).encode())
+
+
+def precompute_map():
+
+    """
+    Precomputes and caches the PM2.5 map, as GeoJSON, as grid payload and as raster array
+    for point queries.
+    """
+
+    image, transform, nodata = download_pm_raster()
+    store_artifact(MAP_CACHE_FILE, b''.join(iter_raster_geojson(image, transform, nodata)))
+    grid_payload = raster_to_grid_payload(image, transform, nodata)
+    store_artifact(MAP_GRID_CACHE_FILE, json.dumps(grid_payload).encode())
+    store_map_raster(image, transform, nodata, DEFAULT_MAP_DATA_START_DATE, DEFAULT_MAP_DATA_END_DATE)
+
+
+_tile_store: Optional[TileStore] = None
+_prefix_cube: Optional[PrefixSumCube] = None
+
+
+def load_tile_store(create: bool = True) -> Optional[TileStore]:
+
+    """
+    Returns the tile store of daily AOI rasters, opened once per process. Without create,
+    None when nothing has been ingested yet. Only ingestion (create) opens it writable, the
+    other workers map it read-only and pick up the days the leader flushed.
+    """
+
+    global _tile_store
+
+    if _tile_store is None or (create and _tile_store.readonly):
+        if not create and not os.path.exists(os.path.join(DEFAULT_TILE_STORE_PATH, "index.json")):
+            return None
+        _tile_store = TileStore(DEFAULT_TILE_STORE_PATH, aoi_tile_grid(HAMBURG_GEOJSON_PATH), readonly=not create)
+    elif _tile_store.readonly:
+        _tile_store.refresh()
+
+    return _tile_store
+
+
+def load_prefix_cube() -> Optional[PrefixSumCube]:
+
+    """
+    Returns the prefix sum cube of the tile store, None when nothing has been ingested yet.
+    """
+
+    global _prefix_cube
+
+    store = load_tile_store(create=False)
+    if store is None:
+        return None
+    if _prefix_cube is None or _prefix_cube.store is not store:
+        _prefix_cube = PrefixSumCube(store, aoi_mask(store.grid, HAMBURG_GEOJSON_PATH))
+
+    return _prefix_cube
+
+
+def precompute_tiles():
+
+    """
+    Ingests the daily rasters that are not final in the tile store yet.
+    """
+
+    ingest_daily_rasters(
+        load_tile_store(),
+        get_aoi_geometry(HAMBURG_GEOJSON_PATH),
+        datetime.date.fromisoformat(DEFAULT_TILE_INGEST_START_DATE),
+        datetime.date.today()
+    )
+
+
+PRECOMPUTE_STAGES = {
+    "indicator": precompute_indicator,
+    "averages": precompute_averages,
+    "map": precompute_map,
+    "tiles": precompute_tiles,
+}
+
+# Precompute stage writing each served cache file.
+ARTIFACT_STAGES = {
+    INDICATOR_CACHE_FILE: "indicator",
+    AVERAGES_CACHE_FILE: "averages",
+    MAP_CACHE_FILE: "map",
+    MAP_GRID_CACHE_FILE: "map",
+}
+
+# Data each stage is computed from. NRTI stages change with every day, OFFL stages only
+# when new OFFL granules are published.
+STAGE_DATA_WINDOWS = {
+    "indicator": {"product": "NRTI"},
+    "averages": {
+        "product": "OFFL",
+        "year": DEFAULT_AVERAGE_YEAR_VALUE,
+        "week_number": DEFAULT_AVERAGE_WEEK_VALUE,
+        "month_number": DEFAULT_AVERAGE_MONTH_VALUE
+    },
+    "map": {"product": "OFFL", "start_date": DEFAULT_MAP_DATA_START_DATE, "end_date": DEFAULT_MAP_DATA_END_DATE},
+    "tiles": {"product": "OFFL", "start_date": DEFAULT_TILE_INGEST_START_DATE},
+}
+
+_manifest_lock = threading.Lock()
+_manifest: Optional[Tuple[float, dict]] = None
+
+
+def stage_data_window(
+    name: str,
+    latest_granule: Optional[str] = None,
+    today: Optional[datetime.date] = None
+) -> dict:
+
+    """
+    Data window a stage computes now: the current day for NRTI stages, the newest OFFL
+    granule for OFFL stages.
+    """
+
+    window = dict(STAGE_DATA_WINDOWS.get(name, {"product": "OFFL"}))
+    if window["product"] == "NRTI":
+        window["date"] = (today or datetime.date.today()).isoformat()
+    else:
+        window["latest_granule"] = latest_granule
+
+    return window
+
+
+def latest_offl_granule() -> Optional[str]:
+
+    """
+    Start time of the newest OFFL AAI or NO2 granule over the AOI as ISO string, None when
+    Earth Engine cannot be reached.
+    """
+
+    try:
+        aoi = get_aoi_geometry(HAMBURG_GEOJSON_PATH)
+        # Both lookups run concurrently in the Earth Engine client pool.
+        futures = [
+            EE_CLIENT.submit(get_latest_granule_time("OFFL", data, aoi).getInfo)
+            for data in ("AER_AI", "NO2")
+        ]
+        latest = max(EE_CLIENT.result(future) for future in futures)
+        return datetime.datetime.fromtimestamp(latest / 1000, datetime.timezone.utc).isoformat()
     except Exception as e:
-        print(f"Precompute failed: {str(e)}")
+        logger.warning(f"Newest OFFL granule could not be looked up: {str(e)}")
+        return None
+
+
+def read_manifest() -> dict:
+
+    """
+    Stages of the last good cache: when each was computed and for which data window. The
+    file is parsed again only when it changed.
+    """
+
+    global _manifest
+
+    if not os.path.exists(MANIFEST_FILE):
+        return {}
+    try:
+        modified = os.path.getmtime(MANIFEST_FILE)
+        if _manifest is None or _manifest[0] != modified:
+            with open(MANIFEST_FILE) as f:
+                _manifest = (modified, json.load(f))
+    except ValueError as e:
+        logger.warning(f"Ignoring unreadable cache manifest: {str(e)}")
+        return {}
+
+    return copy.deepcopy(_manifest[1])
+
+
+def record_manifest_stage(name: str, **entry):
+
+    """
+    Updates the manifest entry of a stage and rewrites the manifest atomically.
+    """
+
+    with _manifest_lock:
+        manifest = read_manifest()
+        manifest[name] = {**manifest.get(name, {}), **entry}
+        write_atomic(MANIFEST_FILE, json.dumps(manifest, indent=2).encode())
+
+
+def warm_artifacts():
+
+    """
+    Loads the cache files left by the previous run, so the first requests are served from
+    memory while the refresh runs.
+    """
+
+    for cache_file in (INDICATOR_CACHE_FILE, AVERAGES_CACHE_FILE, MAP_CACHE_FILE, MAP_GRID_CACHE_FILE):
+        load_artifact(cache_file)
+    load_map_raster()
+    load_prefix_cube()
+
+
+def run_precompute_stage(name: str) -> float:
+
+    """
+    Runs one precompute stage and returns its duration in seconds.
+    """
+
+    logger.info(f'Precomputing and Caching PM2.5 {name}')
+    start = time.perf_counter()
+    try:
+        PRECOMPUTE_STAGES[name]()
+    except Exception:
+        PRECOMPUTE_DURATION.observe(time.perf_counter() - start, stage=name, status="failed")
+        raise
+    elapsed = time.perf_counter() - start
+    PRECOMPUTE_DURATION.observe(elapsed, stage=name, status="done")
+    logger.success(f'PM2.5 {name} successfully cached in {elapsed:.2f}s.')
+
+    return elapsed
+
+
+def precompute_metrics(
+    stages: Optional[Iterable[str]] = None,
+    latest_granule: Optional[str] = None
+) -> Dict[str, float]:
+
+    """
+    Precomputes and caches PM2.5 indicator, averages, and map data, and ingests new daily
+    rasters into the tile store, or only the given stages. The stages run concurrently,
+    each one publishes its cache file as soon as it finishes and is recorded in the
+    manifest with its data window. Errors are raised to the caller once all stages are
+    done, see utils_f.jobs for the background runner.
+    """
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    stages = list(stages or PRECOMPUTE_STAGES)
+    today = datetime.date.today()
+    if latest_granule is None and any(stage_data_window(name)["product"] == "OFFL" for name in stages):
+        latest_granule = latest_offl_granule()
+
+    with ThreadPoolExecutor(max_workers=len(stages), thread_name_prefix="precompute-stage") as executor:
+        futures = {name: executor.submit(run_precompute_stage, name) for name in stages}
+
+    timings = {}
+    errors = []
+    for name, future in futures.items():
+        error = future.exception()
+        computed_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        if error is None:
+            timings[name] = future.result()
+            record_manifest_stage(
+                name,
+                computed_at=computed_at,
+                duration=round(timings[name], 3),
+                data_window=stage_data_window(name, latest_granule, today),
+                error=None
+            )
+        else:
+            logger.error(f'PM2.5 {name} precompute failed: {str(error)}')
+            errors.append(f'{name}: {str(error)}')
+            # Keep the window of the last good run, the cache files still hold its results.
+            record_manifest_stage(name, failed_at=computed_at, error=str(error))
+
+    if errors:
+        raise RuntimeError(f"Precompute stages failed ({'; '.join(errors)})")
+
+    return timings
@@ -0,0 +1,144 @@
+import time
+from typing import Iterable, List, Tuple
+from loguru import logger
+from starlette.routing import Match
+from sentinel5plib.ee_client import EE_CLIENT
+from sentinel5plib.log_utils import request_id_from_header, bind_request_id, reset_request_id, sample_request
+from sentinel5plib.metrics import (
+    REGISTRY,
+    SIZE_BUCKETS,
+    COUNT_BUCKETS,
+    Sample,
+    start_request_ee_count,
+    finish_request_ee_count
+)
+from utils_f.result_cache import RESULTS, MAP_TILES
+from utils_f.leader import LEADER
+
+REQUEST_DURATION = REGISTRY.histogram(
+    "pm25_http_request_duration_seconds", "Latency of HTTP requests by route.", ["method", "route", "status"])
+RESPONSE_BYTES = REGISTRY.histogram(
+    "pm25_http_response_bytes", "Size of HTTP response bodies by route.", ["route"], SIZE_BUCKETS)
+REQUEST_EE_CALLS = REGISTRY.histogram(
+    "pm25_http_request_ee_calls", "Earth Engine calls sent while serving a request.", ["route"], COUNT_BUCKETS)
+ARTIFACT_REQUESTS = REGISTRY.counter(
+    "pm25_artifact_requests", "Precomputed cache file lookups by cache status.", ["status"])
+UNMATCHED_ROUTE = "unmatched"
+REQUEST_ID_HEADER = b"x-request-id"
+
+
+def route_template(scope) -> str:
+
+    """
+    Path template of the route serving the request, e.g. /pm25/tiles/{z}/{x}/{y}.png, so
+    path parameters do not multiply the label values.
+    """
+
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class RequestMetricsMiddleware:
+
+    """
+    ASGI middleware recording latency, response size and Earth Engine calls of every HTTP
+    request by route. Each request gets a correlation ID (X-Request-ID) bound to its log
+    records, and one span line is logged per request, sampled by sample_request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        response = {"status": 500, "bytes": 0}
+        headers = dict(scope.get("headers", ()))
+        request_id = request_id_from_header(headers.get(REQUEST_ID_HEADER, b"").decode("latin-1"))
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        token = start_request_ee_count()
+        request_token = bind_request_id(request_id)
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            duration = time.perf_counter() - start
+            ee_calls = finish_request_ee_count(token)
+            route = route_template(scope)
+            REQUEST_DURATION.observe(duration, method=scope["method"], route=route, status=str(response["status"]))
+            RESPONSE_BYTES.observe(response["bytes"], route=route)
+            REQUEST_EE_CALLS.observe(ee_calls, route=route)
+            if sample_request(response["status"], duration):
+                logger.bind(
+                    route=route,
+                    status=response["status"],
+                    duration_ms=round(duration * 1000, 1),
+                    response_bytes=response["bytes"],
+                    ee_calls=ee_calls
+                ).info(f'{scope["method"]} {scope["path"]} {response["status"]} in {duration * 1000:.1f} ms')
+            reset_request_id(request_token)
+
+
+def collect_caches() -> Iterable[Tuple[str, str, str, List[Sample]]]:
+
+    """
+    Hit and miss counters, hit ratio and size of the result and map tile caches.
+    """
+
+    stats = {"results": RESULTS.stats(), "map_tiles": MAP_TILES.stats()}
+    requests, ratios, sizes = [], [], []
+    for cache, values in stats.items():
+        lookups = values["hits"] + values["misses"]
+        requests.append(("pm25_cache_requests_total", (("cache", cache), ("result", "hit")), values["hits"]))
+        requests.append(("pm25_cache_requests_total", (("cache", cache), ("result", "miss")), values["misses"]))
+        ratios.append(("pm25_cache_hit_ratio", (("cache", cache),), values["hits"] / lookups if lookups else 0))
+        sizes.append(("pm25_cache_bytes", (("cache", cache),), values["bytes"]))
+
+    yield "pm25_cache_requests_total", "counter", "Result and map tile cache lookups.", requests
+    yield "pm25_cache_hit_ratio", "gauge", "Share of cache lookups that were hits.", ratios
+    yield "pm25_cache_bytes", "gauge", "Bytes held by the cache.", sizes
+
+
+def collect_earth_engine() -> Iterable[Tuple[str, str, str, List[Sample]]]:
+
+    """
+    Queue depth and retry counters of the Earth Engine client.
+    """
+
+    stats = EE_CLIENT.stats()
+    for name in ("queued", "running", "in_flight"):
+        yield f"pm25_ee_{name}", "gauge", f"Earth Engine calls {name.replace('_', ' ')}.", [
+            (f"pm25_ee_{name}", (), stats[name])]
+    for name in ("coalesced", "retries", "timeouts", "failures"):
+        yield f"pm25_ee_{name}_total", "counter", f"Earth Engine call {name}.", [
+            (f"pm25_ee_{name}_total", (), stats[name])]
+
+
+def collect_leader() -> Iterable[Tuple[str, str, str, List[Sample]]]:
+
+    """
+    Whether this worker is the precompute leader.
+    """
+
+    yield "pm25_worker_leader", "gauge", "1 when this worker runs the precompute.", [
+        ("pm25_worker_leader", (), int(LEADER.is_leader))]
+
+
+REGISTRY.register_collector(collect_caches)
+REGISTRY.register_collector(collect_earth_engine)
+REGISTRY.register_collector(collect_leader)
@@ -0,0 +1,216 @@
+import datetime
+import json
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List, Optional
+from loguru import logger
+from utils_f import cache
+from utils_f.leader import LEADER
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+# Precompute triggers of workers that are not the leader, one file each, and the status of
+# the leader's latest job for the other workers.
+PRECOMPUTE_REQUESTS_DIR = f"{cache.CACHE_DIR}/precompute_requests"
+JOB_STATUS_FILE = f"{cache.CACHE_DIR}/precompute_job.json"
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="precompute")
+_lock = threading.Lock()
+_current_job: Optional["PrecomputeJob"] = None
+
+
+def _now() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class PrecomputeJob:
+
+    """
+    State of one background precompute run.
+    """
+
+    def __init__(self, stages: Optional[List[str]] = None, latest_granule: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.stages = stages
+        self.latest_granule = latest_granule
+        self.status = JOB_QUEUED
+        self.queued_at = _now()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in (JOB_QUEUED, JOB_RUNNING)
+
+    def run(self):
+        with _lock:
+            self.started_at = _now()
+            self.status = JOB_RUNNING
+            self.publish()
+
+        error = None
+        try:
+            cache.precompute_metrics(self.stages, self.latest_granule)
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Precompute failed: {str(e)}")
+
+        # Status last and under the lock: a finished job is never reported without its
+        # finish time or error.
+        with _lock:
+            self.finished_at = _now()
+            self.error = error
+            self.status = JOB_DONE if error is None else JOB_FAILED
+            self.publish()
+
+    def publish(self):
+
+        """
+        Writes the job status to JOB_STATUS_FILE for the other workers.
+        """
+
+        try:
+            os.makedirs(cache.CACHE_DIR, exist_ok=True)
+            cache.write_atomic(JOB_STATUS_FILE, json.dumps(self.to_dict()).encode())
+        except OSError as e:
+            logger.warning(f"Precompute job status could not be written: {str(e)}")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "stages": self.stages or list(cache.PRECOMPUTE_STAGES),
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+def submit_precompute(
+    stages: Optional[Iterable[str]] = None,
+    latest_granule: Optional[str] = None
+) -> dict:
+
+    """
+    Starts precompute_metrics of all or the given stages in the background executor. While
+    a job is queued or running, further triggers join it instead of starting another run.
+    Only the leader worker runs precompute, the other workers forward the trigger to it.
+    """
+
+    global _current_job
+
+    if not LEADER.try_acquire():
+        return forward_precompute(stages, latest_granule)
+
+    with _lock:
+        if _current_job is None or not _current_job.active:
+            _current_job = PrecomputeJob(list(stages) if stages else None, latest_granule)
+            _current_job.publish()
+            _executor.submit(_current_job.run)
+            logger.info(f'Precompute job {_current_job.id} queued.')
+        return _current_job.to_dict()
+
+
+def read_published_status() -> Optional[dict]:
+    try:
+        with open(JOB_STATUS_FILE, "rb") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def forward_precompute(
+    stages: Optional[Iterable[str]] = None,
+    latest_granule: Optional[str] = None
+) -> dict:
+
+    """
+    Precompute trigger of a worker that is not the leader: joins the leader's active job,
+    otherwise leaves a request in PRECOMPUTE_REQUESTS_DIR for the leader to pick up.
+    """
+
+    published = read_published_status()
+    if published is not None and published["status"] in (JOB_QUEUED, JOB_RUNNING):
+        return published
+
+    job = PrecomputeJob(list(stages) if stages else None, latest_granule)
+    os.makedirs(PRECOMPUTE_REQUESTS_DIR, exist_ok=True)
+    # One file per stage set: repeated triggers before the leader claims them replace it.
+    name = "-".join(sorted(job.stages)) if job.stages else "all"
+    cache.write_atomic(
+        os.path.join(PRECOMPUTE_REQUESTS_DIR, f"{name}.json"),
+        json.dumps({"stages": job.stages, "latest_granule": latest_granule}).encode()
+    )
+    logger.info(f'Precompute request {job.id} forwarded to the leader.')
+    return job.to_dict()
+
+
+def claim_forwarded_precompute() -> Optional[dict]:
+
+    """
+    Runs the precompute requests forwarded by the other workers as one job, called by the
+    leader. While a job is active the requests are kept until it finished. Returns the
+    job, None when there were no requests.
+    """
+
+    if not os.path.isdir(PRECOMPUTE_REQUESTS_DIR):
+        return None
+
+    stages, granules, claimed = set(), [], []
+    for name in sorted(os.listdir(PRECOMPUTE_REQUESTS_DIR)):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(PRECOMPUTE_REQUESTS_DIR, name)
+        try:
+            with open(path, "rb") as f:
+                request = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Dropping unreadable precompute request {path}: {str(e)}")
+            _remove_request(path)
+            continue
+        claimed.append(path)
+        if stages is not None:
+            stages = stages.union(request["stages"]) if request["stages"] else None
+        if request["latest_granule"]:
+            granules.append(request["latest_granule"])
+
+    if not claimed:
+        return None
+    with _lock:
+        previous = _current_job.id if _current_job is not None else None
+    job = submit_precompute(sorted(stages) if stages else None, max(granules, default=None))
+    # Removed only once a job started for them, after it is queued and published, so the
+    # requests are never lost. Joining an active job leaves them for the next tick.
+    if job["id"] != previous:
+        for path in claimed:
+            _remove_request(path)
+    return job
+
+
+def _remove_request(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def get_precompute_status() -> dict:
+
+    """
+    Status of the latest precompute job, "idle" when none has been started. Workers that
+    are not the leader report the job the leader published last.
+    """
+
+    if not LEADER.is_leader:
+        return read_published_status() or {"status": "idle"}
+
+    with _lock:
+        if _current_job is None:
+            return {"status": "idle"}
+        return _current_job.to_dict()
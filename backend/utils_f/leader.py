@@ -0,0 +1,87 @@
+import os
+import threading
+from typing import Optional
+from loguru import logger
+from utils_f.cache import CACHE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, run a single worker, it always leads
+    fcntl = None
+
+LEADER_LOCK_FILE = f"{CACHE_DIR}/leader.lock"
+# How often workers try to take over a free leader lock, and the leader picks up the
+# precompute requests forwarded by the other workers.
+LEADER_POLL_SECONDS = float(os.environ.get("PM25_LEADER_POLL_SECONDS", 2.0))
+
+
+class LeaderElection:
+
+    """
+    Elects the one worker process that runs precompute and the scheduled refreshes: the
+    worker holding an exclusive flock on the lock file. The kernel drops the lock when the
+    leader exits or crashes, and the next worker trying to acquire it takes over. The lock
+    file holds the PID of the leader.
+    """
+
+    def __init__(self, path: str = LEADER_LOCK_FILE):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+
+        """
+        Takes the leader lock if it is free, without blocking. Returns whether this process
+        is the leader.
+        """
+
+        with self._lock:
+            if self._fd is not None:
+                return True
+            if fcntl is None:
+                self._fd = -1
+                return True
+
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+
+            os.ftruncate(fd, 0)
+            os.write(fd, f"{os.getpid()}\n".encode())
+            self._fd = fd
+            logger.info(f"Worker {os.getpid()} is the precompute leader.")
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            if self._fd >= 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+            self._fd = None
+            logger.info(f"Worker {os.getpid()} released the precompute leadership.")
+
+    def leader_pid(self) -> Optional[int]:
+
+        """
+        PID of the last worker that became leader, None when none has yet.
+        """
+
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+
+LEADER = LeaderElection()
@@ -0,0 +1,223 @@
+import datetime
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from loguru import logger
+from sentinel5plib.defaults import OFFL_SETTLE_DAYS, S5P_GRID_CELL_DEGREES
+from utils_f.cache import CACHE_DIR
+
+RESULT_CACHE_DIR = f"{CACHE_DIR}/results"
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# OFFL periods that ended more than OFFL_SETTLE_DAYS ago no longer change: keep their results
+# for a month. Periods still receiving OFFL or NRTI scenes expire after an hour.
+RESULT_TTL_HISTORICAL = 30 * 24 * 3600
+RESULT_TTL_CURRENT = 3600
+# Rendered PNG map tiles, keyed by the map generation so a recomputed map never serves old
+# tiles. Tiles of previous generations are evicted as least recently used.
+MAP_TILE_CACHE_DIR = f"{CACHE_DIR}/map_tiles"
+MAP_TILE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ResultEntry(NamedTuple):
+    body: bytes
+    expires_at: float
+
+
+class ResultCache:
+
+    """
+    Size-bounded LRU cache of encoded query results, keyed by result_key. Entries are kept
+    in memory and persisted as one file per key in directory, so they survive restarts and
+    are shared by the worker processes: a key missing in memory is looked up on disk.
+    Each file holds a JSON header line with the expiry time followed by the body.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, ResultEntry]" = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def _load(self):
+
+        """
+        Reads the entries persisted by a previous run, oldest first.
+        """
+
+        self._loaded = True
+        if not os.path.isdir(self.directory):
+            return
+
+        paths = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                 if not name.endswith(".tmp")]
+        for path in sorted(paths, key=os.path.getmtime):
+            entry = self._read_file(path)
+            if entry is not None:
+                self._insert(os.path.basename(path), entry)
+
+        logger.info(f"Loaded {len(self._entries)} cached results from {self.directory}.")
+
+    def _read_file(self, path: str) -> Optional[ResultEntry]:
+
+        """
+        Entry persisted in path, None when the file is missing, unreadable or expired.
+        """
+
+        try:
+            with open(path, "rb") as f:
+                expires_at = float(json.loads(f.readline())["expires_at"])
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Dropping unreadable result cache file {path}: {str(e)}")
+            self._remove_file(path)
+            return None
+        if expires_at <= time.time():
+            self._remove_file(path)
+            return None
+        return ResultEntry(body, expires_at)
+
+    @staticmethod
+    def _remove_file(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _insert(self, key: str, entry: ResultEntry):
+        self._discard(key)
+        self._entries[key] = entry
+        self._size += len(entry.body)
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            evicted_key = next(iter(self._entries))
+            self._discard(evicted_key)
+            self._remove_file(self._path(evicted_key))
+            self.evictions += 1
+
+    def _discard(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size -= len(entry.body)
+
+    def get(self, key: str) -> Optional[bytes]:
+
+        """
+        Returns the cached body of key and marks it as recently used, None on a miss.
+        """
+
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.time():
+                self._discard(key)
+                self._remove_file(self._path(key))
+                entry = None
+            if entry is None:
+                # Stored by another worker since the entries were loaded.
+                entry = self._read_file(self._path(key))
+                if entry is not None:
+                    self._insert(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.body
+
+    def put(self, key: str, body: bytes, ttl: float):
+
+        """
+        Stores body under key for ttl seconds, evicting least recently used entries when
+        the cache grows over max_bytes.
+        """
+
+        if len(body) > self.max_bytes:
+            return
+
+        entry = ResultEntry(body, time.time() + ttl)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_file = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(json.dumps({"expires_at": entry.expires_at}).encode() + b"\n")
+                f.write(body)
+            os.replace(tmp_file, self._path(key))
+            self._insert(key, entry)
+
+    def clear(self):
+
+        """
+        Forgets all entries and counters in memory, persisted files are read again on the
+        next lookup.
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self._loaded = False
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+RESULTS = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES)
+MAP_TILES = ResultCache(MAP_TILE_CACHE_DIR, MAP_TILE_CACHE_MAX_BYTES)
+
+
+def result_key(kind: str, params: Dict[str, Any]) -> str:
+
+    """
+    Content address of a query: the hash of its kind and normalized parameters.
+    """
+
+    canonical = json.dumps([kind, params], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def grid_cell(point_x: float, point_y: float) -> Tuple[int, int]:
+
+    """
+    Index of the Sentinel-5P L3 grid cell containing the point, point queries within one
+    cell give the same result.
+    """
+
+    return math.floor(point_x / S5P_GRID_CELL_DEGREES), math.floor(point_y / S5P_GRID_CELL_DEGREES)
+
+
+def period_ttl(end_date: datetime.date, today: Optional[datetime.date] = None) -> float:
+
+    """
+    TTL of a result covering data up to end_date: long for settled OFFL periods, short for
+    periods that still receive scenes.
+    """
+
+    today = today or datetime.date.today()
+    if end_date + datetime.timedelta(days=OFFL_SETTLE_DAYS) < today:
+        return RESULT_TTL_HISTORICAL
+    return RESULT_TTL_CURRENT
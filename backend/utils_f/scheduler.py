@@ -0,0 +1,216 @@
+import datetime
+import os
+import threading
+import time
+from typing import FrozenSet, Iterable, List, Optional
+from loguru import logger
+from utils_f import cache
+from utils_f.jobs import submit_precompute, claim_forwarded_precompute
+from utils_f.leader import LEADER, LEADER_POLL_SECONDS
+
+# NRTI indicator refresh interval, and how often Earth Engine is asked for new OFFL granules.
+INDICATOR_REFRESH_SECONDS = int(os.environ.get("PM25_INDICATOR_REFRESH_SECONDS", 3600))
+OFFL_CHECK_SECONDS = int(os.environ.get("PM25_OFFL_CHECK_SECONDS", 6 * 3600))
+FAILED_RETRY_SECONDS = int(os.environ.get("PM25_FAILED_RETRY_SECONDS", 900))
+SCHEDULER_TICK_SECONDS = 60
+
+
+def _age(timestamp: str, now: datetime.datetime) -> float:
+    return (now - datetime.datetime.fromisoformat(timestamp)).total_seconds()
+
+
+def _backing_off(entry: dict, now: datetime.datetime, failed_retry_seconds: float) -> bool:
+    return bool(entry.get("error")) and _age(entry["failed_at"], now) < failed_retry_seconds
+
+
+def due_stages(
+    manifest: dict,
+    latest_granule: Optional[str],
+    now: datetime.datetime,
+    indicator_refresh_seconds: float = INDICATOR_REFRESH_SECONDS,
+    failed_retry_seconds: float = FAILED_RETRY_SECONDS
+) -> List[str]:
+
+    """
+    Stages whose cache is missing or outdated: NRTI stages older than the refresh interval
+    or computed on another day, OFFL stages computed before the newest OFFL granule.
+    Failed stages are retried after failed_retry_seconds.
+    -----------------------------------------------------------------------------------------
+    Required:
+    :manifest       : see cache.read_manifest
+    :latest_granule : newest OFFL granule, None when unknown
+    :now            : timezone-aware datetime
+
+    Optional:
+    :indicator_refresh_seconds  : float
+    :failed_retry_seconds       : float
+
+    Output:
+    :list           : stage names
+    -----------------------------------------------------------------------------------------
+    """
+
+    today = now.astimezone().date()
+    due = []
+    for name in cache.PRECOMPUTE_STAGES:
+        entry = manifest.get(name, {})
+        window = entry.get("data_window")
+        if entry.get("error"):
+            # Failed stages wait out the backoff, whatever their last good window.
+            if not _backing_off(entry, now, failed_retry_seconds):
+                due.append(name)
+            continue
+
+        if window is None:
+            due.append(name)
+            continue
+
+        expected = cache.stage_data_window(name, latest_granule, today)
+        if expected["product"] == "NRTI":
+            if window != expected or _age(entry["computed_at"], now) >= indicator_refresh_seconds:
+                due.append(name)
+        else:
+            if latest_granule is None:
+                expected["latest_granule"] = window.get("latest_granule")
+            if window != expected:
+                due.append(name)
+
+    return due
+
+
+class RefreshScheduler:
+
+    """
+    Background thread refreshing the cache incrementally: on every tick the stages reported
+    by due_stages are submitted as one precompute job. The cache files of the previous run
+    are served meanwhile. With several workers only the elected leader ticks, the others
+    only refresh the snapshot of outdated stages that is_stale answers from.
+    """
+
+    def __init__(
+        self,
+        tick_seconds: float = SCHEDULER_TICK_SECONDS,
+        indicator_refresh_seconds: float = INDICATOR_REFRESH_SECONDS,
+        offl_check_seconds: float = OFFL_CHECK_SECONDS,
+        poll_seconds: float = LEADER_POLL_SECONDS,
+        failed_retry_seconds: float = FAILED_RETRY_SECONDS
+    ):
+        self.tick_seconds = tick_seconds
+        self.poll_seconds = poll_seconds
+        self.indicator_refresh_seconds = indicator_refresh_seconds
+        self.offl_check_seconds = offl_check_seconds
+        self.failed_retry_seconds = failed_retry_seconds
+        self.latest_granule: Optional[str] = None
+        self._offl_checked_at: Optional[float] = None
+        # Outdated stages as of the last tick, None while the scheduler is not running.
+        self._stale: Optional[FrozenSet[str]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def tick(self) -> Optional[dict]:
+
+        """
+        Looks up new OFFL granules when due and submits the outdated stages, returns the
+        submitted job or None when the cache is current.
+        """
+
+        if self._offl_checked_at is None or time.monotonic() - self._offl_checked_at >= self.offl_check_seconds:
+            self._offl_checked_at = time.monotonic()
+            latest_granule = cache.latest_offl_granule()
+            if latest_granule is not None:
+                self.latest_granule = latest_granule
+
+        stages = self.due_stages()
+        self._stale = frozenset(stages)
+        if not stages:
+            return None
+
+        logger.info(f"Scheduled refresh of PM2.5 {', '.join(stages)}.")
+        return submit_precompute(stages, self.latest_granule)
+
+    def due_stages(self) -> List[str]:
+
+        """
+        Outdated stages from the manifest and the newest OFFL granule seen so far, does not
+        query Earth Engine.
+        """
+
+        return due_stages(
+            cache.read_manifest(),
+            self.latest_granule,
+            datetime.datetime.now(datetime.timezone.utc),
+            self.indicator_refresh_seconds,
+            self.failed_retry_seconds
+        )
+
+    def is_stale(self, stage: str) -> bool:
+
+        """
+        Whether the stage was outdated at the last tick. Served GETs ask this, so it does
+        not touch the disk while the scheduler runs; without it the manifest is read.
+        """
+
+        stale = self._stale
+        if stale is None:
+            return stage in self.due_stages()
+        return stage in stale
+
+    def retryable_stages(self, stages: Iterable[str]) -> List[str]:
+
+        """
+        Stages of missing cache data that may be submitted: all but the failed ones still
+        waiting out the retry backoff, which the next tick after it submits.
+        """
+
+        manifest = cache.read_manifest()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return [
+            name for name in stages
+            if not _backing_off(manifest.get(name, {}), now, self.failed_retry_seconds)
+        ]
+
+    def _run(self):
+        try:
+            cache.warm_artifacts()
+        except Exception as e:
+            logger.warning(f"Cache could not be warmed up: {str(e)}")
+
+        # Every worker runs this loop, only the leader refreshes. The others keep trying to
+        # take over, so a new leader is elected within poll_seconds when the leader exits.
+        next_tick = 0.0
+        while not self._stop.is_set():
+            leader = LEADER.try_acquire()
+            if leader:
+                try:
+                    claim_forwarded_precompute()
+                except Exception as e:
+                    logger.error(f"Forwarded precompute requests failed: {str(e)}")
+            if time.monotonic() >= next_tick:
+                next_tick = time.monotonic() + self.tick_seconds
+                try:
+                    if leader:
+                        self.tick()
+                    else:
+                        self._stale = frozenset(self.due_stages())
+                except Exception as e:
+                    logger.error(f"Scheduled refresh failed: {str(e)}")
+            self._stop.wait(min(self.poll_seconds, self.tick_seconds))
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="refresh-scheduler", daemon=True)
+        self._thread.start()
+        logger.info("Refresh scheduler started.")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self._stale = None
+        LEADER.release()
+
+
+SCHEDULER = RefreshScheduler()
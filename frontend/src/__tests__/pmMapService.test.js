@@ -1,5 +1,5 @@
 import api from '../api';
-import { getPM25Map, postPM25Map } from '../services/pmMapService';
+import { getPM25Map, postPM25Map, getPM25MapGrid, postPM25MapGrid, decodePM25Grid } from '../services/pmMapService';
 
 
 jest.mock('../api', () => ({
@@ -92,4 +92,44 @@ describe('PM2.5 Map Functions', () => {
         end_date: '2025-01-31',
         }); 
     });
+
+    it('should request the grid format for getPM25MapGrid', async () => {
+        const mockResponse = { data: { type: 'Grid' } };
+        api.get.mockResolvedValue(mockResponse);
+
+        const result = await getPM25MapGrid();
+        expect(result).toEqual(mockResponse.data);
+        expect(api.get).toHaveBeenCalledWith('/pm25/map-data', { params: { format: 'grid' } });
+    });
+
+    it('should request the grid format for postPM25MapGrid', async () => {
+        const mockResponse = { data: { type: 'Grid' } };
+        api.post.mockResolvedValue(mockResponse);
+
+        const result = await postPM25MapGrid('2025-01-01', '2025-01-31');
+        expect(result).toEqual(mockResponse.data);
+        expect(api.post).toHaveBeenCalledWith('/pm25/map-data', {
+        start_date: '2025-01-01',
+        end_date: '2025-01-31',
+        }, { params: { format: 'grid' } });
+    });
+
+    it('should decode a grid payload into PM2.5 point features', () => {
+
+        const values = new Float32Array([1.5, 0, 0, 4]);
+        const grid = {
+            type: 'Grid',
+            origin: [10, 54],
+            cell_size: [0.5, -0.5],
+            shape: [2, 2],
+            nodata: 0,
+            dtype: 'float32',
+            values: Buffer.from(values.buffer).toString('base64'),
+        };
+
+        const result = decodePM25Grid(grid);
+        expect(result.type).toEqual('FeatureCollection');
+        expect(result.features.map((f) => f.geometry.coordinates)).toEqual([[10, 54], [10.5, 53.5]]);
+        expect(result.features.map((f) => f.properties['PM2.5'])).toEqual([1.5, 4]);
+    });
 });
@@ -2,7 +2,7 @@ import React, { useEffect, useRef, useState } from "react";
 import mapboxgl from "mapbox-gl";
 import axios from "axios";
 import { Box, Typography, TextField, Button } from "@mui/material";
-import { getPM25Map, postPM25Map } from "../services/pmMapService"; 
+import { getPM25MapGrid, postPM25MapGrid, decodePM25Grid } from "../services/pmMapService"; 
 import { getHamburgMap } from '../services/hamburgMapService';
 import 'mapbox-gl/dist/mapbox-gl.css';
 import RefreshIcon from '@mui/icons-material/Refresh'; 
@@ -49,7 +49,7 @@ const MapComponent = () => {
                 paint: { 'line-color': '#000', 'line-width': 2 },
             });
 
-        const pm25Data = await getPM25Map();
+        const pm25Data = decodePM25Grid(await getPM25MapGrid());
         map.addSource('pm25-source', { type: 'geojson', data: pm25Data });
         map.addLayer({
             id: 'heatmap-layer',
@@ -144,7 +144,7 @@ const MapComponent = () => {
         setLoading(true); 
 
     try {
-        const newData = await postPM25Map(startDate, endDate); 
+        const newData = decodePM25Grid(await postPM25MapGrid(startDate, endDate)); 
         setPm25Data(newData); 
   
         if (map && map.getSource('pm25-source')) {
@@ -30,4 +30,73 @@ export const postPM25Map = async (start_date, end_date) => {
     } catch (error) {
       throw new Error(error.response?.data?.detail || 'Failed to post Map PM2.5 averages');
     }
-  };
\ No newline at end of file
+  };
+
+/**
+ * Fetches the precomputed PM2.5 map as a compact grid payload.
+ * @returns {Promise<Object>}
+ */
+export const getPM25MapGrid = async () => {
+  try {
+    const response = await api.get('/pm25/map-data', { params: { format: 'grid' } });
+    return response.data;
+  } catch (error) {
+    throw new Error(error.response?.data?.detail || 'Computing, try again later.');
+  }
+};
+
+/**
+ * Posts a time-scale and receives the PM2.5 map as a compact grid payload.
+ * @param {string} start_date - Start date
+ * @param {string} end_date - End date
+ * @returns {Promise<Object>}
+ */
+export const postPM25MapGrid = async (start_date, end_date) => {
+    try {
+      const response = await api.post('/pm25/map-data', {
+        start_date,
+        end_date,
+      }, { params: { format: 'grid' } });
+      return response.data;
+    } catch (error) {
+      throw new Error(error.response?.data?.detail || 'Failed to post Map PM2.5 averages');
+    }
+  };
+
+/**
+ * Decodes a grid payload (base64 little-endian float32 values) into a GeoJSON
+ * FeatureCollection of PM2.5 points, skipping nodata cells.
+ * @param {Object} grid - Grid payload from the map-data endpoint
+ * @returns {Object}
+ */
+export const decodePM25Grid = (grid) => {
+  const binary = atob(grid.values);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  const values = new DataView(bytes.buffer);
+
+  const [rows, cols] = grid.shape;
+  const [originX, originY] = grid.origin;
+  const [cellWidth, cellHeight] = grid.cell_size;
+  const nodata = grid.nodata === null ? null : Math.fround(grid.nodata);
+
+  const features = [];
+  for (let row = 0; row < rows; row++) {
+    for (let col = 0; col < cols; col++) {
+      const value = values.getFloat32((row * cols + col) * 4, true);
+      if (value === nodata || Number.isNaN(value)) continue;
+      features.push({
+        type: 'Feature',
+        geometry: {
+          type: 'Point',
+          coordinates: [originX + col * cellWidth, originY + row * cellHeight],
+        },
+        properties: { 'PM2.5': value },
+      });
+    }
+  }
+
+  return { type: 'FeatureCollection', features };
+};